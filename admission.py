@@ -0,0 +1,272 @@
+# admission.py
+"""Admission control for the expensive endpoints.
+
+Endpoints are grouped into classes (PDF rendering, uploads, bulk import
+and export; see ``ADMISSION`` in app.py). Each class runs at most
+``concurrency`` requests at once; up to ``queue`` more wait for a slot, at
+most ``queue_timeout`` seconds. Beyond that a request is turned away at
+once with ``503`` and a ``Retry-After`` estimated from how long the class's
+requests take, instead of holding a server thread that the cheap reads
+need. Each client (by remote address) also has a token bucket per class,
+refilled at ``rate`` requests per second up to ``burst``; an empty bucket
+answers ``429`` with ``Retry-After``. Endpoints in no class are never
+limited, and neither are HTML form posts: turning one away would throw
+away what the user typed. A page (GET) that is turned away shows
+busy.html, which reloads itself after ``Retry-After``.
+
+Waiting requests hold a server thread too, so ``concurrency + queue``
+summed over the classes should stay below ``SOW_THREADS``. A slot is held
+until the response is closed, so a streamed body counts too. Limits and
+counters are per process, like those in metrics.py. ``stats()`` reports
+them; with ``SOW_METRICS=1`` they are also exported at ``/metrics``.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, g, jsonify, render_template, request
+
+import metrics
+
+ENABLED = os.environ.get("SOW_ADMISSION", "1") != "0"
+FIELDS = ("concurrency", "queue", "rate", "burst")
+# Token buckets are kept for this many (class, client) pairs, least
+# recently seen dropped first; a dropped client simply starts full.
+MAX_CLIENTS = 10000
+# Service time estimate for Retry-After: exponentially weighted, this much
+# weight on the newest request.
+EWMA_WEIGHT = 0.2
+MAX_RETRY_AFTER = 60
+
+
+class Rejected(Exception):
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """A counting semaphore with a bounded, timed wait queue."""
+
+    def __init__(self, name, concurrency, queue=0, queue_timeout=10.0):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0, "rate_limited": 0}
+        self.service_seconds = 1.0
+        self._cond = threading.Condition()
+
+    def retry_after(self):
+        # Roughly when the queue ahead would have drained.
+        estimate = self.service_seconds * (self.waiting + 1) / self.concurrency
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def reject(self, reason):
+        with self._cond:
+            self.rejected[reason] += 1
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if need be; raise Rejected if full or timed out."""
+        with self._cond:
+            if self.active >= self.concurrency:
+                if self.waiting >= self.queue:
+                    self.rejected["queue_full"] += 1
+                    raise Rejected(503, "queue_full", self.retry_after())
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self.active < self.concurrency, self.queue_timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.rejected["queue_timeout"] += 1
+                    raise Rejected(503, "queue_timeout", self.retry_after())
+            self.active += 1
+            self.admitted += 1
+
+    def release(self, seconds):
+        with self._cond:
+            self.active -= 1
+            self.service_seconds += EWMA_WEIGHT * (seconds - self.service_seconds)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "concurrency": self.concurrency,
+                "queue": self.queue,
+                "active": self.active,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "service_seconds": round(self.service_seconds, 3),
+            }
+
+
+class TokenBuckets:
+    """Per-client token buckets: ``rate`` tokens a second, at most ``burst``."""
+
+    def __init__(self, rate, burst, max_clients=MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> [tokens, monotonic time]
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Take a token for ``client``; return 0, or the seconds until one is due."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(client, None) or [self.burst, now]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / self.rate
+
+    def refund(self, client):
+        """Give back the token of a request that was turned away anyway."""
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is not None:
+                bucket[0] = min(self.burst, bucket[0] + 1)
+
+
+# class name -> (Limiter, TokenBuckets or None), and endpoint -> class name
+_classes = {}
+_endpoints = {}
+
+
+def from_env(classes, environ=os.environ):
+    """``classes`` with each limit overridable as ``SOW_ADMIT_<CLASS>_<FIELD>``.
+
+    E.g. ``SOW_ADMIT_PDF_CONCURRENCY=4`` or ``SOW_ADMIT_UPLOAD_RATE=0``
+    (no rate limit).
+    """
+    configured = {}
+    for name, limits in classes.items():
+        limits = dict(limits)
+        for field in FIELDS:
+            value = environ.get(f"SOW_ADMIT_{name.upper()}_{field.upper()}")
+            if value is not None:
+                limits[field] = type(limits[field])(float(value))
+        configured[name] = limits
+    return configured
+
+
+def configure(classes, queue_timeout=10.0):
+    """Replace the limiters with ``classes``: ``{name: {"endpoints": [...], **limits}}``."""
+    _classes.clear()
+    _endpoints.clear()
+    for name, limits in classes.items():
+        limiter = Limiter(name, max(1, limits["concurrency"]), limits["queue"], queue_timeout)
+        buckets = TokenBuckets(limits["rate"], max(1, limits["burst"])) if limits["rate"] > 0 else None
+        _classes[name] = (limiter, buckets)
+        for endpoint in limits["endpoints"]:
+            _endpoints[endpoint] = name
+
+
+def budget():
+    """Server threads the classes can hold at once (running and waiting)."""
+    return sum(limiter.concurrency + limiter.queue for limiter, _ in _classes.values())
+
+
+def stats():
+    return {name: limiter.stats() for name, (limiter, _) in _classes.items()}
+
+
+def _reject(rejected):
+    if request.path.startswith("/api/"):
+        body = f"Server busy ({rejected.reason}); retry in {rejected.retry_after} s"
+        resp = jsonify({"error": body, "reason": rejected.reason, "retry_after": rejected.retry_after})
+        resp.status_code = rejected.status
+    else:
+        resp = Response(render_template("busy.html", retry_after=rejected.retry_after), rejected.status)
+        resp.headers["Refresh"] = str(rejected.retry_after)
+    resp.headers["Retry-After"] = str(rejected.retry_after)
+    resp.cache_control.no_store = True
+    return resp
+
+
+def _before_request():
+    name = _endpoints.get(request.endpoint)
+    if name is None or (request.method != "GET" and not request.path.startswith("/api/")):
+        return None
+    limiter, buckets = _classes[name]
+    if buckets is not None:
+        wait = buckets.take(request.remote_addr)
+        if wait:
+            limiter.reject("rate_limited")
+            return _reject(Rejected(429, "rate_limited", max(1, math.ceil(wait))))
+    try:
+        limiter.acquire()
+    except Rejected as e:
+        # Only admitted requests count against the client's rate.
+        if buckets is not None:
+            buckets.refund(request.remote_addr)
+        return _reject(e)
+    g._admission = (limiter, time.perf_counter())
+    return None
+
+
+def _release(admitted):
+    limiter, started = admitted
+    limiter.release(time.perf_counter() - started)
+
+
+def _after_request(response):
+    # Held until the server closes the response, so a streamed body (ZIP
+    # or merged PDF packets, bulk exports) is produced inside the limit.
+    admitted = g.pop("_admission", None)
+    if admitted is not None:
+        response.call_on_close(lambda: _release(admitted))
+    return response
+
+
+def _teardown_request(exc):
+    # Only if no response was made, e.g. the view raised.
+    admitted = g.pop("_admission", None)
+    if admitted is not None:
+        _release(admitted)
+
+
+def render():
+    """The limiters' state in Prometheus text format."""
+    lines = [
+        "# HELP sow_admission_active Requests running per admission class.",
+        "# TYPE sow_admission_active gauge",
+    ]
+    snapshot = stats()
+    lines += [f'sow_admission_active{{class="{name}"}} {s["active"]}' for name, s in snapshot.items()]
+    lines += ["# HELP sow_admission_waiting Requests queued per admission class.", "# TYPE sow_admission_waiting gauge"]
+    lines += [f'sow_admission_waiting{{class="{name}"}} {s["waiting"]}' for name, s in snapshot.items()]
+    lines += ["# HELP sow_admission_admitted_total Requests admitted.", "# TYPE sow_admission_admitted_total counter"]
+    lines += [f'sow_admission_admitted_total{{class="{name}"}} {s["admitted"]}' for name, s in snapshot.items()]
+    lines += ["# HELP sow_admission_rejected_total Requests turned away.", "# TYPE sow_admission_rejected_total counter"]
+    lines += [
+        f'sow_admission_rejected_total{{class="{name}",reason="{reason}"}} {n}'
+        for name, s in snapshot.items() for reason, n in sorted(s["rejected"].items())
+    ]
+    return lines
+
+
+def init_app(app):
+    """Set up the classes in ``app.config["ADMISSION"]`` and register the hooks."""
+    configure(app.config.get("ADMISSION", {}), app.config.get("ADMISSION_QUEUE_TIMEOUT", 10.0))
+    if not ENABLED or not _classes:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    metrics.register(render)
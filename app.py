@@ -1,129 +1,206 @@
 # app.py
 import os
 import sqlite3
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, send_file
+import time
+import click
+from flask import Flask, Response, abort, render_template, jsonify, request, redirect, url_for, flash, send_file
 from datetime import datetime
-import uuid
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER
-import tempfile
-from PIL import Image as PilImage
+from pdf_cache import PdfCache, key_revision
+from pdf_jobs import PdfJobManager, QueueFull
+import packets
+import bulk
+from image_ingest import IngestQueue, derivative_paths
+import storage
+import upload_gc
+import uploads
+import search
+import revisions
+import pagination
+import sow_document
+import reference_data
+import sync
+import metrics
+import assets
+import admission
+import db
+import migrations
+from db import get_db, close_db
 
 app = Flask(__name__)
 app.secret_key = "dev"
 
 # --- Configuration for file uploads ---
-UPLOAD_FOLDER = 'static/uploads'
+UPLOAD_FOLDER = os.environ.get("SOW_UPLOAD_FOLDER", 'static/uploads')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# --- Rendered PDF cache ---
+app.config['PDF_CACHE_DIR'] = os.environ.get("SOW_PDF_CACHE_DIR", os.path.join(app.instance_path, 'pdf_cache'))
+app.config['PDF_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+pdf_cache = PdfCache(app.config['PDF_CACHE_DIR'], app.config['PDF_CACHE_MAX_BYTES'])
+
+# --- Background PDF rendering ---
+app.config['PDF_WORKERS'] = int(os.environ.get("SOW_PDF_WORKERS", 0)) or None  # None = one per CPU
+app.config['PDF_MAX_PENDING'] = 64
+app.config['PDF_SYNC_TIMEOUT'] = 120
+# ReportLab is imported on the first render; create_app() loads it up front
+# unless SOW_PREWARM_PDF=0 (e.g. workers that rarely render PDFs).
+app.config['PREWARM_PDF'] = os.environ.get("SOW_PREWARM_PDF", "1") != "0"
+pdf_jobs = PdfJobManager(
+    pdf_cache, UPLOAD_FOLDER, app.config['PDF_WORKERS'], app.config['PDF_MAX_PENDING'],
+    on_rendered=metrics.observe_pdf_phases,
+)
+
+# --- Upload image pipeline (orientation, print derivative, thumbnail) ---
+image_ingest = IngestQueue(UPLOAD_FOLDER, get_db, on_done=lambda sow_id: pdf_cache.invalidate(sow_id=sow_id))
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 # ---------- SQLite helpers ----------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "sow_database.db")
+DB_PATH = os.environ.get("SOW_DB_PATH", os.path.join(BASE_DIR, "sow_database.db"))
+
+db.configure(DB_PATH, size=int(os.environ.get("SOW_DB_POOL_SIZE", 8)), factory=metrics.connection_factory())
+db.init_db()
+app.teardown_appcontext(close_db)
+metrics.init_app(app)
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# --- Static assets and response compression (see assets.py) ---
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get("SOW_COMPRESS_MIN_BYTES", 1024))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get("SOW_COMPRESS_LEVEL", 6))
+assets.init_app(app)
+
+# --- Admission control for the expensive endpoints (see admission.py) ---
+# Per worker process. Defaults leave at least one of SOW_THREADS=8 threads
+# for the cheap reads even when every class is saturated. /api/pdf_jobs is
+# not limited here: it returns at once and PDF_MAX_PENDING bounds its queue.
+# Neither are the add/edit SOW form posts: their images arrive as upload
+# chunks, and turning a save away would lose the user's edits.
+app.config['ADMISSION'] = admission.from_env({
+    "pdf": {"endpoints": ("generate_pdf",),
+            "concurrency": 2, "queue": 1, "rate": 0.5, "burst": 10},
+    # uploads.js sends at most this concurrency's worth of chunks per page.
+    "upload": {"endpoints": ("api_upload_chunk",),
+               "concurrency": 2, "queue": 1, "rate": 8.0, "burst": 48},
+    "bulk": {"endpoints": ("api_import", "api_export", "api_export_data"),
+             "concurrency": 1, "queue": 0, "rate": 0.1, "burst": 3},
+})
+app.config['ADMISSION_QUEUE_TIMEOUT'] = float(os.environ.get("SOW_ADMISSION_QUEUE_TIMEOUT", 10))
+admission.init_app(app)
+# Behind a reverse proxy, rate limits need the client address it forwards.
+if int(os.environ.get("SOW_PROXY_HOPS", 0)):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ["SOW_PROXY_HOPS"]))
 
 def ensure_schema():
     with get_db() as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS charger_types (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL UNIQUE
-            );
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS customers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                check_in_contact TEXT,
-                check_in_phone TEXT,
-                check_in_instructions TEXT,
-                check_out_contact TEXT,
-                check_out_phone TEXT,
-                check_out_instructions TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS sow_images (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sow_id INTEGER,
-                filename TEXT NOT NULL,
-                original_name TEXT NOT NULL,
-                caption TEXT,
-                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (sow_id) REFERENCES sows (id) ON DELETE CASCADE
-            );
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS sows (
-                id INTEGER PRIMARY KEY,
-                title TEXT NOT NULL,
-                name TEXT NOT NULL,
-                charger_type_id INTEGER,
-                customer_id INTEGER,
-                maintenance_scope TEXT,
-                parts TEXT,
-                tools TEXT,
-                documents TEXT,
-                service_instructions TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (charger_type_id) REFERENCES charger_types(id),
-                FOREIGN KEY (customer_id) REFERENCES customers(id)
-            );
-        """)
-        conn.commit()
+        return migrations.migrate(conn)
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations."""
+    applied = ensure_schema()
+    print(f"Applied: {', '.join(applied)}" if applied else "Schema is up to date.")
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Fail if a hot query would full-scan a table."""
+    offenders = migrations.check_query_plans(get_db())
+    for name, detail in offenders:
+        print(f"{name}: {detail}")
+    if offenders:
+        raise SystemExit(1)
+    print("All hot queries use an index.")
 
 # ---------- Pages ----------
 @app.get("/")
 def index():
     with get_db() as conn:
-        chargers = conn.execute(
-            "SELECT id, name FROM charger_types ORDER BY name COLLATE NOCASE"
-        ).fetchall()
-        customers = conn.execute(
-            "SELECT id, name FROM customers ORDER BY name COLLATE NOCASE"
-        ).fetchall()
+        chargers, customers = reference_data.lists(conn, "charger_types", "customers")
     return render_template("index.html", charger_types=chargers, customers=customers)
 
+# List views only show these columns; the large TEXT fields stay on disk.
+SOW_LIST_FROM = """
+    sows s
+    JOIN charger_types ct ON s.charger_type_id = ct.id
+    LEFT JOIN customers c ON s.customer_id = c.id
+"""
+SOW_LIST_SELECT = f"""
+    SELECT s.id, s.title, s.name, s.created_at, ct.name AS charger_type_name, c.name AS customer_name
+    FROM {SOW_LIST_FROM}
+"""
+
 @app.get("/edit_sows", endpoint="edit_sows")
 def edit_sows():
-    with get_db() as conn:
-        sows = conn.execute("""
-            SELECT s.*, ct.name as charger_type_name, c.name as customer_name
-            FROM sows s
-            JOIN charger_types ct ON s.charger_type_id = ct.id
-            LEFT JOIN customers c ON s.customer_id = c.id
-            ORDER BY s.created_at DESC
-        """).fetchall()
-    return render_template("edit_sows.html", sows=sows)
+    cursor = request.args.get("cursor")
+    limit = pagination.page_size(request.args.get("limit", type=int))
+    try:
+        with get_db() as conn:
+            sows, next_cursor = pagination.fetch_page(conn, SOW_LIST_SELECT, [], [], cursor, limit, alias="s")
+            # Opt-in, as on /api/sows. charger_type_id is nullable, so count
+            # through the same inner join as the list; the customers join is
+            # a LEFT JOIN and cannot change the total.
+            want_count = request.args.get("count") and not cursor
+            total = pagination.count_rows(
+                conn, "sows s JOIN charger_types ct ON s.charger_type_id = ct.id", [], []
+            ) if want_count else None
+    except ValueError:
+        abort(400)
+    # app.js asks for just the next rows (partial=1) as the table scrolls;
+    # without JavaScript the "Load more" link opens the next page.
+    template = "edit_sows_rows.html" if request.args.get("partial") else "edit_sows.html"
+    return render_template(template, sows=sows, total=total, next_cursor=next_cursor, limit=limit)
 
 @app.get("/edit_sow/<int:sow_id>", endpoint="edit_sow")
 def edit_sow_get(sow_id):
     with get_db() as conn:
         sow = conn.execute("SELECT * FROM sows WHERE id = ?", (sow_id,)).fetchone()
-        charger_types = conn.execute("SELECT * FROM charger_types ORDER BY name").fetchall()
-        customers = conn.execute("SELECT * FROM customers ORDER BY name").fetchall()
+        charger_types, customers = reference_data.lists(conn, "charger_types", "customers")
         images = conn.execute("SELECT * FROM sow_images WHERE sow_id = ? ORDER BY uploaded_at", (sow_id,)).fetchall()
     if not sow:
         flash("SOW not found!", "error")
         return redirect(url_for("edit_sows"))
     return render_template("edit_sow.html", sow=sow, charger_types=charger_types, customers=customers, images=images)
 
+def stage_form_files():
+    """Copy and hash the files posted with a form (the no-JavaScript path),
+    before the caller opens its write transaction.
+
+    Returns ``[(caption, file, staging_path, sha256, size)]``.
+    """
+    captions = request.form.getlist('new_image_captions')
+    files = [
+        (captions[i] if i < len(captions) else '', file)
+        for i, file in enumerate(request.files.getlist('sow_images'))
+        if file and allowed_file(file.filename)
+    ]
+    staged = storage.stage_uploads(app.config['UPLOAD_FOLDER'], [file for _, file in files])
+    return [(caption, *entry) for (caption, _), entry in zip(files, staged)]
+
+def attach_new_images(conn, sow_id, staged):
+    """Add the form's new images to a SOW, in the caller's transaction.
+
+    Background uploads named by ``upload_id`` are claimed (see uploads.py);
+    ``staged`` files from ``stage_form_files()`` are moved into place.
+    Returns ``[(sow_id, image_id)]`` for the images ready now.
+    """
+    upload_folder = app.config['UPLOAD_FOLDER']
+    images = uploads.claim(conn, upload_folder, sow_id, request.form.getlist('upload_id'),
+                           request.form.getlist('upload_caption'))
+    for caption, file, staging_path, sha256, size in staged:
+        ext = file.filename.rsplit('.', 1)[1].lower()
+        blob_id, filename = storage.commit_blob(conn, upload_folder, staging_path, sha256, size, ext)
+        cursor = conn.execute('''
+            INSERT INTO sow_images (sow_id, filename, original_name, caption, blob_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (sow_id, filename, secure_filename(file.filename), caption, blob_id))
+        images.append((sow_id, cursor.lastrowid))
+    return images
+
 @app.post("/edit_sow/<int:sow_id>")
 def edit_sow_post(sow_id):
     title = request.form.get("title")
@@ -134,29 +211,21 @@ def edit_sow_post(sow_id):
     tools = request.form.get("tools")
     documents = request.form.get("documents")
     service_instructions = request.form.get("service_instructions")
-    
-    uploaded_files = request.files.getlist('sow_images')
-    new_image_captions = request.form.getlist('new_image_captions')
 
     try:
+        staged = stage_form_files()
         with get_db() as conn:
-            conn.execute(
-                """
-                UPDATE sows SET 
-                    title = ?, 
-                    name = ?,
-                    charger_type_id = ?, 
-                    customer_id = ?,
-                    maintenance_scope = ?, 
-                    parts = ?, 
-                    tools = ?, 
-                    documents = ?, 
-                    service_instructions = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-                """,
-                (title, title, charger_type_id, customer_id, maintenance_scope, parts, tools, documents, service_instructions, sow_id)
-            )
+            revisions.record(conn, sow_id, {
+                "title": title,
+                "name": title,
+                "charger_type_id": charger_type_id,
+                "customer_id": customer_id,
+                "maintenance_scope": maintenance_scope,
+                "parts": parts,
+                "tools": tools,
+                "documents": documents,
+                "service_instructions": service_instructions,
+            }, expected=request.form.get("revision") or None)
 
             # Handle existing image caption updates
             existing_image_ids = request.form.getlist('existing_image_id')
@@ -164,36 +233,40 @@ def edit_sow_post(sow_id):
             for img_id, caption in zip(existing_image_ids, existing_image_captions):
                 conn.execute('UPDATE sow_images SET caption = ? WHERE id = ?', (caption, img_id))
 
-            # Handle new image uploads with captions
-            for i, file in enumerate(uploaded_files):
-                if file and file.filename and allowed_file(file.filename):
-                    filename = f"{uuid.uuid4()}.{file.filename.rsplit('.', 1)[1].lower()}"
-                    original_name = secure_filename(file.filename)
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(file_path)
-                    caption = new_image_captions[i] if i < len(new_image_captions) else ''
-                    conn.execute('''
-                        INSERT INTO sow_images (sow_id, filename, original_name, caption)
-                        VALUES (?, ?, ?, ?)
-                    ''', (sow_id, filename, original_name, caption))
+            # New images: background uploads and any files posted with the form
+            new_images = attach_new_images(conn, sow_id, staged)
 
             conn.commit()
+        pdf_cache.invalidate(sow_id=sow_id)
+        for _, image_id in new_images:
+            image_ingest.submit(image_id)
         flash("SOW updated successfully!", "success")
+    except revisions.RevisionConflict:
+        flash("This SOW was changed by someone else while you were editing it. Your changes were not saved; "
+              "please review the current version and try again.", "error")
     except Exception as e:
         flash(f"An error occurred: {e}", "error")
 
     return redirect(url_for("edit_sow", sow_id=sow_id))
     
-@app.post('/delete_image/<int:sow_id>/<filename>')
+def remove_image_files(conn, images):
+    # Content-addressed files are shared: only unlink blobs nobody references.
+    storage.release_blobs(conn, app.config['UPLOAD_FOLDER'], [img['blob_id'] for img in images])
+    for img in images:
+        if img['blob_id'] is None:
+            for file_path in derivative_paths(app.config['UPLOAD_FOLDER'], img):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+@app.post('/delete_image/<int:sow_id>/<path:filename>')
 def delete_image(sow_id, filename):
     try:
         with get_db() as conn:
+            images = conn.execute('SELECT * FROM sow_images WHERE sow_id = ? AND filename = ?', (sow_id, filename)).fetchall()
             conn.execute('DELETE FROM sow_images WHERE sow_id = ? AND filename = ?', (sow_id, filename))
             conn.commit()
-            
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            pdf_cache.invalidate(sow_id=sow_id)
+            remove_image_files(conn, images)
         return jsonify(success=True)
     except sqlite3.Error as e:
         return jsonify(success=False, error=str(e))
@@ -202,16 +275,15 @@ def delete_image(sow_id, filename):
 def delete_sow(sow_id):
     try:
         with get_db() as conn:
-            # Delete images from the filesystem first
-            images = conn.execute('SELECT filename FROM sow_images WHERE sow_id = ?', (sow_id,)).fetchall()
-            for img in images:
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], img['filename'])
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            
-            # Now delete the SOW and all associated images from the database
+            images = conn.execute('SELECT * FROM sow_images WHERE sow_id = ?', (sow_id,)).fetchall()
+
+            # Delete the SOW; its image rows go with it via ON DELETE CASCADE
             conn.execute("DELETE FROM sows WHERE id = ?", (sow_id,))
             conn.commit()
+
+            # Then remove files that are no longer referenced
+            remove_image_files(conn, images)
+        pdf_cache.invalidate(sow_id=sow_id)
         flash("SOW deleted successfully!", "success")
     except Exception as e:
         flash(f"An error occurred: {e}", "error")
@@ -293,6 +365,7 @@ def edit_customer_post(customer_id):
                 (name, check_in_contact, check_in_phone, check_in_instructions, check_out_contact, check_out_phone, check_out_instructions, customer_id),
             )
             conn.commit()
+        pdf_cache.invalidate(customer_id=customer_id)
         flash(f"Customer '{name}' updated successfully.", "success")
     except sqlite3.IntegrityError:
         flash(f"Customer '{name}' already exists.", "warning")
@@ -305,8 +378,11 @@ def edit_customer_post(customer_id):
 def delete_customer(customer_id):
     try:
         with get_db() as conn:
+            # foreign_keys is enforced, so detach SOWs before removing the customer
+            conn.execute("UPDATE sows SET customer_id = NULL WHERE customer_id = ?", (customer_id,))
             conn.execute("DELETE FROM customers WHERE id = ?", (customer_id,))
             conn.commit()
+        pdf_cache.invalidate(customer_id=customer_id)
         flash("Customer deleted successfully.", "success")
     except Exception as e:
         flash(f"An error occurred: {e}", "error")
@@ -316,9 +392,7 @@ def delete_customer(customer_id):
 @app.get("/add_charger_type", endpoint="add_charger_type")
 def add_charger_type_get():
     with get_db() as conn:
-        rows = conn.execute(
-            "SELECT id, name FROM charger_types ORDER BY name COLLATE NOCASE"
-        ).fetchall()
+        rows = reference_data.charger_types(conn)
     return render_template("add_charger_type.html", charger_types=rows)
 
 @app.post("/add_charger_type")
@@ -354,12 +428,7 @@ def delete_charger_type(type_id):
 @app.get("/add_sow", endpoint="add_sow")
 def add_sow_get():
     with get_db() as conn:
-        charger_types = conn.execute(
-            "SELECT id, name FROM charger_types ORDER BY name COLLATE NOCASE"
-        ).fetchall()
-        customers = conn.execute(
-            "SELECT id, name FROM customers ORDER BY name COLLATE NOCASE"
-        ).fetchall()
+        charger_types, customers = reference_data.lists(conn, "charger_types", "customers")
     return render_template("add_sow.html", charger_types=charger_types, customers=customers)
 
 @app.post("/add_sow")
@@ -372,14 +441,13 @@ def add_sow_post():
     tools = (request.form.get("tools") or "").strip()
     documents = (request.form.get("documents") or "").strip()
     service_instructions = (request.form.get("service_instructions") or "").strip()
-    uploaded_files = request.files.getlist('sow_images')
-    new_image_captions = request.form.getlist('new_image_captions')
     
     if not title or not charger_type_id:
         flash("Title and Charger Type are required.", "error")
         return redirect(url_for("add_sow"))
 
     try:
+        staged = stage_form_files()
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
@@ -390,19 +458,10 @@ def add_sow_post():
                 (title, title, charger_type_id, customer_id, maintenance_scope, parts, tools, documents, service_instructions),
             )
             sow_id = cursor.lastrowid
-
-            for i, file in enumerate(uploaded_files):
-                if file and allowed_file(file.filename):
-                    filename = f"{uuid.uuid4()}.{file.filename.rsplit('.', 1)[1].lower()}"
-                    original_name = secure_filename(file.filename)
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(file_path)
-                    caption = new_image_captions[i] if i < len(new_image_captions) else ''
-                    cursor.execute('''
-                        INSERT INTO sow_images (sow_id, filename, original_name, caption)
-                        VALUES (?, ?, ?, ?)
-                    ''', (sow_id, filename, original_name, caption))
+            new_images = attach_new_images(conn, sow_id, staged)
             conn.commit()
+        for _, image_id in new_images:
+            image_ingest.submit(image_id)
         flash("SOW created.", "success")
     except Exception as e:
         flash(f"Error creating SOW: {e}", "error")
@@ -414,15 +473,41 @@ def add_sow_post():
 def api_sows():
     charger_type_id = request.args.get("charger_type_id")
     customer_id = request.args.get("customer_id")
-    sql = """
-        SELECT id, title
-        FROM sows
-        WHERE (? IS NULL OR charger_type_id = ?) AND (? IS NULL OR customer_id = ?)
-        ORDER BY id DESC
-    """
+    cursor = request.args.get("cursor")
+    limit = pagination.page_size(request.args.get("limit", type=int))
+    # Only add the filters that were given; "? IS NULL OR col = ?" defeats the indexes.
+    where, params = [], []
+    if charger_type_id is not None:
+        where.append("charger_type_id = ?")
+        params.append(charger_type_id)
+    if customer_id is not None:
+        where.append("customer_id = ?")
+        params.append(customer_id)
+    try:
+        with get_db() as conn:
+            rows, next_cursor = pagination.fetch_page(
+                conn, "SELECT id, title, created_at FROM sows", where, params, cursor, limit
+            )
+            total = pagination.count_rows(conn, "sows", where, params) if request.args.get("count") else None
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    resp = jsonify([{"id": r["id"], "title": r["title"]} for r in rows])
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+        next_args = {**request.args.to_dict(), "cursor": next_cursor}
+        resp.headers["Link"] = f'<{url_for("api_sows", **next_args)}>; rel="next"'
+    if total is not None:
+        resp.headers["X-Total-Count"] = str(total)
+    return resp
+
+@app.get("/api/sows/search")
+def api_search_sows():
+    q = request.args.get("q", "")
+    limit = min(request.args.get("limit", 20, type=int), 100)
+    charger_type_id = request.args.get("charger_type_id", type=int)
     with get_db() as conn:
-        rows = conn.execute(sql, (charger_type_id, charger_type_id, customer_id, customer_id)).fetchall()
-    return jsonify([{"id": r["id"], "title": r["title"]} for r in rows])
+        results = search.search_sows(conn, q, limit, charger_type_id)
+    return jsonify({"query": q, "results": results})
 
 @app.get("/api/sows/<int:sow_id>")
 def api_get_sow(sow_id):
@@ -430,7 +515,51 @@ def api_get_sow(sow_id):
         row = conn.execute("SELECT * FROM sows WHERE id = ?", (sow_id,)).fetchone()
     if not row:
         return jsonify({"error": "SOW not found"}), 404
-    return jsonify(dict(row))
+    etag = revisions.etag(row)
+    resp = Response(status=304) if request.if_none_match.contains_weak(etag) else jsonify(dict(row))
+    resp.set_etag(etag)
+    resp.headers["X-SOW-Revision"] = str(row["revision"])
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
+
+@app.get("/api/sows/<int:sow_id>/revisions")
+def api_sow_revisions(sow_id):
+    """Stored revisions of a SOW, newest first; page with ``before``."""
+    before = request.args.get("before", type=int)
+    limit = pagination.page_size(request.args.get("limit", type=int))
+    with get_db() as conn:
+        row = conn.execute("SELECT revision FROM sows WHERE id = ?", (sow_id,)).fetchone()
+        if not row:
+            return jsonify({"error": "SOW not found"}), 404
+        entries = revisions.history(conn, sow_id, before, limit)
+    for entry in entries:
+        entry["url"] = url_for("api_sow_revision", sow_id=sow_id, revision=entry["revision"])
+    resp = jsonify({"sow_id": sow_id, "revision": row["revision"], "revisions": entries})
+    if len(entries) == limit:
+        resp.headers["Link"] = f'<{url_for("api_sow_revisions", sow_id=sow_id, before=entries[-1]["revision"], limit=limit)}>; rel="next"'
+    return resp
+
+@app.get("/api/sows/<int:sow_id>/revisions/<int:revision>")
+def api_sow_revision(sow_id, revision):
+    """One revision of a SOW, rebuilt from the history."""
+    with get_db() as conn:
+        version = revisions.load(conn, sow_id, revision)
+    if version is None:
+        return jsonify({"error": "Revision not found"}), 404
+    etag = f"{sow_id}-r{revision}"
+    resp = Response(status=304) if request.if_none_match.contains_weak(etag) else jsonify({"id": sow_id, **version})
+    resp.set_etag(etag)
+    resp.headers["X-SOW-Revision"] = str(revision)
+    if version["current"]:
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+    else:
+        # A past revision never changes.
+        resp.cache_control.private = True
+        resp.cache_control.max_age = assets.IMMUTABLE_MAX_AGE
+        resp.cache_control.immutable = True
+    return resp
 
 @app.get("/api/sow_images/<int:sow_id>")
 def api_sow_images(sow_id):
@@ -438,11 +567,127 @@ def api_sow_images(sow_id):
         images = conn.execute("SELECT * FROM sow_images WHERE sow_id = ?", (sow_id,)).fetchall()
     return jsonify([dict(i) for i in images])
 
+# Chunked, resumable uploads (see uploads.py): POST to start, PATCH each
+# chunk with its Upload-Offset, GET to find where to resume.
+def upload_response(upload, status=200):
+    resp = jsonify({**upload, "url": url_for("api_upload", upload_id=upload["id"])})
+    resp.status_code = status
+    resp.headers["Upload-Offset"] = str(upload["offset"])
+    resp.cache_control.no_store = True
+    return resp
+
+@app.post("/api/uploads")
+def api_create_upload():
+    payload = request.get_json(silent=True) or {}
+    filename = secure_filename(str(payload.get("filename") or ""))
+    size = payload.get("size")
+    if not allowed_file(filename):
+        return jsonify({"error": f"Unsupported file type; allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}"}), 400
+    if not isinstance(size, int) or not 0 < size <= app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({"error": f"size must be between 1 and {app.config['MAX_CONTENT_LENGTH']} bytes"}), 400
+    with get_db() as conn:
+        upload = uploads.create(conn, app.config['UPLOAD_FOLDER'], filename, size)
+    resp = upload_response({**upload, "chunk_size": uploads.CHUNK_BYTES}, 201)
+    resp.headers["Location"] = url_for("api_upload", upload_id=upload["id"])
+    return resp
+
+@app.get("/api/uploads/<upload_id>")
+def api_upload(upload_id):
+    with get_db() as conn:
+        upload = uploads.get(conn, app.config['UPLOAD_FOLDER'], upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return upload_response(upload)
+
+@app.patch("/api/uploads/<upload_id>")
+def api_upload_chunk(upload_id):
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None or offset < 0:
+        return jsonify({"error": "Upload-Offset header is required"}), 400
+    try:
+        with get_db() as conn:
+            upload, images = uploads.write_chunk(conn, app.config['UPLOAD_FOLDER'], upload_id, offset, request.stream)
+    except LookupError:
+        return jsonify({"error": "Upload not found"}), 404
+    except uploads.OffsetMismatch as e:
+        resp = jsonify({"error": str(e), "offset": e.offset})
+        resp.status_code = 409
+        resp.headers["Upload-Offset"] = str(e.offset)
+        return resp
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    for sow_id, image_id in images:
+        pdf_cache.invalidate(sow_id=sow_id)
+        image_ingest.submit(image_id)
+    return upload_response(upload)
+
+@app.delete("/api/uploads/<upload_id>")
+def api_cancel_upload(upload_id):
+    with get_db() as conn:
+        cancelled = uploads.cancel(conn, app.config['UPLOAD_FOLDER'], upload_id)
+    if not cancelled:
+        return jsonify({"error": "Upload not found or already saved with a SOW"}), 404
+    return "", 204
+
+@app.get("/api/sow_document/<int:sow_id>")
+def api_sow_document(sow_id):
+    """The SOW with its charger type, a customer, images and the text preview."""
+    customer_id = request.args.get("customer_id", type=int)
+    with get_db() as conn:
+        doc = sow_document.load_document(conn, sow_id, customer_id)
+    if doc is None:
+        return jsonify({"error": "SOW not found"}), 404
+    sow, charger_type, customer, images = doc
+    etag = sow_document.etag(*doc)
+    # Weak match: gzipped responses carry the ETag as W/"...".
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = jsonify({
+            "sow": sow,
+            "charger_type": charger_type,
+            "customer": customer,
+            "images": [{
+                **img,
+                "url": url_for("static", filename=f"uploads/{img['filename']}"),
+                "thumb_url": url_for("static", filename=f"uploads/{img['thumb_filename'] or img['filename']}"),
+            } for img in images],
+            "text": sow_document.render_text(sow, customer, images),
+        })
+    resp.set_etag(etag)
+    # Revalidate every time; an unchanged document costs a 304.
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
+
+@app.get("/api/sync")
+def api_sync():
+    """Rows created, updated or deleted since ``since`` (a previous cursor)."""
+    try:
+        with get_db() as conn:
+            changes = sync.changes(conn, request.args.get("since") or None)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    changes["layout"] = sow_document.layout()
+    resp = jsonify(changes)
+    resp.cache_control.no_store = True
+    return resp
+
+@app.get("/sw.js")
+def service_worker():
+    # Served from the root so it can control "/" as well as /static. It
+    # lists the current fingerprinted assets, so every deploy that changes
+    # one changes this script and browsers install a fresh cache.
+    shell = ["/", *(assets.asset_url(name) for name in assets.ASSETS)]
+    resp = Response(render_template("sw.js", shell=shell, version=assets.version()), mimetype="text/javascript")
+    resp.cache_control.no_cache = True
+    return resp
+
 @app.get("/api/customers")
 def api_customers():
     with get_db() as conn:
-        rows = conn.execute("SELECT id, name FROM customers ORDER BY name COLLATE NOCASE").fetchall()
-    return jsonify([{"id": r["id"], "name": r["name"]} for r in rows])
+        rows = reference_data.customers(conn)
+    return jsonify(list(rows))
 
 @app.get("/api/customers/<int:customer_id>")
 def api_get_customer(customer_id):
@@ -452,129 +697,414 @@ def api_get_customer(customer_id):
         return jsonify({"error": "Customer not found"}), 404
     return jsonify(dict(row))
 
+def load_pdf_inputs(conn, sow_id, customer_id=None):
+    started = time.perf_counter()
+    doc = sow_document.load_document(conn, sow_id, customer_id)
+    metrics.observe_pdf_phase("query", time.perf_counter() - started)
+    if doc is None:
+        return None, None, None
+    sow_data, _, customer_data, image_data = doc
+    return sow_data, customer_data, image_data
+
+def send_pdf(entry, title):
+    revision = key_revision(entry.etag)
+    resp = send_file(
+        entry.path,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'SOW-{title}-r{revision}.pdf',
+        etag=entry.etag,
+        last_modified=entry.mtime,
+        conditional=True,
+    )
+    resp.headers["X-SOW-Revision"] = str(revision)
+    return resp
+
+def describe_pdf_job(job):
+    info = pdf_jobs.describe(job)
+    info["status_url"] = url_for("api_pdf_job", job_id=job.id)
+    if info["status"] == "done":
+        info["download_url"] = url_for("api_pdf_job_download", job_id=job.id)
+    return info
+
+@app.post("/api/pdf_jobs")
+def api_create_pdf_job():
+    payload = request.get_json(silent=True) or request.form
+    try:
+        sow_id = int(payload.get("sow_id"))
+        customer_id = int(payload.get("customer_id") or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({"error": "sow_id is required"}), 400
+
+    with get_db() as conn:
+        sow_data, customer_data, image_data = load_pdf_inputs(conn, sow_id, customer_id)
+    if not sow_data:
+        return jsonify({"error": "SOW not found"}), 404
+    try:
+        job = pdf_jobs.submit(sow_data, customer_data, image_data)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    info = describe_pdf_job(job)
+    return jsonify(info), (200 if info["status"] == "done" else 202), {"Location": info["status_url"]}
+
+@app.get("/api/pdf_jobs/<job_id>")
+def api_pdf_job(job_id):
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(describe_pdf_job(job))
+
+@app.get("/api/pdf_jobs/<job_id>/download")
+def api_pdf_job_download(job_id):
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status != "done":
+        return jsonify(describe_pdf_job(job)), 409
+    with get_db() as conn:
+        row = conn.execute("SELECT title FROM sows WHERE id = ?", (job.sow_id,)).fetchone()
+    return send_pdf(job.entry, row["title"] if row else job.sow_id)
+
 @app.route('/generate_pdf/<int:sow_id>')
 @app.route('/generate_pdf/<int:sow_id>/<int:customer_id>')
 def generate_pdf(sow_id, customer_id=None):
     try:
-        with sqlite3.connect('sow_database.db') as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        with get_db() as conn:
+            sow_data, customer_data, image_data = load_pdf_inputs(conn, sow_id, customer_id)
+        if not sow_data:
+            flash('SOW not found!', 'error')
+            return redirect(url_for('index'))
 
-            cursor.execute('SELECT * FROM sows WHERE id = ?', (sow_id,))
-            sow_data = cursor.fetchone()
-            if not sow_data:
-                flash('SOW not found!', 'error')
-                return redirect(url_for('index'))
-
-            customer_data = None
-            if customer_id:
-                cursor.execute('SELECT * FROM customers WHERE id = ?', (customer_id,))
-                customer_data = cursor.fetchone()
-            
-            cursor.execute('SELECT * FROM sow_images WHERE sow_id = ? ORDER BY uploaded_at', (sow_id,))
-            image_data = cursor.fetchall()
-
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-            doc = SimpleDocTemplate(temp_file.name, pagesize=letter)
-            styles = getSampleStyleSheet()
-
-            styles.add(ParagraphStyle(name='TitleStyle', fontSize=24, spaceAfter=12, alignment=TA_CENTER, fontName='Helvetica-Bold'))
-            styles.add(ParagraphStyle(name='HeadingStyle', fontSize=14, spaceAfter=6, fontName='Helvetica-Bold', leading=18))
-            styles.add(ParagraphStyle(name='NormalStyle', fontSize=12, spaceAfter=12, leading=14))
-            styles.add(ParagraphStyle(name='CaptionStyle', fontSize=10, textColor=colors.grey, spaceBefore=4, spaceAfter=12, alignment=TA_CENTER))
-
-            story = []
-
-            now = datetime.now().strftime("%a %b %d %H:%M:%S %Y CDT")
-            story.append(Paragraph(f"SOW Created [{now}]", styles['NormalStyle']))
-            story.append(Paragraph("TECH SUPPORT CONTACT INFORMATION", styles['HeadingStyle']))
-            story.append(Paragraph("BTC Power Technical Support Hotline 1-855-901-1558", styles['NormalStyle']))
-            story.append(Spacer(1, 0.25 * inch))
-
-            if sow_data['title']:
-                story.append(Paragraph(sow_data['title'], styles['TitleStyle']))
-                story.append(Spacer(1, 0.25 * inch))
-
-            if customer_data:
-                story.append(PageBreak())
-                story.append(Paragraph('CUSTOMER CHECK-IN/CHECK-OUT INFORMATION', styles['HeadingStyle']))
-                
-                check_in_fields = [
-                    ('Check-in Contact:', 'check_in_contact'),
-                    ('Check-in Phone:', 'check_in_phone'),
-                    ('Check-in Instructions:', 'check_in_instructions')
-                ]
-                
-                for label, field in check_in_fields:
-                    if customer_data[field]:
-                        story.append(Paragraph(f'<b>{label}</b> {customer_data[field]}', styles['NormalStyle']))
-                
-                story.append(Spacer(1, 0.2 * inch))
-                
-                check_out_fields = [
-                    ('Check-out Contact:', 'check_out_contact'),
-                    ('Check-out Phone:', 'check_out_phone'),
-                    ('Check-out Instructions:', 'check_out_instructions')
-                ]
-                
-                for label, field in check_out_fields:
-                    if customer_data[field]:
-                        story.append(Paragraph(f'<b>{label}</b> {customer_data[field]}', styles['NormalStyle']))
-
-            fields = [
-                ('MAINTENANCE SCOPE', 'maintenance_scope'),
-                ('PARTS', 'parts'),
-                ('TOOLS', 'tools'),
-                ('DOCUMENTS', 'documents'),
-                ('SERVICE INSTRUCTIONS', 'service_instructions')
-            ]
-
-            for heading, field in fields:
-                if sow_data[field]:
-                    story.append(Paragraph(heading, styles['HeadingStyle']))
-                    story.append(Paragraph(sow_data[field], styles['NormalStyle']))
-                    story.append(Spacer(1, 0.2 * inch))
-
-            if image_data:
-                story.append(PageBreak())
-                story.append(Paragraph('REFERENCE IMAGES', styles['HeadingStyle']))
-                story.append(Spacer(1, 0.2 * inch))
-                for img in image_data:
-                    image_path = os.path.join(app.config['UPLOAD_FOLDER'], img['filename'])
-                    if os.path.exists(image_path):
-                        if img['filename'].lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                            try:
-                                pil_img = PilImage.open(image_path)
-                                img_width, img_height = pil_img.size
-                                max_width = letter[0] - 2 * inch
-                                max_height = letter[1] - 2 * inch
-                                
-                                ratio = min(max_width / img_width, max_height / img_height)
-                                
-                                rl_img = RLImage(image_path, width=img_width * ratio, height=img_height * ratio)
-                                story.append(rl_img)
-                                
-                                if img['caption']:
-                                    story.append(Paragraph(img['caption'], styles['CaptionStyle']))
-                                else:
-                                    story.append(Paragraph(img['original_name'], styles['CaptionStyle']))
-                                story.append(Spacer(1, 0.2 * inch))
-                            except Exception as e:
-                                story.append(Paragraph(f'<i>Error displaying image: {img["original_name"]}</i>', styles['NormalStyle']))
-                                story.append(Spacer(1, 0.2 * inch))
-                        elif img['filename'].lower().endswith('.pdf'):
-                            story.append(Paragraph(f'<b>Reference Document:</b> {img["original_name"]}', styles['NormalStyle']))
-                            story.append(Paragraph(f'<i>{img["caption"]}</i>' if img['caption'] else '', styles['CaptionStyle']))
-                            story.append(Spacer(1, 0.2 * inch))
-
-            doc.build(story)
-            temp_file.seek(0)
-            return send_file(temp_file.name, as_attachment=True, download_name=f'SOW-{sow_data["title"]}.pdf')
+        # Direct links still work: the render runs on the job pool and this
+        # request waits for it (or is served straight from the cache).
+        job = pdf_jobs.submit(sow_data, customer_data, image_data)
+        if not job.wait(app.config['PDF_SYNC_TIMEOUT']):
+            raise TimeoutError('PDF is still rendering, please try again shortly')
+        if job.status == 'failed':
+            raise RuntimeError(job.error)
+        return send_pdf(job.entry, sow_data["title"])
 
     except Exception as e:
         flash(f'An error occurred during PDF generation: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+@app.cli.command("ingest-images")
+def ingest_images_command():
+    """Generate derivatives and dimensions for images uploaded before the pipeline."""
+    rows = get_db().execute(
+        "SELECT id FROM sow_images WHERE width IS NULL AND lower(filename) NOT LIKE '%.pdf'"
+    ).fetchall()
+    for row in rows:
+        image_ingest.ingest(row["id"])
+    print(f"Processed {len(rows)} image(s).")
+
+@app.cli.command("fold-uploads")
+def fold_uploads_command():
+    """Move legacy uploads into content-addressed storage, folding duplicates."""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    conn = get_db()
+    legacy = conn.execute("SELECT DISTINCT filename FROM sow_images WHERE blob_id IS NULL").fetchall()
+    folded = missing = 0
+    for (filename,) in legacy:
+        path = os.path.join(upload_folder, filename)
+        if not os.path.exists(path):
+            missing += 1
+            continue
+        rows = conn.execute("SELECT * FROM sow_images WHERE filename = ? AND blob_id IS NULL", (filename,)).fetchall()
+        sha256 = storage.hash_file(path)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            blob_id, relpath = storage.commit_blob(
+                conn, upload_folder, path, sha256, os.path.getsize(path), filename.rsplit('.', 1)[-1].lower()
+            )
+            conn.execute("""
+                UPDATE sow_images
+                SET blob_id = ?, filename = ?, width = NULL, height = NULL, print_filename = NULL, thumb_filename = NULL
+                WHERE filename = ? AND blob_id IS NULL
+            """, (blob_id, relpath, filename))
+        # Old per-upload derivatives are replaced by the blob's own.
+        for row in rows:
+            for name in (row['print_filename'], row['thumb_filename']):
+                if name and os.path.exists(os.path.join(upload_folder, name)):
+                    os.remove(os.path.join(upload_folder, name))
+            image_ingest.ingest(row['id'])
+            pdf_cache.invalidate(sow_id=row['sow_id'])
+        folded += 1
+    blobs = conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+    print(f"Folded {folded} legacy file(s) into {blobs} blob(s); {missing} missing on disk.")
+
+@app.cli.command("gc-uploads")
+@click.option("--batch-size", type=click.IntRange(min=1), default=upload_gc.BATCH_SIZE, show_default=True)
+@click.option("--max-batches", type=click.IntRange(min=1), help="Stop after this many batches; the next run resumes.")
+@click.option("--pause", type=float, default=0.0, show_default=True, help="Seconds to sleep between batches.")
+@click.option("--keep-days", type=click.IntRange(min=0), default=upload_gc.QUARANTINE_DAYS, show_default=True,
+              help="Days quarantined files are kept before deletion.")
+@click.option("--every", type=click.IntRange(min=1), help="Keep running, resuming the GC every N seconds.")
+def gc_uploads_command(batch_size, max_batches, pause, keep_days, every):
+    """Quarantine, then delete, uploads and image rows nothing references."""
+    while True:
+        r = upload_gc.run(get_db(), app.config['UPLOAD_FOLDER'], batch_size, max_batches, pause, keep_days=keep_days)
+        print(f"Expired {r.uploads_expired} unfinished upload(s). "
+              f"Deleted {r.rows_deleted} image row(s) of deleted SOWs and {r.blobs_deleted} unreferenced blob(s); "
+              f"{r.missing_files} image row(s) point at missing files.")
+        print(f"Scanned {r.files_scanned} file(s), quarantined {r.files_quarantined} ({r.bytes_quarantined / 1e6:.1f} MB); "
+              f"purged {r.files_purged}, reclaiming {r.bytes_reclaimed / 1e6:.1f} MB; restored {r.files_restored}.")
+        held, held_bytes = upload_gc.quarantine_usage(get_db())
+        status = "Pass complete" if r.passes_completed else "Pass paused, resumes next run"
+        print(f"{status}. Quarantine holds {held} file(s), {held_bytes / 1e6:.1f} MB.")
+        if every is None:
+            break
+        time.sleep(every)
+
+# --- Bulk SOW packets ---
+def packet_stream(fmt, charger_type_id=None, customer_id=None, sow_ids=None):
+    """Return ``(chunks, mimetype, extension)`` for a packet export.
+
+    The generator holds its own pooled connection because it outlives the
+    request's app context when streamed.
+    """
+    conn = db.pool.acquire()
+    try:
+        ids = packets.select_sow_ids(conn, charger_type_id, customer_id, sow_ids)
+        if fmt == "pdf" and len(ids) > packets.MERGED_MAX_SOWS:
+            raise packets.PacketTooLarge(f"Merged PDFs are limited to {packets.MERGED_MAX_SOWS} SOWs; request a ZIP instead.")
+    except Exception:
+        db.pool.release(conn)
+        raise
+
+    def chunks():
+        try:
+            documents = packets.iter_documents(conn, ids, customer_id)
+            if fmt == "pdf":
+                yield from packets.stream_merged_pdf(documents, len(ids), pdf_jobs.upload_folder)
+            else:
+                yield from packets.stream_zip(pdf_jobs, documents)
+        finally:
+            db.pool.release(conn)
+
+    if fmt == "pdf":
+        return chunks(), "application/pdf", "pdf"
+    return chunks(), "application/zip", "zip"
+
+@app.get("/api/export")
+def api_export():
+    fmt = request.args.get("format", "zip")
+    if fmt not in ("zip", "pdf"):
+        return jsonify({"error": "format must be zip or pdf"}), 400
+    try:
+        charger_type_id = request.args.get("charger_type_id", type=int)
+        customer_id = request.args.get("customer_id", type=int)
+        sow_ids = [int(v) for arg in request.args.getlist("sow_ids") for v in arg.split(",") if v]
+        stream, mimetype, ext = packet_stream(fmt, charger_type_id, customer_id, sow_ids)
+    except ValueError:
+        return jsonify({"error": "sow_ids must be a comma-separated list of ids"}), 400
+    except packets.PacketTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return Response(stream, mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="sow-packet-{stamp}.{ext}"',
+    })
+
+@app.cli.command("export-packet")
+@click.option("--output", "-o", required=True, type=click.Path(dir_okay=False), help="File to write.")
+@click.option("--format", "fmt", type=click.Choice(["zip", "pdf"]), default="zip")
+@click.option("--charger-type-id", type=int)
+@click.option("--customer-id", type=int)
+@click.option("--sow-id", "sow_ids", type=int, multiple=True)
+def export_packet_command(output, fmt, charger_type_id, customer_id, sow_ids):
+    """Export SOWs as a ZIP of PDFs or one merged PDF."""
+    stream, _, _ = packet_stream(fmt, charger_type_id, customer_id, list(sow_ids))
+    size = 0
+    with open(output, "wb") as f:
+        for chunk in stream:
+            f.write(chunk)
+            size += len(chunk)
+    pdf_jobs.shutdown()
+    print(f"Wrote {size} bytes to {output}")
+
+# --- Bulk import / export of SOWs and customers ---
+app.config['IMPORT_MAX_BYTES'] = 1024 * 1024 * 1024
+EXPORT_MIMETYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+@app.post("/api/import/<entity>")
+def api_import(entity):
+    """Import a CSV or JSONL request body; ``format`` defaults from the Content-Type."""
+    if entity not in bulk.ENTITIES:
+        return jsonify({"error": f"entity must be one of {', '.join(bulk.ENTITIES)}"}), 404
+    fmt = request.args.get("format") or bulk.guess_format(mimetype=request.mimetype)
+    if fmt not in bulk.FORMATS:
+        return jsonify({"error": "format must be csv or jsonl"}), 400
+    batch_size = max(1, request.args.get("batch_size", bulk.BATCH_SIZE, type=int))
+    create_missing = request.args.get("create_missing", type=int) == 1
+    # The body is streamed, so it may be larger than a form upload.
+    request.max_content_length = app.config['IMPORT_MAX_BYTES']
+    with get_db() as conn:
+        report = bulk.import_records(
+            conn, entity, bulk.read_records(request.stream, fmt), batch_size, create_missing
+        )
+    return jsonify(report.as_dict())
+
+@app.get("/api/export/<entity>")
+def api_export_data(entity):
+    if entity not in bulk.ENTITIES:
+        return jsonify({"error": f"entity must be one of {', '.join(bulk.ENTITIES)}"}), 404
+    fmt = request.args.get("format", "jsonl")
+    if fmt not in bulk.FORMATS:
+        return jsonify({"error": "format must be csv or jsonl"}), 400
+    # Streamed past the request's app context, so it holds its own connection.
+    conn = db.pool.acquire()
+
+    def chunks():
+        try:
+            yield from bulk.iter_export(conn, entity, fmt)
+        finally:
+            db.pool.release(conn)
+
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return Response(chunks(), mimetype=EXPORT_MIMETYPES[fmt], headers={
+        "Content-Disposition": f'attachment; filename="{entity}-{stamp}.{fmt}"',
+    })
+
+@app.cli.command("import-data")
+@click.argument("entity", type=click.Choice(bulk.ENTITIES))
+@click.argument("source", type=click.File("rb"))
+@click.option("--format", "fmt", type=click.Choice(bulk.FORMATS), help="Default: from the file extension.")
+@click.option("--batch-size", type=click.IntRange(min=1), default=bulk.BATCH_SIZE, show_default=True)
+@click.option("--create-missing", is_flag=True, help="Create charger types and customers named by SOWs.")
+def import_data_command(entity, source, fmt, batch_size, create_missing):
+    """Import SOWs or customers from a CSV or JSONL file ("-" for stdin)."""
+    fmt = fmt or bulk.guess_format(source.name)
+    if fmt is None:
+        raise click.UsageError("Cannot tell the format from the file name; pass --format.")
+    started = time.perf_counter()
+    report = bulk.import_records(get_db(), entity, bulk.read_records(source, fmt), batch_size, create_missing)
+    for error in report.as_dict()["errors"]:
+        print(f"line {error['line']}: {error['error']}")
+    if report.error_count > len(report.errors):
+        print(f"... and {report.error_count - len(report.errors)} more")
+    print(f"Imported {report.inserted} {entity} in {time.perf_counter() - started:.1f}s; {report.error_count} rejected.")
+    if report.error_count:
+        raise SystemExit(1)
+
+@app.cli.command("export-data")
+@click.argument("entity", type=click.Choice(bulk.ENTITIES))
+@click.option("--output", "-o", required=True, type=click.File("wb"), help='File to write ("-" for stdout).')
+@click.option("--format", "fmt", type=click.Choice(bulk.FORMATS), default="jsonl", show_default=True)
+def export_data_command(entity, output, fmt):
+    """Export every SOW (with image references) or customer as CSV or JSONL."""
+    for chunk in bulk.iter_export(get_db(), entity, fmt):
+        output.write(chunk)
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    """Write fingerprinted, precompressed copies of the static assets (run at deploy)."""
+    for name, hashed in assets.build(app.static_folder).items():
+        print(f"{name} -> {hashed}")
+    if assets.brotli is None:
+        print("brotli is not installed; only gzip variants were written.")
+
+# --- Production serving ---
+draining = False
+_prepared = False
+
+def create_app():
+    """Return the app ready to serve: schema migrated, query plans checked
+    and caches warm.
+
+    This is the WSGI entry point (``gunicorn --preload 'app:create_app()'``
+    or ``flask serve``). A pre-forking server calls it once in the parent,
+    so the work is not repeated per worker and what it loads is shared.
+    Importing app.py alone does none of this, which keeps CLI start-up fast.
+    """
+    global _prepared
+    if _prepared:
+        return app
+    with app.app_context():
+        applied = ensure_schema()
+        if applied:
+            app.logger.warning("Applied migrations: %s", ", ".join(applied))
+        for name, detail in migrations.check_query_plans(get_db()):
+            app.logger.warning("Query plan for %s: %s", name, detail)
+        reference_data.lists(get_db(), "charger_types", "customers")
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+    if app.config['PREWARM_PDF']:
+        import pdf_render
+        pdf_render.warm_up()
+    # SQLite connections must not be shared across fork().
+    db.pool.close_all()
+    _prepared = True
+    return app
+
+def shutdown():
+    """Stop reporting ready, then wait for queued PDF renders and image processing."""
+    global draining
+    draining = True
+    pdf_jobs.shutdown(wait=True)
+    image_ingest.shutdown(wait=True)
+
+@app.get("/healthz")
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.get("/readyz")
+def readyz():
+    problems = []
+    if draining:
+        problems.append("shutting down")
+    try:
+        version = migrations.schema_version(get_db())
+        if version != len(migrations.MIGRATIONS):
+            problems.append(f"schema version {version}, expected {len(migrations.MIGRATIONS)}")
+    except sqlite3.Error as e:
+        problems.append(f"database: {e}")
+    resp = jsonify({"status": "unavailable" if problems else "ready", "problems": problems})
+    resp.status_code = 503 if problems else 200
+    resp.cache_control.no_store = True
+    return resp
+
+@app.get("/api/admission")
+def api_admission():
+    """Live slots, queue depth and rejections per admission class (this process)."""
+    resp = jsonify({"enabled": admission.ENABLED, "pid": os.getpid(), "classes": admission.stats()})
+    resp.cache_control.no_store = True
+    return resp
+
+@app.cli.command("serve", with_appcontext=False)
+@click.option("--host", default=os.environ.get("SOW_HOST", "0.0.0.0"), show_default=True)
+@click.option("--port", type=int, default=int(os.environ.get("SOW_PORT", 8000)), show_default=True)
+@click.option("--workers", type=click.IntRange(min=1), default=int(os.environ.get("SOW_WORKERS", 0)) or os.cpu_count() or 1,
+              show_default=True, help="Processes (SOW_WORKERS).")
+@click.option("--threads", type=click.IntRange(min=1), default=int(os.environ.get("SOW_THREADS", 8)),
+              show_default=True, help="Request threads per process (SOW_THREADS).")
+@click.option("--graceful-timeout", type=click.IntRange(min=0), default=app.config['PDF_SYNC_TIMEOUT'],
+              show_default=True, help="Seconds to let in-flight requests and renders finish on shutdown.")
+def serve_command(host, port, workers, threads, graceful_timeout):
+    """Serve with pre-forked worker processes: gunicorn if installed (production),
+    else the built-in fallback in serve.py."""
+    import serve
+
+    create_app()
+    configure_workers(workers, threads)
+    if serve.gunicorn_available():
+        serve.run_gunicorn(app, host, port, workers, threads, graceful_timeout, on_exit=shutdown)
+    else:
+        app.logger.warning("gunicorn is not installed; using the built-in server, which is not hardened "
+                           "for production (pip install gunicorn)")
+        serve.run(app, host, port, workers, threads, graceful_timeout, on_exit=shutdown)
+
+def configure_workers(workers, threads):
+    """Tune per-process settings for ``workers`` processes of ``threads`` threads.
+
+    Called in the parent before forking, by ``flask serve`` and gunicorn.conf.py.
+    """
+    if admission.ENABLED and admission.budget() >= threads:
+        app.logger.warning("Admission classes can hold %d requests but workers have %d threads; "
+                           "cheap requests may wait behind them", admission.budget(), threads)
+    if not app.config['PDF_WORKERS']:
+        # Share the CPUs between the workers' PDF pools rather than give each one per CPU.
+        pdf_jobs.max_workers = max(1, (os.cpu_count() or 1) // workers)
+
 # --- Dev server ---
 if __name__ == "__main__":
     ensure_schema()
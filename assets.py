@@ -0,0 +1,152 @@
+# assets.py
+"""Fingerprinted, precompressed static assets and compressed dynamic responses.
+
+``flask build-assets`` (run once per deploy) copies each of ``ASSETS`` to
+``static/build/<name>.<hash>.<ext>`` next to ``.gz`` and, when the brotli
+module is installed, ``.br`` variants, and writes a manifest. Templates link
+assets through ``asset_url()``, which resolves the hashed name when there is
+a manifest (and the app is not in debug mode), so an asset's URL changes
+exactly when its content does and browsers may cache it forever. Uploads in
+content-addressed storage (``ab/cd/<sha256>.<ext>``) are immutable as well.
+
+JSON and HTML responses of at least ``COMPRESS_MIN_BYTES`` are gzipped at
+``COMPRESS_LEVEL`` when the client accepts it.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built
+    brotli = None
+
+ASSETS = ("app.js", "style.css", "uploads.js")
+BUILD_DIR = "build"
+MANIFEST = "manifest.json"
+HASH_LENGTH = 12
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Best first; only variants that exist on disk are offered.
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE = {"application/json", "text/html"}
+_CONTENT_ADDRESSED = re.compile(r"uploads/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.")
+
+
+def _write(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(static_folder, names=ASSETS):
+    """Write the hashed, precompressed copies of ``names`` and return the manifest.
+
+    Files from earlier builds are left in place, so pages rendered before a
+    deploy can still load the assets they name.
+    """
+    os.makedirs(os.path.join(static_folder, BUILD_DIR), exist_ok=True)
+    manifest = {}
+    for name in names:
+        with open(os.path.join(static_folder, name), "rb") as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        hashed = f"{BUILD_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+        target = os.path.join(static_folder, hashed)
+        _write(target, data)
+        _write(target + ".gz", gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            _write(target + ".br", brotli.compress(data, quality=11))
+        manifest[name] = hashed
+    _write(os.path.join(static_folder, BUILD_DIR, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(name):
+    """URL of static asset ``name``: the fingerprinted copy when one is built."""
+    if not current_app.debug:
+        name = current_app.extensions["assets"]["manifest"].get(name, name)
+    return url_for("static", filename=name)
+
+
+def version():
+    """Changes whenever any fingerprinted asset does ("dev" without a build)."""
+    return current_app.extensions["assets"]["version"]
+
+
+def _static_view(filename):
+    app = current_app
+    folder = app.static_folder
+    if filename in app.extensions["assets"]["hashed"]:
+        resp = None
+        accepted = request.accept_encodings
+        for encoding, suffix in PRECOMPRESSED:
+            if accepted[encoding] and os.path.exists(os.path.join(folder, filename + suffix)):
+                resp = send_from_directory(folder, filename + suffix, mimetype=mimetypes.guess_type(filename)[0],
+                                           max_age=IMMUTABLE_MAX_AGE)
+                resp.content_encoding = encoding
+                break
+        if resp is None:
+            resp = send_from_directory(folder, filename, max_age=IMMUTABLE_MAX_AGE)
+        resp.vary.add("Accept-Encoding")
+    elif _CONTENT_ADDRESSED.match(filename):
+        resp = send_from_directory(folder, filename, max_age=IMMUTABLE_MAX_AGE)
+    else:
+        return app.send_static_file(filename)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+
+def _compress(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.content_encoding or response.mimetype not in COMPRESSIBLE):
+        return response
+    config = current_app.config
+    if response.calculate_content_length() < config["COMPRESS_MIN_BYTES"]:
+        return response
+    response.vary.add("Accept-Encoding")
+    if not request.accept_encodings["gzip"]:
+        return response
+    response.set_data(gzip.compress(response.get_data(), config["COMPRESS_LEVEL"], mtime=0))
+    response.content_encoding = "gzip"
+    # The encoded bytes differ, so a strong validator no longer applies.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def load(app):
+    """(Re)read the manifest from ``app.static_folder``."""
+    manifest = load_manifest(app.static_folder)
+    app.extensions["assets"] = {
+        "manifest": manifest,
+        "hashed": set(manifest.values()),
+        "version": hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:HASH_LENGTH]
+        if manifest else "dev",
+    }
+
+
+def init_app(app):
+    """Load the manifest, serve static files through ``_static_view`` and
+    register ``asset_url`` for templates and response compression."""
+    load(app)
+    app.config.setdefault("COMPRESS_MIN_BYTES", 1024)
+    app.config.setdefault("COMPRESS_LEVEL", 6)
+    app.view_functions["static"] = _static_view
+    app.jinja_env.globals["asset_url"] = asset_url
+    app.after_request(_compress)
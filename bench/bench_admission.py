@@ -0,0 +1,187 @@
+# bench/bench_admission.py
+"""Cheap-read latency under a burst of PDF downloads and uploads, with and
+without admission control.
+
+    python bench/generate_data.py /tmp/sow-data --sows 500
+    python bench/bench_admission.py /tmp/sow-data [--duration 20] [--heavy 16]
+        [--cheap 4] [--workers 1] [--threads 8] [--modes off,on]
+
+For each mode the app is served by ``flask serve`` (pre-forked, with
+``--threads`` request threads per worker) on a free port, once with
+``SOW_ADMISSION=0`` and once with the default limits. ``--heavy`` clients,
+each with its own address (sent as X-Forwarded-For, with SOW_PROXY_HOPS=1),
+download PDFs of random SOWs (mostly cold renders; the PDF cache starts
+empty) or upload 2 MiB files in 1 MiB chunks; a rejected client waits
+``--backoff`` seconds and tries again, like a user clicking again.
+``--cheap`` clients meanwhile read ``/api/sows/<id>`` and ``/api/sows``
+and record their latency. Reports the cheap reads' percentiles, what
+happened to the heavy requests and the server's /api/admission counters.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK = 1024 * 1024
+UPLOAD_SIZE = 2 * CHUNK
+TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def call(base, method, path, body=None, headers=None):
+    """(status, seconds, body); status 0 if the request failed outright."""
+    req = urllib.request.Request(base + path, data=body, method=method, headers=headers or {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
+            data = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        data, status = e.read(), e.code
+    except OSError:
+        data, status = b"", 0
+    return status, time.perf_counter() - started, data
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else None
+
+
+def start_server(args, dataset, admission, port):
+    env = dict(
+        os.environ,
+        SOW_DB_PATH=dataset["db_path"],
+        SOW_UPLOAD_FOLDER=dataset["upload_folder"],
+        SOW_PDF_CACHE_DIR=tempfile.mkdtemp(prefix="sow-admission-pdf-"),
+        SOW_ADMISSION="1" if admission else "0",
+        SOW_PROXY_HOPS="1",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "app", "serve", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--threads", str(args.threads), "--graceful-timeout", "5"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if call(base, "GET", "/readyz")[0] == 200:
+            return server, base
+        time.sleep(0.2)
+    server.kill()
+    raise SystemExit("server did not become ready")
+
+
+def heavy_client(base, i, dataset, deadline, backoff, outcomes, lock):
+    rng = random.Random(i)
+    headers = {"X-Forwarded-For": f"10.0.{i // 250}.{i % 250 + 1}"}
+    local = Counter()
+    while time.monotonic() < deadline:
+        if rng.random() < 0.75:
+            kind = "pdf"
+            status, _, _ = call(base, "GET", f"/generate_pdf/{rng.randint(1, dataset['sows'])}", headers=headers)
+        else:
+            kind = "upload"
+            status, _, data = call(base, "POST", "/api/uploads",
+                                   json.dumps({"filename": "photo.jpg", "size": UPLOAD_SIZE}).encode(),
+                                   {**headers, "Content-Type": "application/json"})
+            offset = 0
+            if status == 201:
+                url = json.loads(data)["url"]
+                while offset < UPLOAD_SIZE and status in (200, 201):
+                    status, _, data = call(base, "PATCH", url, os.urandom(CHUNK),
+                                           {**headers, "Upload-Offset": str(offset)})
+                    if status == 200:
+                        offset = json.loads(data)["offset"]
+        local[(kind, status)] += 1
+        if status in (429, 503):
+            time.sleep(backoff)
+    with lock:
+        outcomes.update(local)
+
+
+def cheap_client(base, i, dataset, deadline, latencies, failures, lock):
+    rng = random.Random(1000 + i)
+    local, failed = [], 0
+    while time.monotonic() < deadline:
+        if rng.random() < 0.5:
+            path = f"/api/sows/{rng.randint(1, dataset['sows'])}"
+        else:
+            path = f"/api/sows?charger_type_id={rng.randint(1, dataset['charger_types'])}"
+        status, seconds, _ = call(base, "GET", path)
+        local.append(seconds)
+        failed += status != 200
+        time.sleep(0.02)
+    with lock:
+        latencies.extend(local)
+        failures[0] += failed
+
+
+def run_mode(args, dataset, admission):
+    server, base = start_server(args, dataset, admission, free_port())
+    try:
+        outcomes, latencies, failures = Counter(), [], [0]
+        lock = threading.Lock()
+        deadline = time.monotonic() + args.duration
+        threads = [threading.Thread(target=heavy_client, args=(base, i, dataset, deadline, args.backoff, outcomes, lock))
+                   for i in range(args.heavy)]
+        threads += [threading.Thread(target=cheap_client, args=(base, i, dataset, deadline, latencies, failures, lock))
+                     for i in range(args.cheap)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        _, _, data = call(base, "GET", "/api/admission")
+        counters = json.loads(data)["classes"] if data else {}
+    finally:
+        server.terminate()
+        server.wait(30)
+
+    ms = lambda v: f"{v * 1000:8.1f}" if v is not None else "       -"  # noqa: E731
+    print(f"admission {'on' if admission else 'off'}: {args.heavy} heavy + {args.cheap} cheap clients, "
+          f"{args.workers} worker(s) x {args.threads} threads, {args.duration:.0f}s")
+    print(f"  cheap reads  n={len(latencies):5d} failed={failures[0]:4d}  p50 {ms(percentile(latencies, 0.5))}  "
+          f"p95 {ms(percentile(latencies, 0.95))}  p99 {ms(percentile(latencies, 0.99))}  "
+          f"max {ms(max(latencies) if latencies else None)} ms")
+    for kind in ("pdf", "upload"):
+        by_status = {status: n for (k, status), n in sorted(outcomes.items()) if k == kind}
+        print(f"  {kind:6s} {by_status}")
+    if admission:
+        for name, s in counters.items():
+            print(f"  class {name:6s} admitted {s['admitted']:5d}  rejected {s['rejected']}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("dataset_dir", help="directory written by bench/generate_data.py")
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--heavy", type=int, default=16, help="clients downloading PDFs and uploading")
+    ap.add_argument("--cheap", type=int, default=4, help="clients reading the JSON API")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--backoff", type=float, default=0.5, help="seconds a rejected heavy client waits")
+    ap.add_argument("--modes", default="off,on")
+    args = ap.parse_args()
+    with open(os.path.join(args.dataset_dir, "dataset.json")) as f:
+        dataset = json.load(f)
+    for mode in args.modes.split(","):
+        run_mode(args, dataset, mode == "on")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# bench/bench_assets.py
+"""Transfer size and modelled time-to-interactive of the index page, and
+JSON compression cost.
+
+    python bench/bench_assets.py [--sows 200] [--level 6]
+
+Fetches the index page and the assets it links through the test client,
+once as before the asset pipeline (plain /static URLs, no compression,
+every asset revalidated on repeat visits) and once with fingerprinted,
+precompressed assets and gzip. Time to interactive is modelled as two
+sequential waves (the HTML, then its CSS and JS in parallel), each costing
+one round trip plus its bytes at the link speed, plus measured server time;
+the page is usable once app.js has run. Repeat visits fetch the HTML and,
+before, revalidate every asset (304s); immutable assets cost nothing.
+
+Runs against a throwaway copy of sow_database.db and static/.
+"""
+import argparse
+import gzip
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_data import paragraph, steps  # noqa: E402
+
+# (name, bits per second, round trip seconds)
+LINKS = [
+    ("mobile 1.6 Mbps / 150 ms", 1.6e6, 0.150),
+    ("broadband 10 Mbps / 40 ms", 10e6, 0.040),
+]
+HEADER_BYTES = 300  # rough size of response headers per request
+
+
+def seed(path, n):
+    import sqlite3
+    rng = random.Random(1)
+    conn = sqlite3.connect(path)
+    ct = conn.execute("SELECT id FROM charger_types ORDER BY id LIMIT 1").fetchone()[0]
+    with conn:
+        for i in range(n):
+            title = f"Bench SOW {i}"
+            conn.execute(
+                "INSERT INTO sows (title, name, charger_type_id, maintenance_scope, parts, tools, documents, "
+                "service_instructions) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (title, title, ct, paragraph(rng, 3, 8), "PN 1234 x2", "Multimeter", "Service manual", steps(rng, 10, 60)),
+            )
+    conn.close()
+
+
+def fetch(client, url, encoding, etag=None):
+    headers = {"Accept-Encoding": encoding}
+    if etag:
+        headers["If-None-Match"] = etag
+    started = time.perf_counter()
+    resp = client.get(url, headers=headers)
+    elapsed = time.perf_counter() - started
+    return resp, len(resp.data) + HEADER_BYTES, elapsed
+
+
+def page_load(client, encoding):
+    """Return ``[(wave, url, bytes, server_s)]`` for a first and a repeat visit."""
+    html, size, server = fetch(client, "/", encoding)
+    first = [(0, "/", size, server)]
+    body = gzip.decompress(html.data) if html.content_encoding == "gzip" else html.data
+    repeat = [(0, "/", size, server)]
+    for url in re.findall(rb'(?:href|src)="(/static/[^"]+)"', body):
+        url = url.decode()
+        resp, size, server = fetch(client, url, encoding)
+        first.append((1, url, size, server))
+        if "immutable" not in (resp.headers.get("Cache-Control") or ""):
+            _, size, server = fetch(client, url, encoding, resp.headers.get("ETag"))
+            repeat.append((1, url, size, server))
+    return first, repeat
+
+
+def modelled_seconds(requests, bps, rtt):
+    total = 0.0
+    for wave in sorted({w for w, *_ in requests}):
+        batch = [r for r in requests if r[0] == wave]
+        total += rtt + sum(r[2] for r in batch) * 8 / bps + max(r[3] for r in batch)
+    return total
+
+
+def report(label, first, repeat):
+    print(f"\n{label}")
+    for _, url, size, _ in first:
+        print(f"  {size:8,d} B  {url}")
+    print(f"  {sum(r[2] for r in first):8,d} B  first visit, {len(first)} requests")
+    print(f"  {sum(r[2] for r in repeat):8,d} B  repeat visit, {len(repeat)} requests")
+    for name, bps, rtt in LINKS:
+        print(f"  TTI {name}: first {modelled_seconds(first, bps, rtt) * 1000:6.0f} ms, "
+              f"repeat {modelled_seconds(repeat, bps, rtt) * 1000:6.0f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sows", type=int, default=200)
+    ap.add_argument("--level", type=int, default=6, help="gzip level for dynamic responses")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="sow-assets-")
+    try:
+        db_path = os.path.join(tmp, "sow.db")
+        shutil.copy(os.path.join(ROOT, "sow_database.db"), db_path)
+        os.environ.update(SOW_DB_PATH=db_path, SOW_PDF_CACHE_DIR=os.path.join(tmp, "pdf_cache"),
+                          SOW_COMPRESS_LEVEL=str(args.level))
+        import app as app_module
+        import assets
+        app_module.ensure_schema()
+        seed(db_path, args.sows)
+        flask_app = app_module.app
+        static = os.path.join(tmp, "static")
+        shutil.copytree(flask_app.static_folder, static, ignore=shutil.ignore_patterns("uploads", "build"))
+        flask_app.static_folder = static
+        client = flask_app.test_client()
+
+        assets.load(flask_app)  # no manifest: plain URLs
+        first, repeat = page_load(client, "identity")
+        report("Before: plain /static URLs, uncompressed, revalidated", first, repeat)
+
+        assets.build(static)
+        assets.load(flask_app)
+        first, repeat = page_load(client, "gzip, deflate, br")
+        report(f"After: fingerprinted, precompressed{' (br)' if assets.brotli else ' (gzip)'}, immutable", first, repeat)
+
+        print(f"\nJSON responses (gzip level {args.level}, min {flask_app.config['COMPRESS_MIN_BYTES']} B)")
+        sow_id = app_module.get_db().execute("SELECT MAX(id) FROM sows").fetchone()[0]
+        for url in ("/api/sows?limit=50", f"/api/sows/{sow_id}", f"/api/sow_document/{sow_id}", "/api/sync"):
+            plain, plain_size, plain_s = fetch(client, url, "identity")
+            packed, packed_size, packed_s = fetch(client, url, "gzip")
+            print(f"  {url:28s} {plain_size:9,d} B -> {packed_size:9,d} B "
+                  f"({packed_size / plain_size:4.0%}), server {plain_s * 1000:5.1f} -> {packed_s * 1000:5.1f} ms")
+        data = fetch(client, "/api/sync", "identity")[0].data
+        for level in (1, 6, 9):
+            started = time.perf_counter()
+            size = len(gzip.compress(data, level))
+            print(f"  /api/sync at level {level}: {size:9,d} B in {(time.perf_counter() - started) * 1000:6.1f} ms")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench/bench_db.py
+"""Requests/sec on /api/sows and /api/sows/<id>: per-call connect vs. the pool.
+
+    python bench/bench_db.py [--requests 2000] [--threads 4] [--sows 500]
+
+Runs against a throwaway copy of sow_database.db; the real file is untouched.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def legacy_get_db():
+    # The original helper: a brand-new connection for every call.
+    conn = sqlite3.connect(os.environ["SOW_DB_PATH"])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def seed(path, n):
+    conn = sqlite3.connect(path)
+    ct = conn.execute("SELECT id FROM charger_types ORDER BY id LIMIT 1").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO sows (title, name, charger_type_id, service_instructions) VALUES (?, ?, ?, ?)",
+        [(f"Bench SOW {i}", f"Bench SOW {i}", ct, "Step. " * 200) for i in range(n)],
+    )
+    conn.commit()
+    conn.close()
+    return ct
+
+
+def run(app, urls, total, threads):
+    def worker(count):
+        client = app.test_client()
+        for i in range(count):
+            resp = client.get(urls[i % len(urls)])
+            assert resp.status_code == 200, resp.status_code
+
+    per_thread = total // threads
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(worker, [per_thread] * threads))
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--sows", type=int, default=500)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="sow-bench-")
+    db_path = os.path.join(tmp, "sow_database.db")
+    shutil.copy(os.path.join(ROOT, "sow_database.db"), db_path)
+    os.environ["SOW_DB_PATH"] = db_path
+    ct = seed(db_path, args.sows)
+
+    import app as app_module
+
+    sow_id = app_module.get_db().execute("SELECT MAX(id) FROM sows").fetchone()[0]
+    cases = {
+        "/api/sows": [f"/api/sows?charger_type_id={ct}"],
+        "/api/sows/<id>": [f"/api/sows/{sow_id - i}" for i in range(50)],
+    }
+    pooled_get_db = app_module.get_db
+    try:
+        print(f"{'endpoint':<18}{'before req/s':>14}{'after req/s':>14}{'speedup':>10}")
+        for name, urls in cases.items():
+            app_module.get_db = legacy_get_db
+            before = run(app_module.app, urls, args.requests, args.threads)
+            app_module.get_db = pooled_get_db
+            after = run(app_module.app, urls, args.requests, args.threads)
+            print(f"{name:<18}{before:>14.0f}{after:>14.0f}{after / before:>9.2f}x")
+    finally:
+        app_module.get_db = pooled_get_db
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
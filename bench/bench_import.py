@@ -0,0 +1,105 @@
+# bench/bench_import.py
+"""Bulk import and export throughput.
+
+    python bench/bench_import.py [--sows 100000] [--format jsonl] [--batch-size 1000]
+
+Writes ``--sows`` synthetic SOW records (the same text generator as
+generate_data.py) to a temporary file, imports them into a fresh database
+through bulk.import_records, then exports them again. Reports wall time,
+rows per second and peak RSS, which should stay flat as ``--sows`` grows.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bulk  # noqa: E402
+from db import SQLITE_PRAGMAS  # noqa: E402
+import migrations  # noqa: E402
+from generate_data import DOCS, MODELS, OBJECTS, TOOLS, VERBS, paragraph, steps  # noqa: E402
+
+
+def peak_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+
+
+def write_source(path, fmt, n, n_types, n_customers, seed):
+    rng = random.Random(seed)
+    fields = ("title", "charger_type", "customer", *bulk.SOW_TEXT_FIELDS, "created_at")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fields) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        for i in range(n):
+            record = {
+                "title": f"{rng.choice(VERBS)} {rng.choice(OBJECTS)[4:]} - {rng.choice(MODELS)} #{i}",
+                "charger_type": f"Type {rng.randrange(n_types)}",
+                "customer": f"Customer {rng.randrange(n_customers)}" if rng.random() < 0.7 else "",
+                "maintenance_scope": paragraph(rng, 3, 8),
+                "parts": "\n".join(f"PN {rng.randrange(1000, 9999)} x{rng.randint(1, 4)}" for _ in range(rng.randint(1, 8))),
+                "tools": "\n".join(rng.sample(TOOLS, rng.randint(2, 5))),
+                "documents": "\n".join(rng.sample(DOCS, rng.randint(1, 3))),
+                "service_instructions": steps(rng, 10, 60),
+                "created_at": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+            }
+            if writer:
+                writer.writerow(record)
+            else:
+                f.write(json.dumps(record) + "\n")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sows", type=int, default=100_000)
+    ap.add_argument("--format", choices=bulk.FORMATS, default="jsonl")
+    ap.add_argument("--batch-size", type=int, default=bulk.BATCH_SIZE)
+    ap.add_argument("--charger-types", type=int, default=25)
+    ap.add_argument("--customers", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="sow-import-") as tmp:
+        source = os.path.join(tmp, f"sows.{args.format}")
+        write_source(source, args.format, args.sows, args.charger_types, args.customers, args.seed)
+        print(f"source: {args.sows} records, {os.path.getsize(source) / 1e6:.1f} MB")
+
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        for pragma in SQLITE_PRAGMAS:  # as `flask import-data` runs
+            conn.execute(pragma)
+        migrations.migrate(conn)
+        with conn:
+            conn.executemany("INSERT INTO charger_types (name) VALUES (?)",
+                             [(f"Type {i}",) for i in range(args.charger_types)])
+            conn.executemany("INSERT INTO customers (name) VALUES (?)",
+                             [(f"Customer {i}",) for i in range(args.customers)])
+
+        start = time.perf_counter()
+        with open(source, "rb") as f:
+            report = bulk.import_records(conn, "sows", bulk.read_records(f, args.format), args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"import: {report.inserted} rows in {elapsed:.1f}s ({report.inserted / elapsed:,.0f} rows/s), "
+              f"{report.error_count} errors, peak RSS {peak_rss_mb()} MB")
+
+        start = time.perf_counter()
+        size = sum(len(chunk) for chunk in bulk.iter_export(conn, "sows", args.format))
+        elapsed = time.perf_counter() - start
+        print(f"export: {size / 1e6:.1f} MB in {elapsed:.1f}s ({args.sows / elapsed:,.0f} rows/s), "
+              f"peak RSS {peak_rss_mb()} MB")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# bench/bench_pdf.py
+"""Per-render latency and peak RSS of single-SOW PDFs.
+
+    python bench/bench_pdf.py [--runs 20] [--images 20]
+
+Scenarios are a text-only SOW and one with ``--images`` photos (processed
+through image_ingest like real uploads). Each is measured in a fresh process
+so peak RSS is per scenario, once the old way (stylesheet and header rebuilt
+for every render, output written to a NamedTemporaryFile and read back) and
+once through the spooled stream used now.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SOW = {
+    "id": 1, "title": "Bench SOW", "name": "Bench SOW", "updated_at": "2024-01-01 00:00:00", "revision": 1,
+    "maintenance_scope": "Inspect and service the charger. " * 40,
+    "parts": "Contactor, fan filter, card reader. " * 10,
+    "tools": "Torque wrench, insulation tester. " * 10,
+    "documents": "Service manual rev C. " * 5,
+    "service_instructions": "Isolate, verify zero energy, replace the part, torque to spec. " * 120,
+}
+CUSTOMER = {
+    "id": 1, "name": "Bench Customer",
+    "check_in_contact": "Front desk", "check_in_phone": "555-0100", "check_in_instructions": "Badge in at gate 2.",
+    "check_out_contact": "Front desk", "check_out_phone": "555-0100", "check_out_instructions": "Return badge.",
+}
+
+
+def make_images(folder, count, seed=3):
+    from PIL import Image, ImageDraw
+    from image_ingest import process_image
+
+    rng = random.Random(seed)
+    images = []
+    for i in range(count):
+        img = Image.new("RGB", (4000, 3000), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(200):
+            x, y = rng.randrange(4000), rng.randrange(3000)
+            draw.rectangle([x, y, x + rng.randrange(50, 600), y + rng.randrange(50, 600)],
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        filename = f"photo{i}.jpg"
+        img.save(os.path.join(folder, filename), "JPEG", quality=90)
+        fields = process_image(folder, filename)
+        images.append({"id": i + 1, "sow_id": 1, "filename": filename, "original_name": filename,
+                       "caption": f"Photo {i}", **fields})
+    return images
+
+
+def peak_rss_mb():
+    # VmHWM is per address space; ru_maxrss would carry the parent's peak
+    # across exec.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+
+
+def child(mode, images_json, upload_folder, runs):
+    import pdf_render
+
+    images = json.loads(images_json)
+    timings, size = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        if mode == "legacy":
+            pdf_render.get_styles.cache_clear()
+            tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            tmp.close()
+            pdf_render.render_sow_pdf(tmp.name, SOW, CUSTOMER, images, upload_folder)
+            with open(tmp.name, "rb") as f:
+                size = sum(len(block) for block in iter(lambda: f.read(64 * 1024), b""))
+            os.remove(tmp.name)  # the old code left it behind
+        else:
+            render = lambda buf: pdf_render.render_sow_pdf(buf, SOW, CUSTOMER, images, upload_folder)  # noqa: E731
+            size = sum(len(block) for block in pdf_render.iter_pdf(render))
+        timings.append((time.perf_counter() - start) * 1000)
+    print(json.dumps({
+        "p50_ms": round(statistics.median(timings), 1),
+        "max_ms": round(max(timings), 1),
+        "pdf_bytes": size,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--images", type=int, default=20)
+    ap.add_argument("--child", nargs=3, metavar=("MODE", "IMAGES", "FOLDER"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(*args.child, args.runs)
+
+    with tempfile.TemporaryDirectory(prefix="sow-pdf-") as folder:
+        scenarios = {"text only": [], f"{args.images} images": make_images(folder, args.images)}
+        for name, images in scenarios.items():
+            for mode in ("legacy", "stream"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--runs", str(args.runs), "--child", mode, json.dumps(images), folder],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                print(f"{name + ' / ' + mode:<22}", json.loads(out))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# bench/bench_revisions.py
+"""Storage growth and read cost of SOW revision history.
+
+    python bench/bench_revisions.py [--sows 5] [--edits 2000] [--steps 150]
+
+Builds a throwaway database with the app's migrations, creates SOWs with
+long service instructions and applies thousands of small edits to them
+through revisions.record(): a step reworded, inserted or removed, now and
+then a scope tweak. Reports the history size against keeping every
+version as a full copy (raw and zlib-compressed), the time per edit, and
+the time to rebuild revisions, checking each against the text it had.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import migrations  # noqa: E402
+import revisions  # noqa: E402
+from generate_data import paragraph, steps  # noqa: E402
+
+
+def small_edit(rng, sow):
+    lines = sow["service_instructions"].split("\n")
+    i = rng.randrange(len(lines))
+    action = rng.random()
+    if action < 0.6:
+        lines[i] = f"{lines[i].split('. ', 1)[0]}. {paragraph(rng, 1, 3)}"
+    elif action < 0.8:
+        lines.insert(i, f"{i + 1}. {paragraph(rng, 1, 2)}")
+    elif len(lines) > 1:
+        del lines[i]
+    fields = {"service_instructions": "\n".join(lines)}
+    if rng.random() < 0.1:
+        fields["maintenance_scope"] = paragraph(rng, 3, 8)
+    return fields
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sows", type=int, default=5)
+    ap.add_argument("--edits", type=int, default=2000, help="edits per SOW")
+    ap.add_argument("--steps", type=int, default=150, help="service instruction steps per SOW")
+    ap.add_argument("--snapshot-every", type=int, default=revisions.SNAPSHOT_EVERY)
+    ap.add_argument("--reads", type=int, default=500)
+    args = ap.parse_args()
+    revisions.SNAPSHOT_EVERY = args.snapshot_every
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory(prefix="sow-revisions-") as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "sow.db"))
+        conn.row_factory = sqlite3.Row
+        migrations.migrate(conn)
+        with conn:
+            ct = conn.execute("INSERT INTO charger_types (name) VALUES ('Bench charger')").lastrowid
+            sow_ids = [
+                conn.execute(
+                    "INSERT INTO sows (title, name, charger_type_id, maintenance_scope, parts, tools, documents, "
+                    "service_instructions) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (f"Bench SOW {i}", f"Bench SOW {i}", ct, paragraph(rng, 3, 8), "PN 1234 x2", "Multimeter",
+                     "Service manual", steps(rng, args.steps, args.steps)),
+                ).lastrowid
+                for i in range(args.sows)
+            ]
+
+        current = {sow_id: dict(conn.execute("SELECT * FROM sows WHERE id = ?", (sow_id,)).fetchone())
+                   for sow_id in sow_ids}
+        expected = {(sow_id, 1): current[sow_id]["service_instructions"] for sow_id in sow_ids}
+        full_raw = sum(len(str(revisions._fields(sow)).encode()) for sow in current.values())
+        full_zlib = sum(len(revisions._pack(revisions._fields(sow))) for sow in current.values())
+        edit_times = []
+        for _ in range(args.edits):
+            for sow_id in sow_ids:
+                sow = current[sow_id]
+                fields = small_edit(rng, sow)
+                started = time.perf_counter()
+                with conn:
+                    revision = revisions.record(conn, sow_id, fields)
+                edit_times.append(time.perf_counter() - started)
+                sow.update(fields, revision=revision)
+                expected[(sow_id, revision)] = sow["service_instructions"]
+                data = revisions._fields(sow)
+                full_raw += len(str(data).encode())
+                full_zlib += len(zlib.compress(str(data).encode(), revisions.COMPRESS_LEVEL))
+
+        kinds = {row["kind"]: (row["n"], row["bytes"]) for row in conn.execute(
+            "SELECT kind, COUNT(*) AS n, SUM(length(data)) AS bytes FROM sow_revisions GROUP BY kind")}
+        stored = sum(size for _, size in kinds.values())
+        versions = len(expected)
+        print(f"{args.sows} SOWs x {args.edits} edits, {args.steps} steps, snapshot every {revisions.SNAPSHOT_EVERY}")
+        print(f"  current text per SOW   {statistics.mean(len(s['service_instructions']) for s in current.values()):10,.0f} B")
+        for kind, (n, size) in sorted(kinds.items()):
+            print(f"  {kind:9s} {n:8,d} rows {size:12,d} B  ({size / n:8,.0f} B each)")
+        print(f"  history                {stored:12,d} B  ({stored / versions:8,.0f} B per revision)")
+        print(f"  full copies            {full_raw:12,d} B  ({full_raw / stored:5.1f}x the history)")
+        print(f"  full copies, zlib      {full_zlib:12,d} B  ({full_zlib / stored:5.1f}x the history)")
+        print(f"  record() p50 {percentile(edit_times, 0.5) * 1000:.2f} ms, p99 {percentile(edit_times, 0.99) * 1000:.2f} ms")
+
+        keys = rng.sample(sorted(expected), min(args.reads, versions))
+        read_times = []
+        for sow_id, revision in keys:
+            started = time.perf_counter()
+            version = revisions.load(conn, sow_id, revision)
+            read_times.append(time.perf_counter() - started)
+            assert version["service_instructions"] == expected[(sow_id, revision)], (sow_id, revision)
+        print(f"  load() p50 {percentile(read_times, 0.5) * 1000:.2f} ms, p99 {percentile(read_times, 0.99) * 1000:.2f} ms, "
+              f"max {max(read_times) * 1000:.2f} ms ({len(keys)} random revisions, all match)")
+        started = time.perf_counter()
+        for _ in range(args.reads):
+            conn.execute("SELECT * FROM sows WHERE id = ?", (sow_ids[0],)).fetchone()
+        print(f"  current SOW read {(time.perf_counter() - started) / args.reads * 1e6:.1f} us")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
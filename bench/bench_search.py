@@ -0,0 +1,106 @@
+# bench/bench_search.py
+"""Latency of /api/sows/search queries against a synthetic SOW corpus.
+
+    python bench/bench_search.py [--sows 100000] [--runs 200]
+
+Builds a throwaway database with the app's migrations, fills it with SOWs
+whose text follows a Zipf-like word distribution, then times typical
+type-ahead and multi-term searches.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import migrations  # noqa: E402
+import search  # noqa: E402
+
+DOMAIN_WORDS = (
+    "charger cable connector ccs chademo contactor inverter module fan filter "
+    "firmware reboot breaker torque inspection voltage insulation ground fault "
+    "rectifier cooling pump coolant display card reader modem antenna secc "
+    "relay fuse busbar thermal camera hmi enclosure gasket latch"
+).split()
+
+
+def make_vocabulary(rng, size=20000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set(DOMAIN_WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    words = sorted(words)
+    rng.shuffle(words)
+    cum_weights, total = [], 0.0
+    for rank in range(len(words)):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+    return words, cum_weights
+
+
+def build_corpus(path, n, seed=7):
+    rng = random.Random(seed)
+    words, cum_weights = make_vocabulary(rng)
+    # Draw one large sample up front; documents are random slices of it.
+    pool = rng.choices(words, cum_weights=cum_weights, k=2_000_000)
+
+    def text(k):
+        start = rng.randrange(len(pool) - k)
+        return " ".join(pool[start:start + k])
+
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn)
+    conn.executemany("INSERT INTO charger_types (name) VALUES (?)", [(f"Type {i}",) for i in range(20)])
+    batch = []
+    with conn:
+        for i in range(n):
+            title = f"{text(4).title()} {i}"
+            batch.append((title, title, rng.randint(1, 20), text(40), text(30), text(20), text(15), text(250)))
+            if len(batch) == 5000:
+                conn.executemany(
+                    "INSERT INTO sows (title, name, charger_type_id, maintenance_scope, parts, tools, documents, service_instructions) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                batch.clear()
+        if batch:
+            conn.executemany(
+                "INSERT INTO sows (title, name, charger_type_id, maintenance_scope, parts, tools, documents, service_instructions) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.execute("INSERT INTO sows_fts (sows_fts) VALUES ('optimize')")
+    conn.commit()
+    return conn
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sows", type=int, default=100_000)
+    ap.add_argument("--runs", type=int, default=200)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="sow-search-") as tmp:
+        start = time.perf_counter()
+        conn = build_corpus(os.path.join(tmp, "search.db"), args.sows)
+        conn.row_factory = sqlite3.Row
+        print(f"built {args.sows} SOWs in {time.perf_counter() - start:.1f}s")
+
+        queries = ["ch", "cha", "chademo", "ccs con", "firmware reboot", "inverter fan filter", "thermal cam"]
+        print(f"{'query':<22}{'hits':>6}{'p50 ms':>9}{'p95 ms':>9}")
+        for q in queries:
+            timings = []
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                hits = search.search_sows(conn, q, limit=20)
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{q!r:<22}{len(hits):>6}{statistics.median(timings):>9.2f}{p95:>9.2f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench/check_importtime.py
+"""Fail if importing the app gets slow or pulls in PDF/imaging libraries.
+
+    python bench/check_importtime.py [--budget-ms 400] [--runs 5]
+
+Imports ``app`` in fresh interpreters under ``python -X importtime`` and
+takes the fastest run, which is the least disturbed by other load. Exits 1
+if that exceeds ``--budget-ms`` or if any of ``LAZY_MODULES`` was imported:
+those load on first use (or in create_app's pre-warm) and never at import.
+Paths are pointed at a throwaway directory so the real database and
+uploads are untouched.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ("reportlab", "PIL", "serve")
+
+
+def import_times(module, env):
+    """Return ``{module: (self_us, cumulative_us)}`` for one cold import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", default="app")
+    ap.add_argument("--budget-ms", type=float, default=400)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10, help="Slowest imports to list.")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="sow-importtime-") as tmp:
+        env = dict(
+            os.environ,
+            SOW_DB_PATH=os.path.join(tmp, "sow.db"),
+            SOW_UPLOAD_FOLDER=os.path.join(tmp, "uploads"),
+            SOW_PDF_CACHE_DIR=os.path.join(tmp, "pdf_cache"),
+        )
+        runs = [import_times(args.module, env) for _ in range(args.runs)]
+    best = min(runs, key=lambda times: times[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    for name, (_, cumulative) in sorted(best.items(), key=lambda kv: -kv[1][1])[1:args.top + 1]:
+        print(f"{cumulative / 1000:8.1f} ms  {name}")
+    print(f"import {args.module}: {total_ms:.1f} ms (best of {args.runs}), budget {args.budget_ms:.0f} ms")
+
+    failed = False
+    eager = sorted({name for name in best if name.split(".")[0] in LAZY_MODULES})
+    if eager:
+        print(f"Imported eagerly: {', '.join(eager[:10])}{' ...' if len(eager) > 10 else ''}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("Over budget.")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# bench/generate_data.py
+"""Build a synthetic SOW dataset of configurable size.
+
+    python bench/generate_data.py OUT_DIR [--sows 5000] [--customers 200]
+        [--charger-types 25] [--images-per-sow 3] [--image-pool 60] [--seed 1]
+
+Writes ``OUT_DIR/sow_database.db`` (current schema, via the app's
+migrations) and ``OUT_DIR/uploads`` (content-addressed blobs with print
+derivatives and thumbnails, as the upload path produces them), plus
+``OUT_DIR/dataset.json`` describing what was generated. Point the app at it
+with SOW_DB_PATH and SOW_UPLOAD_FOLDER; bench/load_test.py does that.
+
+Images come from a pool of distinct files of varied resolution and format;
+SOWs attach random members of the pool, so blobs are shared the way
+re-uploaded photos are.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import migrations  # noqa: E402
+import storage  # noqa: E402
+from image_ingest import process_image  # noqa: E402
+
+MODELS = ["DCFC", "L2 Dual", "L2 Single", "HPC", "Fleet DC", "Dispenser", "Power Cabinet"]
+RATINGS = ["19kW", "25kW", "50kW", "62.5kW", "150kW", "180kW", "350kW"]
+VERBS = ["Inspect", "Replace", "Verify", "Torque", "Clean", "Record", "Test", "Isolate", "Calibrate", "Update", "Photograph"]
+OBJECTS = [
+    "the DC contactor", "the AC input breaker", "the cooling fan filter", "the CCS1 cable assembly",
+    "the CHAdeMO connector latch", "the power module fans", "the RFID card reader", "the cellular modem",
+    "the HMI display", "the ground fault monitor", "the coolant pump", "the enclosure door gasket",
+    "the busbar connections", "the insulation monitoring device", "the secondary controller firmware",
+]
+QUALIFIERS = [
+    "per the service manual", "before re-energising the unit", "and record the reading on the checklist",
+    "using the calibrated torque wrench", "with the site contact present", "after the lock-out/tag-out is applied",
+    "and compare against the commissioning values", "if any discolouration is visible",
+]
+TOOLS = ["Torque wrench 5-60 Nm", "Insulation tester 1000 V", "Thermal camera", "CAT III multimeter",
+         "Laptop with service software", "Lock-out/tag-out kit", "Crimping tool", "Hex driver set"]
+DOCS = ["Installation manual", "Service manual", "Firmware release notes", "Site single-line diagram",
+        "Commissioning report", "Safety data sheet"]
+# (width, height, format) of the distinct images in the pool
+IMAGE_SHAPES = [
+    (640, 480, "JPEG"), (1280, 960, "JPEG"), (1600, 1200, "JPEG"), (3264, 2448, "JPEG"),
+    (4032, 3024, "JPEG"), (3024, 4032, "JPEG"), (1200, 900, "PNG"), (800, 1100, "PNG"),
+]
+
+
+def sentence(rng):
+    return f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(QUALIFIERS)}."
+
+
+def paragraph(rng, lo, hi):
+    return " ".join(sentence(rng) for _ in range(rng.randint(lo, hi)))
+
+
+def steps(rng, lo, hi):
+    return "\n".join(f"{i}. {paragraph(rng, 1, 3)}" for i in range(1, rng.randint(lo, hi) + 1))
+
+
+def make_image(rng, width, height, fmt):
+    from PIL import Image, ImageDraw, ImageFilter
+
+    colour = lambda: tuple(rng.randrange(256) for _ in range(3))  # noqa: E731
+    if fmt == "PNG":
+        # Diagram-like: flat palette colours and lines, where PNG beats JPEG.
+        img = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(img)
+        for _ in range(60):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.rectangle([x, y, x + rng.randrange(20, 300), y + rng.randrange(20, 200)], outline=colour(), width=3)
+        img = img.convert("P", palette=Image.ADAPTIVE, colors=16)
+    else:
+        # Photo-like: soft gradients and shapes, blurred.
+        img = Image.new("RGB", (width // 4, height // 4), colour())
+        draw = ImageDraw.Draw(img)
+        for _ in range(120):
+            x, y = rng.randrange(img.width), rng.randrange(img.height)
+            draw.ellipse([x, y, x + rng.randrange(10, 200), y + rng.randrange(10, 200)], fill=colour())
+        img = img.filter(ImageFilter.GaussianBlur(3)).resize((width, height))
+    buf = io.BytesIO()
+    img.save(buf, fmt, **({"quality": 88} if fmt == "JPEG" else {}))
+    buf.seek(0)
+    return buf
+
+
+def build_image_pool(conn, upload_folder, size, rng):
+    pool = []
+    for i in range(size):
+        width, height, fmt = IMAGE_SHAPES[i % len(IMAGE_SHAPES)]
+        ext = "jpg" if fmt == "JPEG" else "png"
+        staging_path, sha256, nbytes = storage.stage(make_image(rng, width, height, fmt), upload_folder)
+        with conn:
+            blob_id, relpath = storage.commit_blob(conn, upload_folder, staging_path, sha256, nbytes, ext)
+        fields = process_image(upload_folder, relpath)
+        with conn:
+            conn.execute(
+                "UPDATE blobs SET width = ?, height = ?, print_path = ?, thumb_path = ? WHERE id = ?",
+                (fields["width"], fields["height"], fields["print_filename"], fields["thumb_filename"], blob_id),
+            )
+        pool.append((blob_id, relpath, fields, f"site_photo_{i}.{ext}"))
+    return pool
+
+
+def generate(out_dir, n_sows, n_customers, n_types, images_per_sow, pool_size, seed):
+    rng = random.Random(seed)
+    upload_folder = os.path.join(out_dir, "uploads")
+    os.makedirs(upload_folder, exist_ok=True)
+    db_path = os.path.join(out_dir, "sow_database.db")
+    if os.path.exists(db_path):
+        raise SystemExit(f"{db_path} already exists")
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    migrations.migrate(conn)
+
+    with conn:
+        conn.executemany("INSERT INTO charger_types (name) VALUES (?)", [
+            (f"{MODELS[i % len(MODELS)]} {RATINGS[i % len(RATINGS)]} Gen{i // len(MODELS) + 1}",) for i in range(n_types)
+        ])
+        conn.executemany("""
+            INSERT INTO customers (name, check_in_contact, check_in_phone, check_in_instructions,
+                                   check_out_contact, check_out_phone, check_out_instructions)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            f"Customer {i:04d} Charging Network",
+            f"Site desk {i}", f"555-{rng.randrange(10000):04d}", paragraph(rng, 1, 3),
+            f"Operations {i}", f"555-{rng.randrange(10000):04d}", paragraph(rng, 1, 2),
+        ) for i in range(n_customers)])
+
+    pool = build_image_pool(conn, upload_folder, pool_size, rng) if images_per_sow and pool_size else []
+
+    now = datetime.now()
+    n_images = 0
+    with conn:
+        for start in range(0, n_sows, 1000):
+            batch = []
+            for i in range(start, min(start + 1000, n_sows)):
+                created = (now - timedelta(seconds=rng.randrange(3 * 365 * 86400))).strftime("%Y-%m-%d %H:%M:%S")
+                title = f"{rng.choice(VERBS)} {rng.choice(OBJECTS)[4:]} - {rng.choice(MODELS)} #{i}"
+                batch.append((
+                    title, title, rng.randint(1, n_types), rng.choice([None] + list(range(1, n_customers + 1))),
+                    paragraph(rng, 3, 8),
+                    "\n".join(f"PN {rng.randrange(1000, 9999)}-{rng.randrange(100, 999)} x{rng.randint(1, 4)}"
+                              for _ in range(rng.randint(1, 8))),
+                    "\n".join(rng.sample(TOOLS, rng.randint(2, 5))),
+                    "\n".join(rng.sample(DOCS, rng.randint(1, 3))),
+                    steps(rng, 10, 60),
+                    created, created,
+                ))
+            first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM sows").fetchone()[0]
+            conn.executemany("""
+                INSERT INTO sows (title, name, charger_type_id, customer_id, maintenance_scope, parts, tools,
+                                  documents, service_instructions, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+            if not pool:
+                continue
+            rows = []
+            for sow_id in range(first_id, first_id + len(batch)):
+                for _ in range(min(len(pool), int(rng.expovariate(1 / images_per_sow)))):
+                    blob_id, relpath, fields, original = rng.choice(pool)
+                    rows.append((sow_id, relpath, original, rng.choice(["", paragraph(rng, 1, 1)]), blob_id,
+                                 fields["width"], fields["height"], fields["print_filename"], fields["thumb_filename"]))
+            conn.executemany("""
+                INSERT INTO sow_images (sow_id, filename, original_name, caption, blob_id,
+                                        width, height, print_filename, thumb_filename)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            n_images += len(rows)
+    conn.execute("PRAGMA optimize")
+    conn.close()
+
+    dataset = {
+        "db_path": db_path, "upload_folder": upload_folder, "seed": seed,
+        "charger_types": n_types, "customers": n_customers, "sows": n_sows,
+        "sow_images": n_images, "distinct_images": len(pool),
+    }
+    with open(os.path.join(out_dir, "dataset.json"), "w") as f:
+        json.dump(dataset, f, indent=2)
+    return dataset
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("out_dir")
+    ap.add_argument("--sows", type=int, default=5000)
+    ap.add_argument("--customers", type=int, default=200)
+    ap.add_argument("--charger-types", type=int, default=25)
+    ap.add_argument("--images-per-sow", type=float, default=3.0, help="mean images attached per SOW")
+    ap.add_argument("--image-pool", type=int, default=60, help="distinct image files to generate")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    start = time.perf_counter()
+    dataset = generate(args.out_dir, args.sows, args.customers, args.charger_types,
+                       args.images_per_sow, args.image_pool, args.seed)
+    print(json.dumps(dataset, indent=2))
+    print(f"generated in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
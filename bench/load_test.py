@@ -0,0 +1,245 @@
+# bench/load_test.py
+"""Concurrent load test of the main pages and APIs against a generated dataset.
+
+    python bench/generate_data.py /tmp/sow-data --sows 5000
+    python bench/load_test.py /tmp/sow-data [--duration 30] [--threads 8]
+        [--pdf-workers 2] [--out results.json] [--baseline previous.json]
+
+Drives ``/``, ``/api/sows``, ``/api/sows/<id>``, ``/edit_sows``,
+``/edit_sow/<id>`` and ``/generate_pdf/...`` from ``--threads`` threads
+through Flask's test client, in the weighted mix below, and reports
+throughput, p50/p95/p99 latency per endpoint and memory. Results are written
+as JSON (default ``bench/results/load-<timestamp>.json``); ``--baseline``
+prints the change against an earlier result file.
+
+PDFs are cached after their first render, so ``/generate_pdf`` latency mixes
+cold renders and cache hits the way real traffic does. The PDF cache lives
+in a temporary directory and starts empty on every run.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# endpoint name -> (weight, url template)
+MIX = {
+    "/": (10, lambda d, r: "/"),
+    "/api/sows": (25, lambda d, r: f"/api/sows?charger_type_id={r.randint(1, d['charger_types'])}"),
+    "/api/sows/<id>": (25, lambda d, r: f"/api/sows/{r.randint(1, d['sows'])}"),
+    "/edit_sows": (10, lambda d, r: "/edit_sows"),
+    "/edit_sow/<id>": (15, lambda d, r: f"/edit_sow/{r.randint(1, d['sows'])}"),
+    "/generate_pdf/<id>": (5, lambda d, r: (
+        f"/generate_pdf/{r.randint(1, d['sows'])}"
+        + (f"/{r.randint(1, d['customers'])}" if d["customers"] and r.random() < 0.5 else "")
+    )),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 1),
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1] if values else None),
+    }
+
+
+def rss_mb(pid="self", field="VmRSS"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def child_pids():
+    pids = []
+    try:
+        for tid in os.listdir("/proc/self/task"):
+            with open(f"/proc/self/task/{tid}/children") as f:
+                pids.extend(f.read().split())
+    except OSError:
+        pass
+    return pids
+
+
+class MemorySampler(threading.Thread):
+    """Samples RSS of this process and its children (the PDF workers)."""
+
+    def __init__(self, interval=0.25):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.peak_children = 0.0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.samples.append(rss_mb())
+            self.peak_children = max(self.peak_children, sum(rss_mb(pid) for pid in child_pids()))
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return {
+            "peak_rss_mb": round(rss_mb(field="VmHWM"), 1),
+            "mean_rss_mb": round(sum(self.samples) / len(self.samples), 1) if self.samples else None,
+            "peak_pdf_workers_rss_mb": round(self.peak_children, 1),
+        }
+
+
+def run_load(app, dataset, threads, duration, max_requests, seed):
+    names = list(MIX)
+    weights = [MIX[n][0] for n in names]
+    results = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.perf_counter() + duration
+
+    def worker(i):
+        rng = random.Random(seed + i)
+        client = app.test_client()
+        local, local_errors = defaultdict(list), defaultdict(int)
+        while time.perf_counter() < deadline:
+            if max_requests:
+                with lock:
+                    if issued[0] >= max_requests:
+                        break
+                    issued[0] += 1
+            name = rng.choices(names, weights)[0]
+            url = MIX[name][1](dataset, rng)
+            start = time.perf_counter()
+            resp = client.get(url)
+            resp.get_data()
+            resp.close()  # as a WSGI server would; frees admission slots
+            local[name].append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                local_errors[name] += 1
+        with lock:
+            for name, values in local.items():
+                results[name].extend(values)
+            for name, n in local_errors.items():
+                errors[name] += n
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return results, errors, time.perf_counter() - start
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    base = (baseline or {}).get("endpoints", {})
+    print(f"{'endpoint':<22}{'reqs':>7}{'err':>5}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, s in list(report["endpoints"].items()) + [("TOTAL", report["total"])]:
+        line = (f"{name:<22}{s['requests']:>7}{s['errors']:>5}{s['throughput_rps']:>8}"
+                f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}")
+        old = (baseline or {}).get("total") if name == "TOTAL" else base.get(name)
+        if old and old.get("p95_ms"):
+            line += f"   p95 {100 * (s['p95_ms'] / old['p95_ms'] - 1):+.0f}%  rps {100 * (s['throughput_rps'] / old['throughput_rps'] - 1):+.0f}%"
+        print(line)
+    print("memory:", report["memory"])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("dataset_dir", help="directory written by bench/generate_data.py")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    ap.add_argument("--requests", type=int, default=0, help="stop after this many requests instead")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--pdf-workers", type=int, default=2)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="result file (default bench/results/load-<timestamp>.json)")
+    ap.add_argument("--baseline", help="earlier result file to compare against")
+    args = ap.parse_args()
+
+    with open(os.path.join(args.dataset_dir, "dataset.json")) as f:
+        dataset = json.load(f)
+    cache_dir = tempfile.mkdtemp(prefix="sow-load-pdf-")
+    os.environ.update({
+        "SOW_DB_PATH": dataset["db_path"],
+        "SOW_UPLOAD_FOLDER": dataset["upload_folder"],
+        "SOW_PDF_CACHE_DIR": cache_dir,
+        "SOW_PDF_WORKERS": str(args.pdf_workers),
+    })
+    import app as app_module
+
+    sampler = MemorySampler()
+    sampler.start()
+    started_at = datetime.now().isoformat(timespec="seconds")
+    try:
+        results, errors, elapsed = run_load(
+            app_module.app, dataset, args.threads, args.duration if not args.requests else 1e9,
+            args.requests, args.seed)
+    finally:
+        memory = sampler.stop()
+        app_module.pdf_jobs.shutdown()
+
+    all_latencies = [v for values in results.values() for v in values]
+    report = {
+        "started_at": started_at,
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "dataset": dataset,
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "elapsed_s": round(elapsed, 2),
+        "total": summarize(all_latencies, sum(errors.values()), elapsed),
+        "endpoints": {name: summarize(results[name], errors[name], elapsed) for name in MIX if results[name]},
+        "memory": memory,
+    }
+
+    out = args.out or os.path.join(ROOT, "bench", "results", f"load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
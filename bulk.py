@@ -0,0 +1,338 @@
+# bulk.py
+"""Streaming bulk import and export of SOWs and customers (CSV or JSON Lines).
+
+Imports read one record at a time and insert in batches of ``batch_size``
+rows, one transaction per batch. A record that
+fails validation is reported and left out; if the database rejects a
+batch, it is replayed row by row under savepoints so only the offending
+rows are lost. Charger types and customers are referenced by name and
+resolved through reference_data's cached lists.
+
+Exports page through the tables by id inside one read transaction and
+yield encoded chunks, so neither direction holds the dataset in memory.
+Image references are exported (file, caption, sha256) but image files are
+not part of the format and are ignored on import, as are ``id`` and
+``updated_at``: imported rows are stamped with the import time, so delta
+sync clients pick them up.
+"""
+import collections
+import csv
+import io
+import json
+import sqlite3
+from datetime import datetime
+
+import reference_data
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FORMATS = ("csv", "jsonl")
+ENTITIES = ("sows", "customers")
+
+SOW_TEXT_FIELDS = ("maintenance_scope", "parts", "tools", "documents", "service_instructions")
+CUSTOMER_FIELDS = (
+    "name", "check_in_contact", "check_in_phone", "check_in_instructions",
+    "check_out_contact", "check_out_phone", "check_out_instructions",
+)
+EXPORT_FIELDS = {
+    "sows": ("id", "title", "charger_type", "customer", *SOW_TEXT_FIELDS, "created_at", "updated_at", "images"),
+    "customers": ("id", *CUSTOMER_FIELDS, "created_at", "updated_at"),
+}
+
+# (statement head, one row of VALUES) per entity.
+INSERT_SQL = {
+    "sows": (
+        f"INSERT INTO sows (title, name, charger_type_id, customer_id, {', '.join(SOW_TEXT_FIELDS)}, created_at, updated_at) VALUES ",
+        f"(?, ?, ?, ?, {', '.join('?' * len(SOW_TEXT_FIELDS))}, COALESCE(?, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)",
+    ),
+    "customers": (
+        f"INSERT INTO customers ({', '.join(CUSTOMER_FIELDS)}, updated_at) VALUES ",
+        f"({', '.join('?' * len(CUSTOMER_FIELDS))}, CURRENT_TIMESTAMP)",
+    ),
+}
+# executemany() runs one statement per row, and each statement that fires
+# the sows_fts trigger makes FTS5 flush its pending terms into a new
+# segment. Multi-row INSERTs flush once per statement: about twice as fast.
+ROWS_PER_STATEMENT = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        # Rows the database refused are found after their batch: sort.
+        errors = sorted(self.errors, key=lambda e: e["line"])
+        return {"inserted": self.inserted, "error_count": self.error_count, "errors": errors}
+
+
+def guess_format(filename=None, mimetype=None):
+    name = (filename or "").lower()
+    if name.endswith(".csv") or mimetype == "text/csv":
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")) or mimetype in ("application/jsonl", "application/x-ndjson"):
+        return "jsonl"
+    return None
+
+
+def read_records(stream, fmt):
+    """Yield ``(line, record)`` from a binary stream.
+
+    ``record`` is a dict, or a string describing why the line could not be
+    read; ``line`` is where the record starts.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None:  # reads the header
+            return
+        line = reader.line_num + 1
+        for record in reader:
+            if None in record:
+                yield line, "more fields than the header"
+            else:
+                yield line, record
+            line = reader.line_num + 1
+        return
+    for line, raw in enumerate(text, 1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            yield line, f"invalid JSON: {e}"
+            continue
+        yield line, record if isinstance(record, dict) else "not a JSON object"
+
+
+class NameLookup:
+    """Case-insensitive name -> id for charger types or customers.
+
+    Seeded from the cached reference lists; with ``create`` an unknown name
+    is inserted (committed at once, outside any batch) and remembered.
+    """
+
+    def __init__(self, conn, table, create=False):
+        self.conn = conn
+        self.table = table
+        self.create = create
+        self.ids = {row["name"].casefold(): row["id"] for row in reference_data.lists(conn, table)[0]}
+
+    def resolve(self, name):
+        key = name.casefold()
+        if key not in self.ids:
+            if not self.create:
+                raise ValueError(f"unknown {self.table[:-1].replace('_', ' ')} {name!r}")
+            # Another import or form may create the same name meanwhile.
+            self.conn.execute(f"INSERT INTO {self.table} (name) VALUES (?) ON CONFLICT(name) DO NOTHING", (name,))
+            self.conn.commit()
+            row = self.conn.execute(f"SELECT id FROM {self.table} WHERE name = ?", (name,)).fetchone()
+            self.ids[key] = row["id"]
+        return self.ids[key]
+
+
+def _text(record, field):
+    value = record.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be text")
+    return value.strip()
+
+
+def _timestamp(value):
+    """Normalise to the ``YYYY-MM-DD HH:MM:SS`` form the keyset indexes sort on."""
+    if value in (None, ""):
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip()).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise ValueError(f"invalid timestamp {value!r}") from None
+
+
+def _reference(record, field, lookup):
+    name = _text(record, field)
+    if name:
+        return lookup.resolve(name)
+    value = record.get(f"{field}_id")
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}_id must be an integer") from None
+
+
+def _sow_params(record, charger_types, customers):
+    title = _text(record, "title")
+    if not title:
+        raise ValueError("title is required")
+    charger_type_id = _reference(record, "charger_type", charger_types)
+    if charger_type_id is None:
+        raise ValueError("charger_type is required")
+    created_at = _timestamp(record.get("created_at"))
+    return (
+        title, title, charger_type_id, _reference(record, "customer", customers),
+        *(_text(record, f) for f in SOW_TEXT_FIELDS),
+        created_at,
+    )
+
+
+def _customer_params(record):
+    params = tuple(_text(record, f) for f in CUSTOMER_FIELDS)
+    if not params[0]:
+        raise ValueError("name is required")
+    return params
+
+
+def _max_parameters(conn):
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    except AttributeError:  # Python < 3.11
+        return 999
+
+
+def _insert(conn, entity, rows):
+    head, values = INSERT_SQL[entity]
+    per_statement = max(1, min(ROWS_PER_STATEMENT, _max_parameters(conn) // values.count("?")))
+    for start in range(0, len(rows), per_statement):
+        chunk = rows[start:start + per_statement]
+        conn.execute(head + ", ".join([values] * len(chunk)), [v for params in chunk for v in params])
+
+
+def _flush(conn, entity, batch, report):
+    try:
+        with conn:
+            _insert(conn, entity, [params for _, params in batch])
+        report.inserted += len(batch)
+        return
+    except sqlite3.IntegrityError:
+        pass
+    # Replay the batch to find the rows the database refuses.
+    with conn:
+        for line, params in batch:
+            conn.execute("SAVEPOINT import_row")
+            try:
+                _insert(conn, entity, [params])
+            except sqlite3.IntegrityError as e:
+                conn.execute("ROLLBACK TO import_row")
+                report.error(line, _integrity_message(e))
+            else:
+                report.inserted += 1
+            conn.execute("RELEASE import_row")
+
+
+def _integrity_message(error):
+    message = str(error)
+    if message.startswith("UNIQUE constraint failed: customers.name"):
+        return "a customer with this name already exists"
+    if message.startswith("FOREIGN KEY"):
+        return "charger_type_id or customer_id does not exist"
+    return message
+
+
+def import_records(conn, entity, records, batch_size=BATCH_SIZE, create_missing=False):
+    """Insert ``records`` (from read_records) into ``entity``; returns an ImportReport."""
+    report = ImportReport()
+    if entity == "sows":
+        charger_types = NameLookup(conn, "charger_types", create_missing)
+        customers = NameLookup(conn, "customers", create_missing)
+        to_params = lambda record: _sow_params(record, charger_types, customers)  # noqa: E731
+    else:
+        to_params = _customer_params
+    batch = []
+    for line, record in records:
+        if isinstance(record, str):
+            report.error(line, record)
+            continue
+        try:
+            batch.append((line, to_params(record)))
+        except ValueError as e:
+            report.error(line, str(e))
+            continue
+        if len(batch) >= batch_size:
+            _flush(conn, entity, batch, report)
+            batch = []
+    if batch:
+        _flush(conn, entity, batch, report)
+    return report
+
+
+# ---------- Export ----------
+
+_EXPORT_SQL = {
+    "sows": """
+        SELECT s.*, ct.name AS charger_type, c.name AS customer
+        FROM sows s
+        LEFT JOIN charger_types ct ON ct.id = s.charger_type_id
+        LEFT JOIN customers c ON c.id = s.customer_id
+        WHERE s.id > ? ORDER BY s.id LIMIT ?
+    """,
+    "customers": "SELECT * FROM customers WHERE id > ? ORDER BY id LIMIT ?",
+}
+
+
+def _image_refs(conn, sow_ids):
+    refs = collections.defaultdict(list)
+    rows = conn.execute(f"""
+        SELECT i.sow_id, i.filename, i.original_name, i.caption, b.sha256
+        FROM sow_images i LEFT JOIN blobs b ON b.id = i.blob_id
+        WHERE i.sow_id IN ({','.join('?' * len(sow_ids))})
+        ORDER BY i.sow_id, i.uploaded_at, i.id
+    """, sow_ids)
+    for row in rows:
+        refs[row["sow_id"]].append({k: row[k] for k in ("filename", "original_name", "caption", "sha256")})
+    return refs
+
+
+def iter_rows(conn, entity, batch_size=BATCH_SIZE):
+    """Yield export dicts for ``entity`` in id order."""
+    fields = EXPORT_FIELDS[entity]
+    last_id = 0
+    while True:
+        rows = conn.execute(_EXPORT_SQL[entity], (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        images = _image_refs(conn, [r["id"] for r in rows]) if entity == "sows" else None
+        for row in rows:
+            out = {f: row[f] for f in fields if f != "images"}
+            if images is not None:
+                out["images"] = images[row["id"]]
+            yield out
+        last_id = rows[-1]["id"]
+
+
+def iter_export(conn, entity, fmt, batch_size=BATCH_SIZE):
+    """Yield ``entity`` as encoded CSV or JSON Lines chunks, about one per batch.
+
+    Reads inside one transaction so the export is a consistent snapshot.
+    """
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, EXPORT_FIELDS[entity]) if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+    conn.execute("BEGIN")
+    try:
+        for n, row in enumerate(iter_rows(conn, entity, batch_size), 1):
+            if writer:
+                if "images" in row:
+                    row["images"] = json.dumps(row["images"], separators=(",", ":")) if row["images"] else ""
+                writer.writerow(row)
+            else:
+                buf.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+                buf.write("\n")
+            if n % batch_size == 0:
+                yield buf.getvalue().encode("utf-8")
+                buf.seek(0)
+                buf.truncate()
+    finally:
+        conn.rollback()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
@@ -0,0 +1,114 @@
+# db.py
+import os
+import queue
+import sqlite3
+import threading
+
+from flask import g, has_app_context
+
+# Applied to every new connection. journal_mode=WAL is persistent in the
+# database file, so it is set once by init_db() rather than per connection.
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",      # 64 MiB page cache
+    "PRAGMA mmap_size = 268435456",    # 256 MiB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+BUSY_TIMEOUT = 5.0
+
+
+class ConnectionPool:
+    """A small LIFO pool of configured SQLite connections.
+
+    Connections are opened lazily and at most ``size`` idle ones are kept.
+    The pool resets itself after a fork so children never reuse a parent's
+    connection.
+    """
+
+    def __init__(self, path, size=8, factory=sqlite3.Connection):
+        self.path = path
+        self.size = size
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._pid = os.getpid()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        if self._pid != os.getpid():
+            self._idle = queue.LifoQueue()
+            self._pid = os.getpid()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._pid == os.getpid() and self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+pool = None
+_local = threading.local()
+
+
+def configure(path, size=8, factory=sqlite3.Connection):
+    """Point the pool at ``path``; call once at start-up.
+
+    ``factory`` is the ``sqlite3.Connection`` class to open (see metrics.py).
+    """
+    global pool
+    if pool is not None:
+        pool.close_all()
+    pool = ConnectionPool(path, size, factory)
+
+
+def init_db():
+    """One-time database setup that persists in the file itself."""
+    conn = pool.connect()
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+    finally:
+        conn.close()
+
+
+def get_db():
+    """Return the connection for the current request (or thread).
+
+    Inside an app context the connection is checked out of the pool once and
+    returned by ``close_db`` at teardown. Outside one (CLI, scripts) each
+    thread keeps its own connection.
+    """
+    if has_app_context():
+        conn = g.get("_db_conn")
+        if conn is None:
+            conn = g._db_conn = pool.acquire()
+        return conn
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "pid", None) != os.getpid():
+        conn = _local.conn = pool.connect()
+        _local.pid = os.getpid()
+    return conn
+
+
+def close_db(exc=None):
+    conn = g.pop("_db_conn", None)
+    if conn is not None:
+        pool.release(conn)
@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+"""Production settings: ``gunicorn -c gunicorn.conf.py``.
+
+The same as ``flask serve`` with gunicorn installed: the app is prepared
+once in the parent (``create_app()``) and shared by the forked workers,
+and each worker waits for its background PDF renders as it exits.
+"""
+import os
+
+wsgi_app = "app:create_app()"
+bind = f"{os.environ.get('SOW_HOST', '0.0.0.0')}:{os.environ.get('SOW_PORT', 8000)}"
+workers = int(os.environ.get("SOW_WORKERS", 0)) or os.cpu_count() or 1
+threads = int(os.environ.get("SOW_THREADS", 8))
+worker_class = "gthread"
+preload_app = True
+graceful_timeout = 120  # app.config['PDF_SYNC_TIMEOUT']
+keepalive = 15  # serve.KEEPALIVE_TIMEOUT
+
+
+def when_ready(server):
+    import app
+
+    app.configure_workers(server.cfg.workers, server.cfg.threads)
+
+
+def worker_exit(server, worker):
+    import app
+
+    app.shutdown()
@@ -0,0 +1,138 @@
+# image_ingest.py
+"""One-time processing of uploaded images.
+
+Each upload gets its EXIF orientation applied, a print derivative no larger
+than the letter-page image box used by the PDF renderer, and a thumbnail for
+the edit page. The resulting pixel size is stored on the ``sow_images`` row
+so PDF rendering never decodes an image just to size it.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+RASTER_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+# letter minus 1in margins (points), printed at 200 dpi
+PRINT_BOX_PX = (int(6.5 * 200), int(9 * 200))
+THUMB_BOX_PX = (400, 300)
+JPEG_QUALITY = 85
+
+
+def _derivative_name(filename, kind, ext):
+    return f"{filename.rsplit('.', 1)[0]}.{kind}.{ext}"
+
+
+def _save(img, path, ext):
+    if ext == "jpg":
+        img.convert("RGB").save(path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        img.save(path, "PNG", optimize=True)
+
+
+def process_image(upload_folder, filename):
+    """Write the derivatives for ``filename`` and return the ``sow_images`` fields.
+
+    Returns None for files that are not raster images.
+    """
+    if not filename.lower().endswith(RASTER_EXTENSIONS):
+        return None
+    from PIL import Image as PilImage, ImageOps  # only upload processing needs PIL
+
+    src_path = os.path.join(upload_folder, filename)
+    with PilImage.open(src_path) as src:
+        src.seek(0)  # first frame of animated GIFs
+        orientation = src.getexif().get(0x0112, 1)
+        img = ImageOps.exif_transpose(src)
+        img.load()
+    # Photos recompress well as JPEG; keep PNG for anything with transparency
+    # or a palette (diagrams, screenshots) where JPEG artefacts hurt.
+    lossless = img.mode in ("RGBA", "LA", "P", "1") or "transparency" in img.info
+    ext = "png" if lossless else "jpg"
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA" if lossless else "RGB")
+
+    fields = {"print_filename": None}
+    if orientation != 1 or img.width > PRINT_BOX_PX[0] or img.height > PRINT_BOX_PX[1]:
+        printable = img.copy()
+        printable.thumbnail(PRINT_BOX_PX, PilImage.LANCZOS)
+        fields["print_filename"] = _derivative_name(filename, "print", ext)
+        _save(printable, os.path.join(upload_folder, fields["print_filename"]), ext)
+        fields["width"], fields["height"] = printable.size
+    else:
+        fields["width"], fields["height"] = img.size
+
+    thumb = img.copy()
+    thumb.thumbnail(THUMB_BOX_PX, PilImage.LANCZOS)
+    fields["thumb_filename"] = _derivative_name(filename, "thumb", ext)
+    _save(thumb, os.path.join(upload_folder, fields["thumb_filename"]), ext)
+    return fields
+
+
+def derivative_paths(upload_folder, row):
+    """Paths of every file written for a legacy (non-blob) ``sow_images`` row."""
+    names = [row["filename"], row["print_filename"], row["thumb_filename"]]
+    return [os.path.join(upload_folder, n) for n in names if n]
+
+
+class IngestQueue:
+    """Runs ``process_image`` for new uploads on a background thread pool.
+
+    Derivatives belong to the content blob, so an image attached to several
+    SOWs is processed once and later attachments just copy the results.
+    ``get_db`` supplies a connection for the worker thread and ``on_done`` is
+    called with each SOW id whose rows were updated.
+    """
+
+    def __init__(self, upload_folder, get_db, on_done=None, max_workers=2):
+        self.upload_folder = upload_folder
+        self.get_db = get_db
+        self.on_done = on_done
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+    def submit(self, image_id):
+        return self._executor.submit(self.ingest, image_id)
+
+    def ingest(self, image_id):
+        conn = self.get_db()
+        row = conn.execute("""
+            SELECT i.filename, i.blob_id, b.width, b.height, b.print_path, b.thumb_path
+            FROM sow_images i LEFT JOIN blobs b ON b.id = i.blob_id
+            WHERE i.id = ?
+        """, (image_id,)).fetchone()
+        if row is None:
+            return None
+        blob_id = row["blob_id"]
+        if blob_id is not None and row["width"] is not None:
+            fields = {"width": row["width"], "height": row["height"],
+                      "print_filename": row["print_path"], "thumb_filename": row["thumb_path"]}
+        else:
+            try:
+                fields = process_image(self.upload_folder, row["filename"])
+            except Exception:
+                log.exception("Could not process upload %s", row["filename"])
+                return None
+            if fields is None:
+                return None
+        values = (fields["width"], fields["height"], fields["print_filename"], fields["thumb_filename"])
+        with conn:
+            if blob_id is not None:
+                conn.execute(
+                    "UPDATE blobs SET width = ?, height = ?, print_path = ?, thumb_path = ? WHERE id = ?",
+                    values + (blob_id,),
+                )
+                where, key = "blob_id = ? AND width IS NULL", blob_id
+            else:
+                where, key = "id = ?", image_id
+            sow_ids = [r[0] for r in conn.execute(f"SELECT DISTINCT sow_id FROM sow_images WHERE {where}", (key,))]
+            conn.execute(
+                f"UPDATE sow_images SET width = ?, height = ?, print_filename = ?, thumb_filename = ? WHERE {where}",
+                values + (key,),
+            )
+        if self.on_done:
+            for sow_id in sow_ids:
+                self.on_done(sow_id)
+        return fields
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,225 @@
+# metrics.py
+"""Opt-in instrumentation for the request and PDF hot paths.
+
+Set ``SOW_METRICS=1`` to record per-endpoint latency, the number and time of
+SQL statements per request, and PDF render phases, exposed in Prometheus
+text format at ``/metrics``. ``SOW_SLOW_REQUEST_MS`` additionally logs
+requests slower than that with their most expensive statements.
+
+When disabled nothing is wrapped: connections are plain ``sqlite3``
+connections, no request hooks are registered and the ``observe_*`` helpers
+return immediately. Values are per process.
+"""
+import contextvars
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from flask import Response, g, request
+
+ENABLED = os.environ.get("SOW_METRICS", "") not in ("", "0")
+SLOW_REQUEST_MS = float(os.environ.get("SOW_SLOW_REQUEST_MS", 0))
+SLOW_TOP_QUERIES = 3
+
+log = logging.getLogger("sow.slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """A Prometheus histogram with fixed buckets and optional labels."""
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for label_values, (counts, count, total) in items:
+            pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values)]
+            for bound, n in list(zip(self.buckets, counts)) + [("+Inf", count)]:
+                labels = ",".join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{labels}}} {n}")
+            suffix = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_count{suffix} {count}")
+            lines.append(f"{self.name}_sum{suffix} {total:.6f}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "sow_http_request_duration_seconds", "Request latency by endpoint.", ("endpoint", "method", "status"))
+SQL_STATEMENTS = Histogram(
+    "sow_sql_statements_per_request", "SQL statements executed per request.", ("endpoint",), COUNT_BUCKETS)
+SQL_SECONDS = Histogram(
+    "sow_sql_seconds_per_request", "Time spent in SQLite per request.", ("endpoint",))
+PDF_PHASE_SECONDS = Histogram(
+    "sow_pdf_phase_seconds", "PDF generation time by phase.", ("phase",))
+REGISTRY = [REQUEST_SECONDS, SQL_STATEMENTS, SQL_SECONDS, PDF_PHASE_SECONDS]
+# Functions returning more exposition lines, e.g. admission.render.
+_collectors = []
+
+
+def register(collector):
+    """Add ``collector()``'s lines to ``/metrics``."""
+    _collectors.append(collector)
+
+
+# ---------- SQL accounting ----------
+# The statements of the current request: a list of [sql, seconds] records.
+_statements = contextvars.ContextVar("sow_sql_statements", default=None)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times execute() and the fetches that follow it."""
+
+    _record = None
+
+    def _run(self, method, sql, params):
+        statements = _statements.get()
+        if statements is None:
+            self._record = None
+            return method(sql, params)
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            self._record = [sql, time.perf_counter() - start]
+            statements.append(self._record)
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def _fetch(self, method, *args):
+        if self._record is None:
+            return method(*args)
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._record[1] += time.perf_counter() - start
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        return self._fetch(super().__next__)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """The ``sqlite3.connect(factory=...)`` to use for pooled connections."""
+    return InstrumentedConnection if ENABLED else sqlite3.Connection
+
+
+# ---------- Flask hooks ----------
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_sql = []
+    g._metrics_token = _statements.set(g._metrics_sql)
+
+
+def _after_request(response):
+    start = g.pop("_metrics_start", None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    statements = g.pop("_metrics_sql")
+    _statements.reset(g.pop("_metrics_token"))
+    endpoint = request.endpoint or "<unmatched>"
+    sql_seconds = sum(s for _, s in statements)
+    REQUEST_SECONDS.observe(elapsed, endpoint, request.method, str(response.status_code))
+    SQL_STATEMENTS.observe(len(statements), endpoint)
+    SQL_SECONDS.observe(sql_seconds, endpoint)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        top = sorted(statements, key=lambda s: s[1], reverse=True)[:SLOW_TOP_QUERIES]
+        log.warning(
+            "slow request %s %s: %.0f ms, %d SQL statements in %.1f ms%s",
+            request.method, request.full_path.rstrip("?"), elapsed * 1000, len(statements), sql_seconds * 1000,
+            "".join(f"\n  {s * 1000:8.2f} ms  {_one_line(sql)}" for sql, s in top),
+        )
+    return response
+
+
+def _one_line(sql, limit=200):
+    sql = re.sub(r"\s+", " ", sql).strip()
+    return sql if len(sql) <= limit else sql[:limit] + "…"
+
+
+def metrics_view():
+    lines = []
+    for histogram in REGISTRY:
+        lines.extend(histogram.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    """Register the hooks and ``/metrics`` if instrumentation is enabled."""
+    if not ENABLED:
+        return
+    if SLOW_REQUEST_MS and not log.handlers and not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+
+
+# ---------- PDF phases ----------
+
+def observe_pdf_phase(phase, seconds):
+    if ENABLED:
+        PDF_PHASE_SECONDS.observe(seconds, phase)
+
+
+def observe_pdf_phases(timings):
+    """Record the ``{phase: seconds}`` returned by a render."""
+    if ENABLED and timings:
+        for phase, seconds in timings.items():
+            PDF_PHASE_SECONDS.observe(seconds, phase)
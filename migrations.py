@@ -0,0 +1,507 @@
+# migrations.py
+"""Versioned schema migrations tracked in ``PRAGMA user_version``.
+
+Each migration is a function taking a connection; its position in
+``MIGRATIONS`` (1-based) is the version it brings the database to. Add new
+migrations to the end of the list and never edit one that has shipped.
+"""
+
+MIGRATIONS = []
+
+
+def migration(fn):
+    MIGRATIONS.append(fn)
+    return fn
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_missing_columns(conn, table, columns):
+    existing = _columns(conn, table)
+    for name, decl in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+@migration
+def reconcile_baseline(conn):
+    """Bring databases created by older versions of the app to one schema."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS charger_types (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            check_in_contact TEXT,
+            check_in_phone TEXT,
+            check_in_instructions TEXT,
+            check_out_contact TEXT,
+            check_out_phone TEXT,
+            check_out_instructions TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sows (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            name TEXT NOT NULL,
+            charger_type_id INTEGER,
+            customer_id INTEGER,
+            maintenance_scope TEXT,
+            parts TEXT,
+            tools TEXT,
+            documents TEXT,
+            service_instructions TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (charger_type_id) REFERENCES charger_types(id),
+            FOREIGN KEY (customer_id) REFERENCES customers(id)
+        )
+    """)
+    _add_missing_columns(conn, "charger_types", [
+        ("created_at", "TIMESTAMP"),
+    ])
+    _add_missing_columns(conn, "customers", [
+        ("check_in_contact", "TEXT"),
+        ("check_in_phone", "TEXT"),
+        ("check_in_instructions", "TEXT"),
+        ("check_out_contact", "TEXT"),
+        ("check_out_phone", "TEXT"),
+        ("check_out_instructions", "TEXT"),
+        ("created_at", "TIMESTAMP"),
+    ])
+    _add_missing_columns(conn, "sows", [
+        ("customer_id", "INTEGER REFERENCES customers(id)"),
+        ("updated_at", "TIMESTAMP"),
+    ])
+
+    # Early databases created sow_images with NOT NULL original_filename and
+    # file_path columns the app never fills in, so every insert failed.
+    # Rebuild the table into the shape the app writes.
+    legacy = _columns(conn, "sow_images")
+    conn.execute("""
+        CREATE TABLE sow_images_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sow_id INTEGER,
+            filename TEXT NOT NULL,
+            original_name TEXT NOT NULL,
+            caption TEXT,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (sow_id) REFERENCES sows (id) ON DELETE CASCADE
+        )
+    """)
+    if legacy:
+        names = [c for c in ("original_name", "original_filename") if c in legacy]
+        original = f"COALESCE({', '.join(names)}, filename)" if names else "filename"
+        caption = "caption" if "caption" in legacy else "NULL"
+        conn.execute(f"""
+            INSERT INTO sow_images_new (id, sow_id, filename, original_name, caption, uploaded_at)
+            SELECT id, sow_id, filename, {original}, {caption}, uploaded_at FROM sow_images
+        """)
+        conn.execute("DROP TABLE sow_images")
+    conn.execute("ALTER TABLE sow_images_new RENAME TO sow_images")
+
+
+@migration
+def add_hot_path_indexes(conn):
+    # /api/sows?charger_type_id=[&customer_id=] and the delete_charger_type count
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sows_charger_type_customer ON sows (charger_type_id, customer_id)")
+    # /api/sows?customer_id=
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sows_customer ON sows (customer_id)")
+    # edit_sows: ORDER BY s.created_at DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sows_created_at ON sows (created_at)")
+    # sow_images WHERE sow_id = ? ORDER BY uploaded_at
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sow_images_sow_uploaded ON sow_images (sow_id, uploaded_at)")
+
+
+@migration
+def add_image_dimensions(conn):
+    # Filled in by image_ingest after each upload.
+    _add_missing_columns(conn, "sow_images", [
+        ("width", "INTEGER"),
+        ("height", "INTEGER"),
+        ("print_filename", "TEXT"),
+        ("thumb_filename", "TEXT"),
+    ])
+
+
+@migration
+def add_content_addressed_blobs(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sha256 TEXT NOT NULL UNIQUE,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            width INTEGER,
+            height INTEGER,
+            print_path TEXT,
+            thumb_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    _add_missing_columns(conn, "sow_images", [
+        ("blob_id", "INTEGER REFERENCES blobs(id)"),
+    ])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sow_images_blob ON sow_images (blob_id)")
+    # Reference counting lives in triggers so it also covers the
+    # ON DELETE CASCADE from sows.
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS sow_images_blob_ref AFTER INSERT ON sow_images
+        WHEN NEW.blob_id IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refcount = refcount + 1 WHERE id = NEW.blob_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS sow_images_blob_unref AFTER DELETE ON sow_images
+        WHEN OLD.blob_id IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE id = OLD.blob_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS sow_images_blob_move AFTER UPDATE OF blob_id ON sow_images
+        WHEN OLD.blob_id IS NOT NEW.blob_id
+        BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE id = OLD.blob_id;
+            UPDATE blobs SET refcount = refcount + 1 WHERE id = NEW.blob_id;
+        END
+    """)
+
+
+SEARCH_COLUMNS = ("title", "maintenance_scope", "parts", "tools", "documents", "service_instructions")
+_CAPTIONS = "(SELECT group_concat(caption, ' ') FROM sow_images WHERE sow_id = {0}.id AND caption <> '')"
+
+
+@migration
+def add_sow_search(conn):
+    # rowid is the SOW id; the table keeps its own copy of the text so
+    # snippet() and highlight() work, and triggers keep it in sync.
+    cols = ", ".join(SEARCH_COLUMNS)
+    new_cols = ", ".join(f"NEW.{c}" for c in SEARCH_COLUMNS)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS sows_fts USING fts5(
+            {cols}, captions,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    # Term list, used to expand longer type-ahead prefixes (see search.py).
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS sows_fts_vocab USING fts5vocab(sows_fts, 'row')")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS sows_fts_insert AFTER INSERT ON sows BEGIN
+            INSERT INTO sows_fts (rowid, {cols}, captions)
+            VALUES (NEW.id, {new_cols}, {_CAPTIONS.format('NEW')});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS sows_fts_update AFTER UPDATE OF {cols} ON sows BEGIN
+            DELETE FROM sows_fts WHERE rowid = OLD.id;
+            INSERT INTO sows_fts (rowid, {cols}, captions)
+            VALUES (NEW.id, {new_cols}, {_CAPTIONS.format('NEW')});
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS sows_fts_delete AFTER DELETE ON sows BEGIN
+            DELETE FROM sows_fts WHERE rowid = OLD.id;
+        END
+    """)
+    for event, ref in (("INSERT", "NEW"), ("DELETE", "OLD"), ("UPDATE OF caption", "NEW")):
+        name = event.split()[0].lower()
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS sow_images_fts_{name} AFTER {event} ON sow_images BEGIN
+                UPDATE sows_fts
+                SET captions = (SELECT group_concat(caption, ' ') FROM sow_images WHERE sow_id = {ref}.sow_id AND caption <> '')
+                WHERE rowid = {ref}.sow_id;
+            END
+        """)
+    conn.execute("DELETE FROM sows_fts")
+    conn.execute(f"""
+        INSERT INTO sows_fts (rowid, {cols}, captions)
+        SELECT s.id, {', '.join('s.' + c for c in SEARCH_COLUMNS)}, {_CAPTIONS.format('s')}
+        FROM sows s
+    """)
+
+
+@migration
+def add_keyset_indexes(conn):
+    # List views page newest first on (created_at, id), optionally within a
+    # charger type or customer. A NULL created_at drops out of the row-value
+    # comparison used for paging, so legacy rows get a timestamp.
+    conn.execute("UPDATE sows SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sows_created ON sows (created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sows_charger_type_created ON sows (charger_type_id, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sows_customer_created ON sows (customer_id, created_at, id)")
+    # Superseded by the composite indexes above.
+    conn.execute("DROP INDEX IF EXISTS idx_sows_created_at")
+    conn.execute("DROP INDEX IF EXISTS idx_sows_customer")
+
+
+REFERENCE_TABLES = ("charger_types", "customers")
+
+
+@migration
+def add_reference_versions(conn):
+    # One counter per lookup list, bumped in the writing transaction, so
+    # every process can tell whether its cached copy is current (see
+    # reference_data.py). Only the cached columns, id and name, count.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reference_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    for table in REFERENCE_TABLES:
+        conn.execute("INSERT OR IGNORE INTO reference_versions (name) VALUES (?)", (table,))
+        for event in ("INSERT", "DELETE", "UPDATE OF id, name"):
+            name = event.split()[0].lower()
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{name} AFTER {event} ON {table} BEGIN
+                    UPDATE reference_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            """)
+
+
+# sync entity -> table; see sync.py.
+SYNC_TABLES = {"charger_types": "charger_types", "customers": "customers", "sows": "sows", "images": "sow_images"}
+
+
+@migration
+def add_sync_tracking(conn):
+    # /api/sync pages each table on (updated_at, id), so every table gets an
+    # updated_at that triggers keep current whoever writes, and deletes leave
+    # a tombstone. Tombstone ids follow commit order (writers serialize), so
+    # they page on id alone.
+    _add_missing_columns(conn, "charger_types", [("updated_at", "TIMESTAMP")])
+    _add_missing_columns(conn, "customers", [("updated_at", "TIMESTAMP")])
+    _add_missing_columns(conn, "sow_images", [("updated_at", "TIMESTAMP")])
+    conn.execute("UPDATE charger_types SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+    conn.execute("UPDATE customers SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+    conn.execute("UPDATE sows SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+    conn.execute("UPDATE sow_images SET updated_at = COALESCE(uploaded_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_tombstones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for entity, table in SYNC_TABLES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_updated ON {table} (updated_at, id)")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_touch_insert AFTER INSERT ON {table}
+            WHEN NEW.updated_at IS NULL
+            BEGIN
+                UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END
+        """)
+        # Only fires when the statement left updated_at alone.
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_touch_update AFTER UPDATE ON {table}
+            WHEN NEW.updated_at IS OLD.updated_at
+            BEGIN
+                UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_tombstone AFTER DELETE ON {table} BEGIN
+                INSERT INTO sync_tombstones (entity, row_id) VALUES ('{entity}', OLD.id);
+            END
+        """)
+
+
+@migration
+def tune_sow_search_writes(conn):
+    # FTS5 writes a new segment whenever its in-memory term hash passes
+    # hashsize (1 MiB by default), and every segment must later be merged.
+    # Bulk imports index thousands of multi-kilobyte SOWs per transaction;
+    # a larger hash makes fewer, larger segments. Single-row edits never
+    # come near the limit.
+    conn.execute("INSERT INTO sows_fts (sows_fts, rank) VALUES ('hashsize', 16777216)")
+
+
+@migration
+def add_upload_gc(conn):
+    # upload_gc.py walks the upload folder in bounded batches and keeps its
+    # position here, so a pass can stop and resume at any point.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS upload_gc_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            phase TEXT NOT NULL DEFAULT 'rows',
+            cursor TEXT NOT NULL DEFAULT '',
+            pass_started_at TIMESTAMP,
+            last_pass_at TIMESTAMP
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO upload_gc_state (id) VALUES (1)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS upload_quarantine (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            quarantined_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_quarantine_at ON upload_quarantine (quarantined_at)")
+    # Legacy uploads and their derivatives are matched by file name prefix.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sow_images_filename ON sow_images (filename)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs (id) WHERE refcount <= 0")
+
+
+@migration
+def add_sow_revisions(conn):
+    # sows keeps the current revision; sow_revisions is the append-only
+    # history, each entry a compressed snapshot or a delta against the one
+    # before it (see revisions.py).
+    _add_missing_columns(conn, "sows", [("revision", "INTEGER NOT NULL DEFAULT 1")])
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sow_revisions (
+            sow_id INTEGER NOT NULL REFERENCES sows(id) ON DELETE CASCADE,
+            revision INTEGER NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('snapshot', 'delta')),
+            data BLOB NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (sow_id, revision)
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS sow_revisions_append_only BEFORE UPDATE ON sow_revisions BEGIN
+            SELECT RAISE(ABORT, 'sow_revisions is append-only');
+        END
+    """)
+
+
+@migration
+def add_chunked_uploads(conn):
+    # One row per resumable upload (see uploads.py). The bytes live in
+    # .staging/<id>.part, which is as long as what has arrived; sha256 is
+    # set once the last byte has, sow_id once a saved form claims it.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uploads (
+            id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            sha256 TEXT,
+            sow_id INTEGER REFERENCES sows(id) ON DELETE CASCADE,
+            caption TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_created ON uploads (created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_sow ON uploads (sow_id)")
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction.
+
+    Returns the list of migration names that ran.
+    """
+    applied = []
+    version = schema_version(conn)
+    if conn.in_transaction:
+        conn.commit()
+    # Table rebuilds need foreign key enforcement off; it cannot be toggled
+    # inside a transaction.
+    fk = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for number, fn in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                fn(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(fn.__name__)
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if fk else 'OFF'}")
+    return applied
+
+
+# Representative shapes of the queries on hot request paths. check_query_plans()
+# fails if any of them would read a table without an index.
+HOT_QUERIES = {
+    "api_sows page by charger type": (
+        "SELECT id, title, created_at FROM sows WHERE charger_type_id = ? AND (sows.created_at, sows.id) < (?, ?) "
+        "ORDER BY sows.created_at DESC, sows.id DESC LIMIT ?", (1, "", 1, 51)),
+    "api_sows page by charger type and customer": (
+        "SELECT id, title, created_at FROM sows WHERE charger_type_id = ? AND customer_id = ? "
+        "ORDER BY sows.created_at DESC, sows.id DESC LIMIT ?", (1, 1, 51)),
+    "api_sows page by customer": (
+        "SELECT id, title, created_at FROM sows WHERE customer_id = ? "
+        "ORDER BY sows.created_at DESC, sows.id DESC LIMIT ?", (1, 51)),
+    "sow images for a sow": (
+        "SELECT * FROM sow_images WHERE sow_id = ? ORDER BY uploaded_at", (1,)),
+    "delete_image lookup": (
+        "DELETE FROM sow_images WHERE sow_id = ? AND filename = ?", (1, "x")),
+    "blob reference lookup": (
+        "SELECT COUNT(*) FROM sow_images WHERE blob_id = ?", (1,)),
+    "reference list versions": (
+        "SELECT name, version FROM reference_versions WHERE name IN (?, ?)", REFERENCE_TABLES),
+    "sync sows page": (
+        "SELECT * FROM sows WHERE (updated_at, id) > (?, ?) ORDER BY updated_at, id LIMIT ?", ("", 0, 501)),
+    "sync images since": (
+        "SELECT * FROM sow_images WHERE updated_at >= ? ORDER BY updated_at, id LIMIT ?", ("", 501)),
+    "sync tombstones": (
+        "SELECT id, entity, row_id FROM sync_tombstones WHERE id > ? ORDER BY id LIMIT ?", (0, 501)),
+    "upload gc legacy names": (
+        "SELECT filename, print_filename, thumb_filename FROM sow_images WHERE filename >= ? AND filename < ?",
+        ("a.", "a/")),
+    "upload gc blob names": (
+        "SELECT path, print_path, thumb_path FROM blobs WHERE sha256 IN (?, ?)", ("a", "b")),
+    "upload gc unreferenced blobs": (
+        "SELECT * FROM blobs WHERE refcount <= 0 AND created_at < ? ORDER BY id LIMIT ?", ("", 500)),
+    "upload gc expired quarantine": (
+        "SELECT * FROM upload_quarantine WHERE quarantined_at < ? ORDER BY quarantined_at LIMIT ?", ("", 500)),
+    "sow revision chain": (
+        "SELECT revision, kind, data, created_at FROM sow_revisions WHERE sow_id = ? AND revision <= ? "
+        "ORDER BY revision DESC LIMIT ?", (1, 1, 20)),
+    "upload gc expired uploads": (
+        "DELETE FROM uploads WHERE created_at < ?", ("",)),
+    "charger type usage count": (
+        "SELECT COUNT(*) FROM sows WHERE charger_type_id = ?", (1,)),
+    "sow document": ("""
+        SELECT s.*, ct.*, c.*, i.*
+        FROM sows s
+        LEFT JOIN charger_types ct ON ct.id = s.charger_type_id
+        LEFT JOIN customers c ON c.id = ?
+        LEFT JOIN sow_images i ON i.sow_id = s.id
+        WHERE s.id = ?
+        ORDER BY i.uploaded_at, i.id
+    """, (1, 1)),
+    "edit_sows page": ("""
+        SELECT s.id, s.title, s.name, s.created_at, ct.name AS charger_type_name, c.name AS customer_name
+        FROM sows s
+        JOIN charger_types ct ON s.charger_type_id = ct.id
+        LEFT JOIN customers c ON s.customer_id = c.id
+        WHERE (s.created_at, s.id) < (?, ?)
+        ORDER BY s.created_at DESC, s.id DESC LIMIT ?
+    """, ("", 1, 51)),
+}
+
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """Return ``(name, plan detail)`` for every hot query that full-scans a table."""
+    offenders = []
+    for name, (sql, params) in queries.items():
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row[3]
+            if detail.startswith("SCAN") and "USING" not in detail and "VIRTUAL TABLE" not in detail:
+                offenders.append((name, detail))
+    return offenders
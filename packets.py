@@ -0,0 +1,165 @@
+# packets.py
+"""Bulk export of many SOWs as a ZIP of PDFs or one merged PDF.
+
+Rows are fetched in batches with a handful of set-based queries, and output
+is produced as a stream of byte chunks so memory does not grow with the
+number of SOWs (the merged PDF is capped, see ``MERGED_MAX_SOWS``).
+"""
+import collections
+import time
+import zipfile
+
+from werkzeug.utils import secure_filename
+
+from pdf_jobs import QueueFull
+
+BATCH_SIZE = 200
+MERGED_MAX_SOWS = 500
+CHUNK_SIZE = 64 * 1024
+
+
+class PacketTooLarge(Exception):
+    pass
+
+
+def select_sow_ids(conn, charger_type_id=None, customer_id=None, sow_ids=None):
+    """Ids of the SOWs matching the filter, grouped by charger type then title."""
+    where, params = [], []
+    if charger_type_id is not None:
+        where.append("s.charger_type_id = ?")
+        params.append(charger_type_id)
+    if customer_id is not None:
+        where.append("s.customer_id = ?")
+        params.append(customer_id)
+    if sow_ids:
+        where.append(f"s.id IN ({','.join('?' * len(sow_ids))})")
+        params.extend(sow_ids)
+    sql = "SELECT s.id FROM sows s LEFT JOIN charger_types ct ON ct.id = s.charger_type_id"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY ct.name COLLATE NOCASE, s.title COLLATE NOCASE, s.id"
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+def iter_documents(conn, sow_ids, customer_id=None, batch_size=BATCH_SIZE):
+    """Yield ``(sow, customer, images, charger_type_name)`` in ``sow_ids`` order.
+
+    Each batch costs four queries regardless of its size. The customer block
+    uses ``customer_id`` when given, otherwise each SOW's own customer.
+    The row shapes match the single-PDF path so rendered PDFs are shared
+    through the cache.
+    """
+    for start in range(0, len(sow_ids), batch_size):
+        chunk = sow_ids[start:start + batch_size]
+        marks = ",".join("?" * len(chunk))
+        sows = {r["id"]: r for r in conn.execute(f"SELECT * FROM sows WHERE id IN ({marks})", chunk)}
+
+        type_ids = sorted({s["charger_type_id"] for s in sows.values() if s["charger_type_id"] is not None})
+        charger_types = dict(conn.execute(
+            f"SELECT id, name FROM charger_types WHERE id IN ({','.join('?' * len(type_ids))})", type_ids
+        ).fetchall()) if type_ids else {}
+
+        wanted = {customer_id} if customer_id else {s["customer_id"] for s in sows.values()}
+        wanted = sorted(c for c in wanted if c)
+        customers = {r["id"]: r for r in conn.execute(
+            f"SELECT * FROM customers WHERE id IN ({','.join('?' * len(wanted))})", wanted
+        )} if wanted else {}
+
+        images = collections.defaultdict(list)
+        for r in conn.execute(f"SELECT * FROM sow_images WHERE sow_id IN ({marks}) ORDER BY sow_id, uploaded_at", chunk):
+            images[r["sow_id"]].append(r)
+
+        for sow_id in chunk:
+            sow = sows.get(sow_id)
+            if sow is None:
+                continue
+            customer = customers.get(customer_id or sow["customer_id"])
+            yield sow, customer, images[sow_id], charger_types.get(sow["charger_type_id"])
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object that collects bytes for a generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry_name(sow, charger_type_name):
+    folder = secure_filename(charger_type_name or "") or "Unassigned"
+    title = secure_filename(sow["title"] or "") or "sow"
+    return f"{folder}/{sow['id']}-{title}.pdf"
+
+
+def stream_zip(jobs, documents, window=None):
+    """Yield a ZIP archive with one PDF per document.
+
+    Renders run on the ``PdfJobManager`` pool with at most ``window`` in
+    flight; finished files are copied into the archive in order.
+    """
+    window = window or max(2, jobs.max_workers * 2)
+    sink = _ChunkSink()
+    pending = collections.deque()
+
+    def write_next(zf):
+        sow, charger_type_name, job = pending.popleft()
+        job.wait()
+        name = _entry_name(sow, charger_type_name)
+        try:
+            if job.status != "done":
+                raise RuntimeError(job.error)
+            src = open(job.entry.path, "rb")
+        except (OSError, RuntimeError) as e:
+            zf.writestr(name[:-4] + ".error.txt", f"Could not render SOW {sow['id']}: {e}\n")
+            yield sink.drain()
+            return
+        with src, zf.open(name, "w") as dst:
+            while block := src.read(CHUNK_SIZE):
+                dst.write(block)
+                yield sink.drain()
+        yield sink.drain()
+
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for sow, customer, images, charger_type_name in documents:
+            while True:
+                try:
+                    job = jobs.submit(sow, customer, images)
+                    break
+                except QueueFull:
+                    # The shared render queue is busy; drain our own work first.
+                    if pending:
+                        yield from write_next(zf)
+                    else:
+                        time.sleep(0.5)
+            pending.append((sow, charger_type_name, job))
+            if len(pending) >= window:
+                yield from write_next(zf)
+        while pending:
+            yield from write_next(zf)
+    yield sink.drain()
+
+
+def stream_merged_pdf(documents, count, upload_folder, title="SOW Packet"):
+    """Yield one PDF containing every document, preceded by a table of contents.
+
+    The table of contents needs the whole story for its layout passes, so
+    packets are capped at ``MERGED_MAX_SOWS``; use the ZIP format beyond that.
+    """
+    if count > MERGED_MAX_SOWS:
+        raise PacketTooLarge(f"Merged PDFs are limited to {MERGED_MAX_SOWS} SOWs; request a ZIP instead.")
+    from pdf_render import iter_pdf, render_packet_pdf
+
+    yield from iter_pdf(
+        lambda buf: render_packet_pdf(buf, ((s, c, i) for s, c, i, _ in documents), upload_folder, title)
+    )
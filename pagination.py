@@ -0,0 +1,60 @@
+# pagination.py
+"""Keyset pagination over ``sows``, newest first.
+
+A page is addressed by an opaque cursor holding the ``(created_at, id)`` of
+the last row served. Fetching a later page costs the same as the first one
+(an index range scan, no OFFSET) and rows added meanwhile do not shift it.
+"""
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def page_size(requested):
+    if not requested or requested < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(requested, MAX_PAGE_SIZE)
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return ``(created_at, id)``; raises ValueError for a malformed cursor."""
+    try:
+        created_at, sow_id = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+    if not isinstance(created_at, str) or not isinstance(sow_id, int):
+        raise ValueError("invalid cursor")
+    return created_at, sow_id
+
+
+def _where(where):
+    return " WHERE " + " AND ".join(where) if where else ""
+
+
+def fetch_page(conn, select, where, params, cursor=None, limit=DEFAULT_PAGE_SIZE, alias="sows"):
+    """Run ``select`` (everything up to WHERE) for one page.
+
+    ``where``/``params`` are the caller's filters. Returns ``(rows,
+    next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    where, params = list(where), list(params)
+    if cursor:
+        where.append(f"({alias}.created_at, {alias}.id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    sql = f"{select}{_where(where)} ORDER BY {alias}.created_at DESC, {alias}.id DESC LIMIT ?"
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], encode_cursor(rows[limit - 1])
+
+
+def count_rows(conn, from_sql, where, params):
+    """Total matching rows; with only indexed filters this reads a covering index."""
+    return conn.execute(f"SELECT COUNT(*) FROM {from_sql}{_where(where)}", list(params)).fetchone()[0]
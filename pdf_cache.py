@@ -0,0 +1,168 @@
+# pdf_cache.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+CacheEntry = namedtuple("CacheEntry", "path size mtime etag")
+
+# Renders finish in well under this; older temp files have no owner.
+STALE_TMP_SECONDS = 3600
+
+
+def cache_key(sow, customer, images):
+    """Digest identifying one rendering of a SOW for a customer.
+
+    Built from the SOW id/customer id, ``sows.revision`` and ``updated_at``,
+    the full customer row and every ``sow_images`` row, so any edit to an
+    input yields a new key. It reads ``r<revision>.<sha256>``, so file
+    names, job ids and ETags show which revision a PDF holds.
+    """
+    parts = [
+        sow["id"],
+        customer["id"] if customer else None,
+        sow["revision"],
+        sow["updated_at"],
+        tuple(dict(customer).items()) if customer else None,
+        tuple(tuple(dict(img).items()) for img in images),
+    ]
+    return f"r{sow['revision']}.{hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()}"
+
+
+def key_revision(digest):
+    """The SOW revision a ``cache_key()`` digest was built from."""
+    return int(digest[1:].split(".", 1)[0])
+
+
+class PdfCache:
+    """Size-bounded LRU cache of rendered PDFs.
+
+    Files are stored in ``directory`` as ``<sow_id>-<customer_id>-<digest>.pdf``;
+    the LRU index lives in memory and is rebuilt from the directory on start-up.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        found = []
+        stale = time.time() - STALE_TMP_SECONDS
+        with os.scandir(self.directory) as it:
+            for de in it:
+                if not de.is_file():
+                    continue
+                st = de.stat()
+                if de.name.endswith(".pdf"):
+                    found.append((st.st_mtime, de.name, st.st_size))
+                elif de.name.endswith((".tmp", ".progress")) and st.st_mtime < stale:
+                    # Left behind by a worker that was killed mid-render.
+                    os.remove(de.path)
+        for mtime, name, size in sorted(found):
+            self._entries[name] = CacheEntry(os.path.join(self.directory, name), size, mtime, name[:-4].rsplit("-", 1)[1])
+            self._total += size
+        self._evict()
+
+    @staticmethod
+    def _name(sow_id, customer_id, digest):
+        return f"{sow_id}-{customer_id or 0}-{digest}.pdf"
+
+    def path_for(self, sow_id, customer_id, digest):
+        return os.path.join(self.directory, self._name(sow_id, customer_id, digest))
+
+    def get(self, sow_id, customer_id, digest):
+        name = self._name(sow_id, customer_id, digest)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                if os.path.exists(entry.path):
+                    self._entries.move_to_end(name)
+                    return entry
+                self._forget(name)
+        # Another worker process may have rendered it already.
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            return self._add(name, path)
+        return None
+
+    def store(self, sow_id, customer_id, digest, render):
+        """Render into the cache via ``render(path)`` and return the new entry."""
+        name = self._name(sow_id, customer_id, digest)
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            render(tmp_path)
+            return self.adopt(sow_id, customer_id, digest, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, sow_id, customer_id, digest, tmp_path):
+        """Move a finished render at ``tmp_path`` into the cache.
+
+        If ``tmp_path`` is gone but the PDF is already in place, another
+        render of the same content won the race; its file is used.
+        """
+        name = self._name(sow_id, customer_id, digest)
+        path = os.path.join(self.directory, name)
+        try:
+            os.replace(tmp_path, path)
+        except FileNotFoundError:
+            if not os.path.exists(path):
+                raise
+        return self._add(name, path)
+
+    def invalidate(self, sow_id=None, customer_id=None):
+        """Drop every cached PDF for ``sow_id`` and/or ``customer_id``."""
+        def matches(name):
+            s, c, _ = name.split("-", 2)
+            return (sow_id is not None and s == str(sow_id)) or (
+                customer_id is not None and c == str(customer_id)
+            )
+
+        with self._lock:
+            for name in [n for n in self._entries if matches(n)]:
+                self._forget(name)
+        # Files written by other worker processes are not in our index.
+        with os.scandir(self.directory) as it:
+            for de in it:
+                if de.name.endswith(".pdf") and matches(de.name):
+                    try:
+                        os.remove(de.path)
+                    except FileNotFoundError:
+                        pass
+
+    def _add(self, name, path):
+        st = os.stat(path)
+        entry = CacheEntry(path, st.st_size, st.st_mtime, name[:-4].rsplit("-", 1)[1])
+        with self._lock:
+            if name in self._entries:
+                self._total -= self._entries[name].size
+            self._entries[name] = entry
+            self._total += entry.size
+            self._evict(keep=name)
+        return entry
+
+    def _forget(self, name):
+        entry = self._entries.pop(name)
+        self._total -= entry.size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep=None):
+        while self._total > self.max_bytes and self._entries:
+            name = next(iter(self._entries))
+            if name == keep:
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(name)
+                continue
+            self._forget(name)
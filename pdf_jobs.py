@@ -0,0 +1,177 @@
+# pdf_jobs.py
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pdf_cache import cache_key
+
+_DIGEST = re.compile(r"r[0-9]+\.[0-9a-f]{64}")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _render_job(tmp_path, progress_path, sow, customer, images, upload_folder):
+    # Runs in a worker process; progress is reported through a sidecar file
+    # because the parent cannot otherwise observe a running render.
+    # ReportLab is imported here, on first use, unless the server pre-warmed it.
+    from pdf_render import render_sow_pdf
+
+    def progress(fraction):
+        with open(progress_path, "w") as f:
+            f.write(f"{fraction:.2f}")
+
+    try:
+        return render_sow_pdf(tmp_path, sow, customer, images, upload_folder, progress)
+    finally:
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
+
+
+class PdfJob:
+    def __init__(self, job_id, sow_id, customer_id, digest):
+        self.id = job_id
+        self.sow_id = sow_id
+        self.customer_id = customer_id
+        self.digest = digest
+        self.status = "queued"
+        self.error = None
+        self.entry = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _finish(self, entry=None, error=None):
+        self.entry = entry
+        self.error = error
+        self.status = "failed" if error else "done"
+        self.finished_at = time.monotonic()
+        self._done.set()
+
+
+class PdfJobManager:
+    """Renders PDFs on a bounded process pool and tracks them as jobs.
+
+    A job id is the cache entry name ``<sow_id>-<customer_id>-<digest>``, so
+    identical requests coalesce onto one in-flight render, and any worker
+    process can answer for a job that has finished into the shared cache.
+    ``on_rendered`` is called with the phase timings of each finished render.
+    """
+
+    def __init__(self, cache, upload_folder, max_workers=None, max_pending=64, keep_finished=600, on_rendered=None):
+        self.cache = cache
+        self.upload_folder = os.path.abspath(upload_folder)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.on_rendered = on_rendered
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def submit(self, sow, customer, images):
+        """Return the job rendering this SOW/customer, starting one if needed."""
+        sow = dict(sow)
+        customer = dict(customer) if customer else None
+        images = [dict(img) for img in images]
+        customer_id = customer["id"] if customer else None
+        digest = cache_key(sow, customer, images)
+        job_id = f"{sow['id']}-{customer_id or 0}-{digest}"
+
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == "queued":
+                return job
+            job = PdfJob(job_id, sow["id"], customer_id, digest)
+            entry = self.cache.get(sow["id"], customer_id, digest)
+            if entry is not None:
+                job._finish(entry)
+                self._jobs[job_id] = job
+                return job
+            pending = sum(1 for j in self._jobs.values() if j.status == "queued")
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} PDF renders already queued")
+            self._jobs[job_id] = job
+
+        # Unique per render: other worker processes may render the same PDF at once.
+        tmp_path = f"{self.cache.path_for(sow['id'], customer_id, digest)}.{os.getpid()}.{uuid.uuid4().hex[:12]}.tmp"
+        args = (_render_job, tmp_path, self._progress_path(job), sow, customer, images, self.upload_folder)
+        try:
+            future = self._pool().submit(*args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge image); start a fresh pool.
+            self._executor = None
+            future = self._pool().submit(*args)
+        future.add_done_callback(lambda f: self._complete(job, f, tmp_path))
+        return job
+
+    def _complete(self, job, future, tmp_path):
+        try:
+            timings = future.result()
+            entry = self.cache.adopt(job.sow_id, job.customer_id, job.digest, tmp_path)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            job._finish(error=str(e) or type(e).__name__)
+        else:
+            job._finish(entry)
+            if self.on_rendered:
+                self.on_rendered(timings)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        # Rendered by another worker process, or before a restart.
+        try:
+            sow_id, customer_id, digest = job_id.split("-", 2)
+            sow_id, customer_id = int(sow_id), int(customer_id) or None
+        except ValueError:
+            return None
+        if not _DIGEST.fullmatch(digest):
+            return None
+        entry = self.cache.get(sow_id, customer_id, digest)
+        if entry is None:
+            return None
+        job = PdfJob(job_id, sow_id, customer_id, digest)
+        job._finish(entry)
+        return job
+
+    def describe(self, job):
+        status, progress = job.status, 1.0
+        if status == "queued":
+            try:
+                with open(self._progress_path(job)) as f:
+                    status, progress = "running", float(f.read() or 0)
+            except (OSError, ValueError):
+                progress = 0.0
+        elif status == "failed":
+            progress = 0.0
+        return {"id": job.id, "status": status, "progress": progress, "error": job.error}
+
+    def _progress_path(self, job):
+        return os.path.join(self.cache.directory, f"{job.id}.progress")
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.keep_finished
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -0,0 +1,209 @@
+# pdf_render.py
+import functools
+import io
+import os
+import tempfile
+import time
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak
+from reportlab.platypus.tableofcontents import TableOfContents
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from PIL import Image as PilImage
+
+import sow_document
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_BYTES = 8 * 1024 * 1024
+# The frame SimpleDocTemplate lays out into: letter minus 1in margins, minus
+# the frame's 6pt padding on each side. Larger images fail to place.
+IMAGE_BOX = (letter[0] - 2 * inch - 12, letter[1] - 2 * inch - 12)
+
+
+@functools.lru_cache(maxsize=None)
+def get_styles():
+    """The stylesheet shared by every render in this process."""
+    styles = getSampleStyleSheet()
+
+    styles.add(ParagraphStyle(name='TitleStyle', fontSize=24, spaceAfter=12, alignment=TA_CENTER, fontName='Helvetica-Bold'))
+    styles.add(ParagraphStyle(name='HeadingStyle', fontSize=14, spaceAfter=6, fontName='Helvetica-Bold', leading=18))
+    styles.add(ParagraphStyle(name='NormalStyle', fontSize=12, spaceAfter=12, leading=14))
+    styles.add(ParagraphStyle(name='CaptionStyle', fontSize=10, textColor=colors.grey, spaceBefore=4, spaceAfter=12, alignment=TA_CENTER))
+    return styles
+
+
+def header_flowables():
+    """The tech support block that opens every SOW.
+
+    Built per story: flowables keep layout state while a document is
+    built, so instances must not be shared by concurrent renders.
+    """
+    styles = get_styles()
+    return (
+        Paragraph("TECH SUPPORT CONTACT INFORMATION", styles['HeadingStyle']),
+        Paragraph(sow_document.HOTLINE, styles['NormalStyle']),
+        Spacer(1, 0.25 * inch),
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def image_size(image_path, mtime):
+    # Keyed on mtime so a replaced file is re-read; PIL only parses the header.
+    with PilImage.open(image_path) as pil_img:
+        return pil_img.size
+
+
+def build_story(sow_data, customer_data, image_data, upload_folder, progress=None, timings=None):
+    """Return the list of flowables for one SOW document.
+
+    If ``timings`` is a dict, time spent sizing and loading images is added
+    to its ``"images"`` entry.
+    """
+    styles = get_styles()
+    story = []
+
+    story.append(Paragraph(sow_document.created_line(), styles['NormalStyle']))
+    story.append(Paragraph(sow_document.revision_line(sow_data), styles['NormalStyle']))
+    story.extend(header_flowables())
+
+    if sow_data['title']:
+        story.append(Paragraph(sow_data['title'], styles['TitleStyle']))
+        story.append(Spacer(1, 0.25 * inch))
+
+    if customer_data:
+        story.append(PageBreak())
+        story.append(Paragraph('CUSTOMER CHECK-IN/CHECK-OUT INFORMATION', styles['HeadingStyle']))
+        check_in, check_out = sow_document.customer_lines(customer_data)
+        for label, value in check_in:
+            story.append(Paragraph(f'<b>{label}</b> {value}', styles['NormalStyle']))
+        story.append(Spacer(1, 0.2 * inch))
+        for label, value in check_out:
+            story.append(Paragraph(f'<b>{label}</b> {value}', styles['NormalStyle']))
+
+    for heading, text in sow_document.sections(sow_data):
+        story.append(Paragraph(heading, styles['HeadingStyle']))
+        story.append(Paragraph(text, styles['NormalStyle']))
+        story.append(Spacer(1, 0.2 * inch))
+
+    if image_data:
+        story.append(PageBreak())
+        story.append(Paragraph('REFERENCE IMAGES', styles['HeadingStyle']))
+        story.append(Spacer(1, 0.2 * inch))
+        for i, img in enumerate(image_data):
+            if progress:
+                progress(0.1 + 0.6 * i / len(image_data))
+            started = time.perf_counter()
+            # Prefer the downscaled print derivative written at upload time.
+            image_path = os.path.join(upload_folder, img['print_filename'] or img['filename'])
+            if os.path.exists(image_path):
+                if img['filename'].lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
+                    try:
+                        if img['width'] and img['height']:
+                            img_width, img_height = img['width'], img['height']
+                        else:
+                            img_width, img_height = image_size(image_path, os.path.getmtime(image_path))
+                        ratio = min(IMAGE_BOX[0] / img_width, IMAGE_BOX[1] / img_height)
+                        
+                        rl_img = RLImage(image_path, width=img_width * ratio, height=img_height * ratio)
+                        story.append(rl_img)
+                        
+                        story.append(Paragraph(sow_document.image_label(img), styles['CaptionStyle']))
+                        story.append(Spacer(1, 0.2 * inch))
+                    except Exception as e:
+                        story.append(Paragraph(f'<i>Error displaying image: {img["original_name"]}</i>', styles['NormalStyle']))
+                        story.append(Spacer(1, 0.2 * inch))
+                elif img['filename'].lower().endswith('.pdf'):
+                    story.append(Paragraph(f'<b>Reference Document:</b> {img["original_name"]}', styles['NormalStyle']))
+                    story.append(Paragraph(f'<i>{img["caption"]}</i>' if img['caption'] else '', styles['CaptionStyle']))
+                    story.append(Spacer(1, 0.2 * inch))
+            if timings is not None:
+                timings["images"] = timings.get("images", 0.0) + time.perf_counter() - started
+
+    return story
+
+
+def render_sow_pdf(out, sow_data, customer_data, image_data, upload_folder, progress=None):
+    """Build the SOW PDF into ``out``, a path or a writable binary file.
+
+    Takes plain dicts so it can run in a worker process. ``progress``, if
+    given, is called with a fraction between 0 and 1 as the render advances.
+    Returns the seconds spent per phase: images, story, layout and write.
+    """
+    timings = {"images": 0.0}
+    if progress:
+        progress(0.0)
+    started = time.perf_counter()
+    story = build_story(sow_data, customer_data, image_data, upload_folder, progress, timings)
+    timings["story"] = time.perf_counter() - started - timings["images"]
+    if progress:
+        progress(0.7)
+    doc = SimpleDocTemplate(out, pagesize=letter)
+    # Save separately so serialising the PDF is timed apart from layout;
+    # multiBuild() uses the same switch.
+    doc._doSave = 0
+    started = time.perf_counter()
+    doc.build(story)
+    timings["layout"] = time.perf_counter() - started
+    started = time.perf_counter()
+    doc.canv.save()
+    timings["write"] = time.perf_counter() - started
+    if progress:
+        progress(1.0)
+    return timings
+
+
+def warm_up():
+    """Render a throwaway one-page SOW so styles, fonts and ReportLab's
+    lazily imported modules are loaded.
+
+    A pre-forking server calls this once in the parent, so every worker
+    (and every PDF process it forks) starts with them in shared memory.
+    """
+    sow = {field: "" for _, field in sow_document.SECTION_FIELDS}
+    sow.update(title="Warm-up", revision=1)
+    buf = io.BytesIO()
+    render_sow_pdf(buf, sow, None, [], ".")
+    return len(buf.getvalue())
+
+
+def iter_pdf(render, spool_bytes=SPOOL_BYTES):
+    """Run ``render(buffer)`` and yield the PDF in chunks.
+
+    The buffer stays in memory up to ``spool_bytes`` and only then rolls
+    over to an anonymous temporary file, which is gone once it is closed.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=spool_bytes) as buf:
+        render(buf)
+        buf.seek(0)
+        while block := buf.read(CHUNK_SIZE):
+            yield block
+
+
+class _PacketDocTemplate(SimpleDocTemplate):
+    def afterFlowable(self, flowable):
+        # Each SOW's title paragraph becomes a TOC entry and a PDF bookmark.
+        if isinstance(flowable, Paragraph) and flowable.style.name == 'TitleStyle':
+            text = flowable.getPlainText()
+            key = f"sow-p{self.page}"
+            self.canv.bookmarkPage(key)
+            self.canv.addOutlineEntry(text, key, level=0)
+            self.notify('TOCEntry', (0, text, self.page, key))
+
+
+def render_packet_pdf(out, documents, upload_folder, title="SOW Packet"):
+    """Render several SOWs into one PDF with a table of contents.
+
+    ``documents`` yields ``(sow, customer, images)`` tuples. ``out`` is a path
+    or a writable binary file.
+    """
+    styles = get_styles()
+    toc = TableOfContents()
+    toc.levelStyles = [ParagraphStyle(name='TOCLevel0', parent=styles['NormalStyle'], leftIndent=20, firstLineIndent=-20)]
+    story = [Paragraph(title, styles['TitleStyle']), Paragraph('CONTENTS', styles['HeadingStyle']), toc]
+    for sow_data, customer_data, image_data in documents:
+        story.append(PageBreak())
+        story.extend(build_story(sow_data, customer_data, image_data, upload_folder))
+    doc = _PacketDocTemplate(out, pagesize=letter, title=title)
+    doc.multiBuild(story)
@@ -0,0 +1,57 @@
+# reference_data.py
+"""Per-process cache of the charger type and customer dropdown lists.
+
+Each list is cached with the ``reference_versions`` counter it was read at.
+Triggers bump the counter in the same transaction as any insert, delete or
+rename, so a lookup costs one primary-key read of the counters and the
+lists are only re-read after a write, from whichever process made it.
+"""
+import threading
+
+LIST_SQL = {
+    "charger_types": "SELECT id, name FROM charger_types ORDER BY name COLLATE NOCASE",
+    "customers": "SELECT id, name FROM customers ORDER BY name COLLATE NOCASE",
+}
+
+_cache = {}  # name -> (version, rows)
+_lock = threading.Lock()
+
+
+def lists(conn, *names):
+    """Return the ``{"id", "name"}`` lists for ``names``, in that order.
+
+    The rows are shared between requests; treat them as read-only.
+    """
+    marks = ", ".join("?" * len(names))
+    versions = dict(conn.execute(
+        f"SELECT name, version FROM reference_versions WHERE name IN ({marks})", names
+    ).fetchall())
+    result = []
+    for name in names:
+        version = versions[name]
+        cached = _cache.get(name)
+        if cached is None or cached[0] != version:
+            # The counter was read first, so a write landing in between is
+            # only seen as a newer version on the next lookup.
+            rows = tuple({"id": r[0], "name": r[1]} for r in conn.execute(LIST_SQL[name]))
+            with _lock:
+                current = _cache.get(name)
+                if current is None or current[0] <= version:
+                    _cache[name] = cached = (version, rows)
+                else:
+                    cached = current
+        result.append(cached[1])
+    return result
+
+
+def charger_types(conn):
+    return lists(conn, "charger_types")[0]
+
+
+def customers(conn):
+    return lists(conn, "customers")[0]
+
+
+def clear():
+    with _lock:
+        _cache.clear()
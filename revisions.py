@@ -0,0 +1,215 @@
+# revisions.py
+"""Append-only revision history of SOWs.
+
+``sows`` always holds the current version and its ``revision`` number, so
+reading a SOW stays a one-row lookup. Edits go through ``record()``, which
+bumps the number and appends the new version to ``sow_revisions`` as
+zlib-compressed JSON, either a
+
+``snapshot``
+    every field in full, or a
+``delta``
+    the scalar fields in full and, for each text field that changed, its
+    line edits against the revision before: ``[start, end]`` copies those
+    lines of the previous text and a string is inserted as is.
+
+A snapshot is written every ``SNAPSHOT_EVERY`` revisions, or sooner once
+the deltas since the last one outweigh it, so any revision is rebuilt from
+one snapshot and fewer than ``SNAPSHOT_EVERY`` deltas.
+
+History starts at a SOW's first edit, which stores the version it replaces
+as a snapshot under that version's number. Text fields only change through
+``record()``, so the current row is the latest stored revision and the
+base of the next delta; scalars are stored whole in every delta because
+deleting a customer clears ``customer_id`` without a new revision.
+"""
+import difflib
+import hashlib
+import json
+import zlib
+
+import sow_document
+
+SNAPSHOT_EVERY = 20
+COMPRESS_LEVEL = 9
+SCALAR_FIELDS = ("title", "name", "charger_type_id", "customer_id")
+TEXT_FIELDS = tuple(field for _, field in sow_document.SECTION_FIELDS)
+FIELDS = SCALAR_FIELDS + TEXT_FIELDS
+
+_CHAIN_SQL = """
+    SELECT revision, kind, data, created_at FROM sow_revisions
+    WHERE sow_id = ? AND revision <= ?
+    ORDER BY revision DESC LIMIT ?
+"""
+
+
+class RevisionConflict(Exception):
+    pass
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode(), COMPRESS_LEVEL)
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(data))
+
+
+def _fields(row):
+    return {field: row[field] for field in FIELDS}
+
+
+def diff_lines(old, new):
+    """Line edits turning ``old`` into ``new``, or None if they share no lines."""
+    a, b = old.splitlines(keepends=True), new.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            text = "".join(b[j1:j2])
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += text
+            else:
+                ops.append(text)
+    if not any(isinstance(op, list) for op in ops):
+        return None
+    return ops
+
+
+def patch_lines(old, ops):
+    lines = old.splitlines(keepends=True)
+    return "".join(op if isinstance(op, str) else "".join(lines[op[0]:op[1]]) for op in ops)
+
+
+def make_delta(old, new):
+    delta = {"set": {field: new[field] for field in SCALAR_FIELDS}, "diff": {}}
+    for field in TEXT_FIELDS:
+        if new[field] == old[field]:
+            continue
+        ops = diff_lines(old[field], new[field]) if old[field] and new[field] else None
+        if ops is None:
+            delta["set"][field] = new[field]
+        else:
+            delta["diff"][field] = ops
+    return delta
+
+
+def apply_delta(version, delta):
+    version = dict(version)
+    for field, ops in delta["diff"].items():
+        version[field] = patch_lines(version[field], ops)
+    version.update(delta["set"])
+    return version
+
+
+def record(conn, sow_id, fields, expected=None):
+    """Update SOW ``sow_id`` with ``fields`` as a new revision and return its number.
+
+    Runs in the caller's transaction. Raises LookupError if there is no
+    such SOW, and RevisionConflict if it is not at revision ``expected``
+    (by default, the revision read here) when the update lands, so two
+    edits of the same version cannot silently overwrite each other. If
+    ``fields`` change nothing, no revision is written and the current
+    number is returned.
+    """
+    old = conn.execute("SELECT * FROM sows WHERE id = ?", (sow_id,)).fetchone()
+    if old is None:
+        raise LookupError(f"SOW {sow_id} not found")
+    if expected is not None:
+        try:
+            expected = int(expected)
+        except (TypeError, ValueError):
+            raise RevisionConflict(f"SOW {sow_id}: invalid revision {expected!r}") from None
+        if expected != old["revision"]:
+            raise RevisionConflict(f"SOW {sow_id} has changed since revision {expected}")
+    # Compared in SQL so column affinity applies (form values are text).
+    unchanged = conn.execute(
+        f"SELECT 1 FROM sows WHERE id = ? AND {' AND '.join(f'{field} IS ?' for field in fields)}",
+        (sow_id, *fields.values()),
+    ).fetchone()
+    if unchanged:
+        return old["revision"]
+    assignments = ", ".join(f"{field} = ?" for field in fields)
+    cursor = conn.execute(
+        f"UPDATE sows SET {assignments}, revision = revision + 1, updated_at = CURRENT_TIMESTAMP "
+        "WHERE id = ? AND revision = ?",
+        (*fields.values(), sow_id, old["revision"]),
+    )
+    if cursor.rowcount == 0:
+        raise RevisionConflict(f"SOW {sow_id} has changed since revision {old['revision']}")
+    new = conn.execute("SELECT * FROM sows WHERE id = ?", (sow_id,)).fetchone()
+
+    chain = conn.execute(_CHAIN_SQL, (sow_id, old["revision"], SNAPSHOT_EVERY)).fetchall()
+    if not chain:
+        snapshot = _pack(_fields(old))
+        conn.execute(
+            "INSERT INTO sow_revisions (sow_id, revision, kind, data, created_at) VALUES (?, ?, 'snapshot', ?, ?)",
+            (sow_id, old["revision"], snapshot, old["updated_at"]),
+        )
+        chain = [{"kind": "snapshot", "data": snapshot}]
+    deltas = 0
+    delta_bytes = 0
+    snapshot_bytes = 0
+    for row in chain:
+        if row["kind"] == "snapshot":
+            snapshot_bytes = len(row["data"])
+            break
+        deltas += 1
+        delta_bytes += len(row["data"])
+
+    data = _pack(make_delta(old, new))
+    if deltas + 1 >= SNAPSHOT_EVERY or delta_bytes + len(data) > snapshot_bytes:
+        kind, data = "snapshot", _pack(_fields(new))
+    else:
+        kind = "delta"
+    conn.execute(
+        "INSERT INTO sow_revisions (sow_id, revision, kind, data) VALUES (?, ?, ?, ?)",
+        (sow_id, new["revision"], kind, data),
+    )
+    return new["revision"]
+
+
+def load(conn, sow_id, revision):
+    """SOW ``sow_id`` as it was at ``revision``, or None if there is no such revision.
+
+    Returns a dict of ``FIELDS`` plus ``revision``, ``created_at`` and
+    ``current`` (whether it is still the live version).
+    """
+    head = conn.execute("SELECT * FROM sows WHERE id = ?", (sow_id,)).fetchone()
+    if head is None or not 1 <= revision <= head["revision"]:
+        return None
+    if revision == head["revision"]:
+        return {**_fields(head), "revision": revision, "created_at": head["updated_at"], "current": True}
+    rows = conn.execute(_CHAIN_SQL, (sow_id, revision, SNAPSHOT_EVERY)).fetchall()
+    if not rows or rows[0]["revision"] != revision:
+        return None
+    for depth, row in enumerate(rows):
+        if row["kind"] == "snapshot":
+            break
+    else:
+        raise ValueError(f"SOW {sow_id} revision {revision} has no snapshot within {SNAPSHOT_EVERY} revisions")
+    version = _unpack(rows[depth]["data"])
+    for row in reversed(rows[:depth]):
+        version = apply_delta(version, _unpack(row["data"]))
+    return {**version, "revision": revision, "created_at": rows[0]["created_at"], "current": False}
+
+
+def history(conn, sow_id, before=None, limit=50):
+    """Stored revisions of SOW ``sow_id`` below ``before``, newest first."""
+    rows = conn.execute("""
+        SELECT revision, kind, length(data) AS size, created_at FROM sow_revisions
+        WHERE sow_id = ? AND revision < ?
+        ORDER BY revision DESC LIMIT ?
+    """, (sow_id, before or 2 ** 62, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def etag(sow):
+    """Validator for the current row of ``sows``.
+
+    Starts with the revision; ``updated_at`` covers changes made outside
+    ``record()``.
+    """
+    stamp = hashlib.sha256(f"{sow['id']}:{sow['updated_at']}".encode()).hexdigest()[:16]
+    return f"r{sow['revision']}-{stamp}"
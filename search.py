@@ -0,0 +1,123 @@
+# search.py
+"""Ranked full-text search over SOWs backed by the ``sows_fts`` FTS5 table."""
+import html
+import re
+import unicodedata
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+MAX_TOKENS = 8
+# Prefix lengths with an FTS5 prefix index (``prefix = '2 3'``). Longer
+# prefixes are expanded through ``sows_fts_vocab``: an unindexed prefix
+# makes highlight() and snippet() merge every matching doclist per row.
+INDEXED_PREFIX_MAX = 3
+MAX_EXPANSION = 16
+# Control characters stand in for <mark> so the text can be HTML-escaped
+# before the highlight tags are added.
+_OPEN, _CLOSE = "\x02", "\x03"
+
+# bm25 weights, in sows_fts column order: title counts most.
+_WEIGHTS = "10.0, 2.0, 1.0, 1.0, 1.0, 1.0, 2.0"
+
+# Ranking every match of a short prefix ("ch*") is what makes naive
+# ``ORDER BY bm25`` slow on a large corpus, so only the newest
+# ``CANDIDATE_LIMIT`` matches are scored. FTS5 walks rowids in descending
+# order and stops there; queries with fewer matches are ranked exactly.
+CANDIDATE_LIMIT = 500
+
+RANK_SQL = f"""
+    SELECT id FROM (
+        SELECT sows_fts.rowid AS id, bm25(sows_fts, {_WEIGHTS}) AS score
+        FROM sows_fts {{join}}
+        WHERE sows_fts MATCH ? {{filter}}
+        ORDER BY sows_fts.rowid DESC
+        LIMIT ?
+    )
+    ORDER BY score
+    LIMIT ?
+"""
+
+SNIPPET_SQL = f"""
+    SELECT rowid, highlight(sows_fts, 0, '{_OPEN}', '{_CLOSE}') AS title_marked,
+           snippet(sows_fts, -1, '{_OPEN}', '{_CLOSE}', '…', 12) AS snippet_marked
+    FROM sows_fts
+    WHERE sows_fts MATCH ? AND rowid IN ({{marks}})
+"""
+
+
+def _fold(token):
+    # Mirror the unicode61 tokenizer: lower case, diacritics removed.
+    decomposed = unicodedata.normalize("NFKD", token.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _expand_prefix(conn, prefix):
+    """The indexed terms starting with ``prefix``, or None if there are too many."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    terms = [r[0] for r in conn.execute(
+        "SELECT term FROM sows_fts_vocab WHERE term >= ? AND term < ? LIMIT ?",
+        (prefix, upper, MAX_EXPANSION + 1),
+    )]
+    return terms if len(terms) <= MAX_EXPANSION else None
+
+
+def build_match(query, conn=None):
+    """Turn free text into an FTS5 expression, or None if nothing can match.
+
+    Every term must match. Unless the query ends in whitespace the last term
+    is treated as a prefix, which is what type-ahead wants. Given ``conn``,
+    prefixes longer than the prefix index are expanded to the actual terms.
+    """
+    tokens = [_fold(t) for t in _TOKEN.findall(query)[:MAX_TOKENS]]
+    if not tokens:
+        return None
+    terms = [f'"{t}"' for t in tokens]
+    if not query[-1:].isspace():
+        last = tokens[-1]
+        expanded = None
+        if conn is not None and len(last) > INDEXED_PREFIX_MAX:
+            expanded = _expand_prefix(conn, last)
+            if expanded == []:
+                return None
+        if expanded:
+            terms[-1] = "(" + " OR ".join(f'"{t}"' for t in expanded) + ")"
+        else:
+            terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _markup(text):
+    return html.escape(text or "").replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def search_sows(conn, query, limit=20, charger_type_id=None):
+    match = build_match(query, conn)
+    if match is None:
+        return []
+    join = sql_filter = ""
+    params = [match]
+    if charger_type_id is not None:
+        join = "JOIN sows s ON s.id = sows_fts.rowid"
+        sql_filter = "AND s.charger_type_id = ?"
+        params.append(charger_type_id)
+    params += [CANDIDATE_LIMIT, limit]
+    ids = [r[0] for r in conn.execute(RANK_SQL.format(join=join, filter=sql_filter), params)]
+    if not ids:
+        return []
+
+    sows = {r["id"]: r for r in conn.execute(
+        f"SELECT id, title, charger_type_id FROM sows WHERE id IN ({','.join('?' * len(ids))})", ids
+    )}
+    marked = {r["rowid"]: r for r in conn.execute(
+        SNIPPET_SQL.format(marks=",".join("?" * len(ids))), [match] + ids
+    )}
+    results = []
+    for sow_id in ids:
+        sow = sows[sow_id]
+        results.append({
+            "id": sow_id,
+            "title": sow["title"],
+            "charger_type_id": sow["charger_type_id"],
+            "title_html": _markup(marked[sow_id]["title_marked"]),
+            "snippet_html": _markup(marked[sow_id]["snippet_marked"]),
+        })
+    return results
@@ -0,0 +1,216 @@
+# serve.py
+"""Serving ``workers`` processes with ``threads`` threads each.
+
+Production runs on gunicorn (``pip install gunicorn``): ``flask serve``
+hands the app to ``run_gunicorn()`` when it is installed, and
+``gunicorn -c gunicorn.conf.py`` does the same from the command line. Both
+preload the app in the parent, so everything loaded before forking (the
+app, warmed caches, ReportLab) is shared copy-on-write by the workers, and
+both call ``on_exit`` as each worker stops (the app waits for its
+background PDF renders there) within ``graceful_timeout`` seconds.
+
+``run()`` is a fallback for machines without gunicorn, e.g. development
+and benchmarks. It is NOT hardened for production: requests are parsed by
+Werkzeug's development server (``werkzeug.serving``), which Werkzeug
+itself says is not for production use, with no limits on slow clients
+or malformed requests, under a small hand-written fork supervisor. The
+parent binds the socket, forks the workers, which all accept on it, and
+replaces a worker that dies, backing off if workers keep dying at
+start-up. On SIGTERM or SIGINT it passes SIGTERM on to the workers; each
+stops accepting, finishes its requests, calls ``on_exit`` and exits.
+Workers still running after ``graceful_timeout`` seconds are killed.
+"""
+import logging
+import os
+import signal
+import threading
+import time
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+log = logging.getLogger(__name__)
+
+# Idle keep-alive connections are dropped after this long, so they neither
+# hold a thread indefinitely nor delay a graceful stop.
+KEEPALIVE_TIMEOUT = 15
+POLL_INTERVAL = 0.5
+# A worker that dies sooner than this after starting is a crash loop:
+# respawns are delayed, doubling up to MAX_BACKOFF.
+MIN_WORKER_LIFE = 5
+MAX_BACKOFF = 30
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+
+
+class RequestHandler(WSGIRequestHandler):
+    timeout = KEEPALIVE_TIMEOUT
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.server.stopping:
+            self.close_connection = True
+
+
+class WorkerServer(ThreadedWSGIServer):
+    """A thread per connection, at most ``threads`` at once.
+
+    Request threads are not daemons and ``server_close()`` joins them, so
+    a stopping worker finishes what it has accepted.
+    """
+
+    multiprocess = True
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app, handler=RequestHandler)
+        self.stopping = False
+        self._slots = threading.BoundedSemaphore(threads)
+
+    def process_request(self, request, client_address):
+        # Blocks the accept loop while every thread is busy, leaving new
+        # connections in the listen backlog for the other workers.
+        self._slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
+def _worker(server, on_exit):
+    def stop(signum, frame):
+        server.stopping = True
+        # shutdown() waits for serve_forever(), which runs in this thread.
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the parent too
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+    status = 0
+    try:
+        server.serve_forever(poll_interval=POLL_INTERVAL)  # closes, joining requests
+        if on_exit:
+            on_exit()
+    except BaseException:
+        log.exception("Worker %d failed", os.getpid())
+        status = 1
+    finally:
+        logging.shutdown()
+        os._exit(status)
+
+
+def _spawn(server, on_exit):
+    # Signals stay blocked across fork() until the child has its handlers.
+    signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+    try:
+        pid = os.fork()
+        if pid == 0:
+            _worker(server, on_exit)
+    finally:
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+    return pid
+
+
+def gunicorn_available():
+    try:
+        import gunicorn.app.base  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def run_gunicorn(app, host, port, workers=1, threads=8, graceful_timeout=120, on_exit=None):
+    """Serve ``app``, already prepared in this process, with gunicorn's gthread workers."""
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread",
+                "preload_app": True,
+                "graceful_timeout": graceful_timeout,
+                "keepalive": KEEPALIVE_TIMEOUT,
+            }
+            for name, value in options.items():
+                self.cfg.set(name, value)
+            if on_exit:
+                self.cfg.set("worker_exit", lambda server, worker: on_exit())
+
+        def load(self):
+            return app
+
+    Application().run()
+
+
+def run(app, host, port, workers=1, threads=8, graceful_timeout=120, on_exit=None):
+    """The built-in fallback server; see the module docstring."""
+    logging.basicConfig(level=logging.INFO, format="[%(process)d] %(message)s")
+    server = WorkerServer(host, port, app, threads)
+    log.info("Listening on http://%s:%d with %d workers x %d threads", host, server.port, workers, threads)
+
+    stop = threading.Event()
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, lambda signum, frame: stop.set())
+
+    children = {}  # pid -> start time
+    for _ in range(workers):
+        children[_spawn(server, on_exit)] = time.monotonic()
+    backoff, respawn_at, missing = 0, 0.0, 0
+    while not stop.is_set():
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            started = children.pop(pid, None)
+            if started is None:
+                continue
+            log.warning("Worker %d exited (%s); replacing it", pid, _describe(status))
+            missing += 1
+            if time.monotonic() - started < MIN_WORKER_LIFE:
+                backoff = min(MAX_BACKOFF, backoff * 2 or 1)
+                respawn_at = time.monotonic() + backoff
+            else:
+                backoff = 0
+        if missing and time.monotonic() >= respawn_at:
+            for _ in range(missing):
+                children[_spawn(server, on_exit)] = time.monotonic()
+            missing = 0
+        stop.wait(POLL_INTERVAL)
+
+    log.info("Stopping %d workers (up to %ds)", len(children), graceful_timeout)
+    for pid in children:
+        _signal(pid, signal.SIGTERM)
+    deadline = time.monotonic() + graceful_timeout
+    while children and time.monotonic() < deadline:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            children.pop(pid, None)
+        else:
+            time.sleep(0.1)
+    for pid in children:
+        log.warning("Worker %d did not stop in time; killing it", pid)
+        _signal(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    server.server_close()
+
+
+def _signal(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _describe(status):
+    if os.WIFSIGNALED(status):
+        return f"signal {os.WTERMSIG(status)}"
+    return f"status {os.waitstatus_to_exitcode(status)}"
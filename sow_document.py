@@ -0,0 +1,135 @@
+# sow_document.py
+"""One SOW as a document: the SOW, its charger type, a customer and images.
+
+The document API, the plain-text preview and the PDF renderer all read the
+section lists below, so the three lay out the same content in the same order.
+"""
+import hashlib
+from datetime import datetime
+
+HOTLINE = "BTC Power Technical Support Hotline 1-855-901-1558"
+
+CHECK_IN_FIELDS = (
+    ('Check-in Contact:', 'check_in_contact'),
+    ('Check-in Phone:', 'check_in_phone'),
+    ('Check-in Instructions:', 'check_in_instructions'),
+)
+CHECK_OUT_FIELDS = (
+    ('Check-out Contact:', 'check_out_contact'),
+    ('Check-out Phone:', 'check_out_phone'),
+    ('Check-out Instructions:', 'check_out_instructions'),
+)
+SECTION_FIELDS = (
+    ('MAINTENANCE SCOPE', 'maintenance_scope'),
+    ('PARTS', 'parts'),
+    ('TOOLS', 'tools'),
+    ('DOCUMENTS', 'documents'),
+    ('SERVICE INSTRUCTIONS', 'service_instructions'),
+)
+
+# "|" columns separate the tables so each row can be split by position
+# whatever columns later migrations add.
+_DOCUMENT_SQL = """
+    SELECT s.*, NULL AS "|", ct.*, NULL AS "|", c.*, NULL AS "|", i.*
+    FROM sows s
+    LEFT JOIN charger_types ct ON ct.id = s.charger_type_id
+    LEFT JOIN customers c ON c.id = ?
+    LEFT JOIN sow_images i ON i.sow_id = s.id
+    WHERE s.id = ?
+    ORDER BY i.uploaded_at, i.id
+"""
+
+
+def load_document(conn, sow_id, customer_id=None):
+    """Return ``(sow, charger_type, customer, images)`` from one query.
+
+    Each part is a dict with the table's columns in table order (images is
+    a list of them); charger_type and customer may be None. Returns None if
+    the SOW does not exist.
+    """
+    cursor = conn.execute(_DOCUMENT_SQL, (customer_id, sow_id))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    names = [d[0] for d in cursor.description]
+    bounds = [i for i, name in enumerate(names) if name == "|"]
+    spans = list(zip([0] + [b + 1 for b in bounds], bounds + [len(names)]))
+
+    def part(row, n):
+        start, end = spans[n]
+        values = dict(zip(names[start:end], tuple(row)[start:end]))
+        return values if values["id"] is not None else None
+
+    first = rows[0]
+    images = [img for img in (part(row, 3) for row in rows) if img]
+    return part(first, 0), part(first, 1), part(first, 2), images
+
+
+def etag(sow, charger_type, customer, images):
+    parts = [sow, charger_type, customer, images]
+    return f"r{sow['revision']}-{hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()}"
+
+
+def created_line(now=None):
+    now = now or datetime.now()
+    return f"SOW Created [{now.strftime('%a %b %d %H:%M:%S %Y CDT')}]"
+
+
+def revision_line(sow):
+    """Which version of the SOW a printout holds (see revisions.py)."""
+    return f"SOW Revision {sow['revision']}"
+
+
+def customer_lines(customer):
+    """``(check_in, check_out)`` lists of ``(label, value)`` for non-empty fields."""
+    if not customer:
+        return [], []
+    return tuple(
+        [(label, customer[field]) for label, field in fields if customer[field]]
+        for fields in (CHECK_IN_FIELDS, CHECK_OUT_FIELDS)
+    )
+
+
+def sections(sow):
+    return [(heading, sow[field]) for heading, field in SECTION_FIELDS if sow[field]]
+
+
+def image_label(img):
+    return img['caption'] or img['original_name']
+
+
+def layout():
+    """The labels and section order, for clients that render offline."""
+    return {
+        "hotline": HOTLINE,
+        "check_in_fields": CHECK_IN_FIELDS,
+        "check_out_fields": CHECK_OUT_FIELDS,
+        "section_fields": SECTION_FIELDS,
+    }
+
+
+def render_text(sow, customer, images, created=None):
+    """The plain-text version of the document.
+
+    ``created`` is the "SOW Created" line; it is left out when None so the
+    text stays cacheable and the caller can stamp its own time. static/app.js
+    mirrors this for offline use.
+    """
+    blocks = []
+    header = [created] if created else []
+    blocks.append("\n".join(header + ["TECH SUPPORT CONTACT INFORMATION", HOTLINE]))
+    if sow['title']:
+        blocks.append(sow['title'])
+    if customer:
+        check_in, check_out = customer_lines(customer)
+        lines = ["CUSTOMER CHECK-IN/CHECK-OUT INFORMATION"]
+        lines += [f"{label} {value}" for label, value in check_in]
+        if check_in and check_out:
+            lines.append("")
+        lines += [f"{label} {value}" for label, value in check_out]
+        blocks.append("\n".join(lines))
+    for heading, text in sections(sow):
+        blocks.append(f"{heading}\n{text}")
+    if images:
+        blocks.append("\n".join(["REFERENCE IMAGES"] + [f"- {image_label(img)}" for img in images]))
+    return "\n\n".join(blocks)
@@ -1,5 +1,176 @@
 // static/app.js
 
+// --- Offline store: IndexedDB copy of the data, kept current by /api/sync ---
+const offlineStore = (() => {
+    const ENTITIES = ["charger_types", "customers", "sows", "images"];
+    let dbPromise = null;
+    let syncing = null;
+
+    const result = (req) => new Promise((resolve, reject) => {
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+    const committed = (tx) => new Promise((resolve, reject) => {
+        tx.oncomplete = () => resolve();
+        tx.onerror = tx.onabort = () => reject(tx.error);
+    });
+
+    function open() {
+        if (!("indexedDB" in window)) return Promise.reject(new Error("IndexedDB is not available"));
+        if (!dbPromise) {
+            const req = indexedDB.open("sow-offline", 1);
+            req.onupgradeneeded = () => {
+                const db = req.result;
+                ENTITIES.forEach(name => db.createObjectStore(name, { keyPath: "id" }));
+                req.transaction.objectStore("sows").createIndex("charger_type_id", "charger_type_id");
+                req.transaction.objectStore("images").createIndex("sow_id", "sow_id");
+                db.createObjectStore("meta");
+            };
+            dbPromise = result(req);
+        }
+        return dbPromise;
+    }
+
+    async function get(store, key) {
+        const db = await open();
+        return result(db.transaction(store).objectStore(store).get(key));
+    }
+
+    // One transaction per page, cursor included, so an interrupted sync
+    // resumes from the last page that was fully applied.
+    async function apply(page) {
+        const db = await open();
+        const tx = db.transaction([...ENTITIES, "meta"], "readwrite");
+        ENTITIES.forEach(name => {
+            const store = tx.objectStore(name);
+            if (page.full) store.clear();
+            page[name].forEach(row => store.put(row));
+            page.deleted[name].forEach(id => store.delete(id));
+        });
+        const meta = tx.objectStore("meta");
+        meta.put(page.cursor, "cursor");
+        meta.put(page.layout, "layout");
+        if (!page.more) meta.put(Date.now(), "synced_at");
+        await committed(tx);
+    }
+
+    function sync() {
+        if (!syncing) {
+            syncing = (async () => {
+                let cursor = await get("meta", "cursor");
+                for (;;) {
+                    const url = cursor ? `/api/sync?since=${encodeURIComponent(cursor)}` : "/api/sync";
+                    const resp = await fetch(url, { headers: { "Accept": "application/json" } });
+                    if (resp.status === 400 && cursor) {
+                        cursor = null;  // not a cursor this server understands: start over
+                        continue;
+                    }
+                    if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+                    const page = await resp.json();
+                    await apply(page);
+                    if (!page.more) return;
+                    cursor = page.cursor;
+                }
+            })().finally(() => { syncing = null; });
+        }
+        return syncing;
+    }
+
+    // Give a sync up to SYNC_WAIT_MS to pull the latest changes (a slow
+    // link must not hold up the page), then report whether there is a
+    // complete local copy to read from.
+    const SYNC_WAIT_MS = 1500;
+    async function ready() {
+        if (navigator.onLine) {
+            const pending = sync().catch(e => console.warn("Sync failed, using the local copy:", e));
+            await Promise.race([pending, new Promise(resolve => setTimeout(resolve, SYNC_WAIT_MS))]);
+        }
+        return Boolean(await get("meta", "synced_at"));
+    }
+
+    async function list(store) {
+        const db = await open();
+        const rows = await result(db.transaction(store).objectStore(store).getAll());
+        return rows.sort((a, b) => a.name.localeCompare(b.name, undefined, { sensitivity: "base" }));
+    }
+
+    async function sowsForCharger(chargerId) {
+        const db = await open();
+        const index = db.transaction("sows").objectStore("sows").index("charger_type_id");
+        const rows = await result(index.getAll(Number(chargerId)));
+        // Same order as /api/sows: newest first.
+        return rows.sort((a, b) => (b.created_at || "").localeCompare(a.created_at || "") || b.id - a.id);
+    }
+
+    // Mirrors sow_document.render_text(); the labels come from the server.
+    function renderText(layout, sow, customer, images) {
+        const blocks = [`TECH SUPPORT CONTACT INFORMATION\n${layout.hotline}`];
+        if (sow.title) blocks.push(sow.title);
+        if (customer) {
+            const lines = (fields) => fields.filter(([, f]) => customer[f]).map(([label, f]) => `${label} ${customer[f]}`);
+            const checkIn = lines(layout.check_in_fields);
+            const checkOut = lines(layout.check_out_fields);
+            blocks.push(["CUSTOMER CHECK-IN/CHECK-OUT INFORMATION", ...checkIn,
+                         ...(checkIn.length && checkOut.length ? [""] : []), ...checkOut].join("\n"));
+        }
+        layout.section_fields.forEach(([heading, f]) => {
+            if (sow[f]) blocks.push(`${heading}\n${sow[f]}`);
+        });
+        if (images.length) {
+            blocks.push(["REFERENCE IMAGES", ...images.map(img => `- ${img.caption || img.original_name}`)].join("\n"));
+        }
+        return blocks.join("\n\n");
+    }
+
+    // The document text, or null if the SOW is not in the local copy.
+    async function documentText(sowId, customerId) {
+        const db = await open();
+        const tx = db.transaction(["sows", "customers", "images", "meta"]);
+        const [sow, customer, images, layout] = await Promise.all([
+            result(tx.objectStore("sows").get(Number(sowId))),
+            customerId ? result(tx.objectStore("customers").get(Number(customerId))) : null,
+            result(tx.objectStore("images").index("sow_id").getAll(Number(sowId))),
+            result(tx.objectStore("meta").get("layout")),
+        ]);
+        if (!sow || !layout) return null;
+        images.sort((a, b) => (a.uploaded_at || "").localeCompare(b.uploaded_at || "") || a.id - b.id);
+        return renderText(layout, sow, customer || null, images);
+    }
+
+    return { sync, ready, list, sowsForCharger, documentText };
+})();
+
+// --- SOW list: fetch further pages as the "Load more" row scrolls into view ---
+document.addEventListener("DOMContentLoaded", () => {
+    const list = document.getElementById("sowList");
+    if (!list || !("IntersectionObserver" in window)) return;
+
+    let loading = false;
+    const observer = new IntersectionObserver(async (entries) => {
+        if (loading || !entries.some(e => e.isIntersecting)) return;
+        const more = list.querySelector("tr.load-more");
+        if (!more) return;
+        loading = true;
+        observer.unobserve(more);
+        try {
+            const resp = await fetch(more.dataset.fragment, { headers: { "Accept": "text/html" } });
+            if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+            more.insertAdjacentHTML("afterend", await resp.text());
+            more.remove();
+            const next = list.querySelector("tr.load-more");
+            if (next) observer.observe(next);
+        } catch (e) {
+            // Leave the plain "Load more" link in place as a fallback.
+            console.error("Failed to load more SOWs:", e);
+        } finally {
+            loading = false;
+        }
+    }, { rootMargin: "400px" });
+
+    const first = list.querySelector("tr.load-more");
+    if (first) observer.observe(first);
+});
+
 document.addEventListener("DOMContentLoaded", () => {
     const chargerSel = document.getElementById("charger_type");
     const sowSel = document.getElementById("sow");
@@ -21,29 +192,83 @@ document.addEventListener("DOMContentLoaded", () => {
         sowContent.value = "";
     }
     resetSow();
-    
+
+    // --- Offline support: cache the page, keep a local copy of the data ---
+    if ("serviceWorker" in navigator) {
+        navigator.serviceWorker.register("/sw.js").catch(e => console.warn("Service worker not registered:", e));
+    }
+
+    function fillSelect(select, rows) {
+        const current = select.value;
+        select.innerHTML = '<option value="">Select...</option>';
+        rows.forEach(({ id, name }) => {
+            const opt = document.createElement("option");
+            opt.value = id;
+            opt.textContent = name;
+            select.appendChild(opt);
+        });
+        select.value = current;
+    }
+
+    // The page may have come from the service worker cache, so refresh the
+    // dropdowns from the local copy once it is current.
+    offlineStore.ready().then(async (ready) => {
+        if (!ready) return;
+        fillSelect(chargerSel, await offlineStore.list("charger_types"));
+        fillSelect(customerSel, await offlineStore.list("customers"));
+    }).catch(e => console.warn("Offline store unavailable:", e));
+    window.addEventListener("online", () => offlineStore.sync().catch(e => console.warn("Sync failed:", e)));
+
+    function addSowOptions(list) {
+        list.forEach(({ id, title }) => {
+            const opt = document.createElement("option");
+            opt.value = id;
+            opt.textContent = title || `(untitled ${id})`;
+            sowSel.appendChild(opt);
+        });
+        if (list.length) sowSel.removeAttribute("disabled");
+    }
+
     // --- Event Listeners ---
+    let sowLoad = 0;
     chargerSel.addEventListener("change", async () => {
         const chargerId = chargerSel.value;
+        const load = ++sowLoad;
         resetSow();
         if (!chargerId) return;
 
         try {
-            const resp = await fetch(`/api/sows?charger_type_id=${encodeURIComponent(chargerId)}`, {
-                headers: { "Accept": "application/json" }
-            });
-            if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
-            const list = await resp.json();
-
-            if (Array.isArray(list) && list.length) {
-                list.forEach(({ id, title }) => {
-                    const opt = document.createElement("option");
-                    opt.value = id;
-                    opt.textContent = title || `(untitled ${id})`;
-                    sowSel.appendChild(opt);
-                });
-                sowSel.removeAttribute("disabled");
-            } else {
+            if (await offlineStore.ready()) {
+                const rows = await offlineStore.sowsForCharger(chargerId);
+                if (load !== sowLoad) return;
+                addSowOptions(rows);
+                if (!rows.length) sowSel.innerHTML = '<option value="">No SOWs available</option>';
+                return;
+            }
+        } catch (e) {
+            console.warn("Offline store unavailable:", e);
+        }
+        if (load !== sowLoad) return;
+
+        // Without a local copy: /api/sows is paged; fill the dropdown a page at a time so the
+        // first options show up straight away.
+        const base = `/api/sows?charger_type_id=${encodeURIComponent(chargerId)}&limit=200`;
+        let url = base;
+        let count = 0;
+        try {
+            while (url) {
+                const resp = await fetch(url, { headers: { "Accept": "application/json" } });
+                if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+                const list = await resp.json();
+                if (load !== sowLoad) return;  // a newer charger type was picked meanwhile
+
+                addSowOptions(list);
+                count += list.length;
+
+                const next = resp.headers.get("X-Next-Cursor");
+                url = next ? `${base}&cursor=${encodeURIComponent(next)}` : null;
+            }
+            if (!count) {
                 sowSel.innerHTML = '<option value="">No SOWs available</option>';
             }
         } catch (e) {
@@ -69,47 +294,24 @@ document.addEventListener("DOMContentLoaded", () => {
         }
 
         try {
-            const sowResp = await fetch(`/api/sows/${sowId}`);
-            if (!sowResp.ok) throw new Error(`HTTP ${sowResp.status}`);
-            const sowData = await sowResp.json();
-            
-            let content = '';
-            
-            content += `SOW Created [${new Date().toLocaleString()}]\n`;
-            content += 'TECH SUPPORT CONTACT INFORMATION:\n';
-            content += 'BTC Power Technical Support Hotline 1-855-901-1558\n\n';
-
-            if (customerSel.value) {
-                const customerResp = await fetch(`/api/customers/${customerSel.value}`);
-                if (!customerResp.ok) throw new Error(`HTTP ${customerResp.status}`);
-                const customerData = await customerResp.json();
-
-                content += 'CUSTOMER CHECK-IN INFORMATION\n';
-                if (customerData.check_in_contact) content += `Check-in Contact: ${customerData.check_in_contact}\n`;
-                if (customerData.check_in_phone) content += `Check-in Phone: ${customerData.check_in_phone}\n`;
-                if (customerData.check_in_instructions) content += `Check-in Instructions: ${customerData.check_in_instructions}\n`;
-                content += '\n';
+            // From the local copy when there is one (this works offline);
+            // otherwise one request for the SOW, customer and images, with
+            // the text built server-side from the same sections as the PDF.
+            let text = null;
+            try {
+                if (await offlineStore.ready()) text = await offlineStore.documentText(sowId, customerSel.value);
+            } catch (e) {
+                console.warn("Offline store unavailable:", e);
             }
-
-            content += `Title\n${sowData.title}\n\n`;
-            if (sowData.maintenance_scope) content += `MAINTENANCE SCOPE\n${sowData.maintenance_scope}\n\n`;
-            if (sowData.parts) content += `PARTS\n${sowData.parts}\n\n`;
-            if (sowData.tools) content += `TOOLS\n${sowData.tools}\n\n`;
-            if (sowData.documents) content += `DOCUMENTS\n${sowData.documents}\n\n`;
-            if (sowData.service_instructions) content += `SERVICE INSTRUCTIONS\n${sowData.service_instructions}\n\n`;
-
-            if (customerSel.value) {
-                const customerResp = await fetch(`/api/customers/${customerSel.value}`);
-                const customerData = await customerResp.json();
-                
-                content += 'CUSTOMER CHECK-OUT INFORMATION\n';
-                if (customerData.check_out_contact) content += `Check-out Contact: ${customerData.check_out_contact}\n`;
-                if (customerData.check_out_phone) content += `Check-out Phone: ${customerData.check_out_phone}\n`;
-                if (customerData.check_out_instructions) content += `Check-out Instructions: ${customerData.check_out_instructions}\n`;
+            if (text === null) {
+                const params = customerSel.value ? `?customer_id=${encodeURIComponent(customerSel.value)}` : "";
+                const resp = await fetch(`/api/sow_document/${sowId}${params}`, {
+                    headers: { "Accept": "application/json" }
+                });
+                if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+                text = (await resp.json()).text;
             }
-
-            sowContent.value = content.trim();
-
+            sowContent.value = `SOW Created [${new Date().toLocaleString()}]\n${text}`;
         } catch (e) {
             console.error("Failed to generate SOW:", e);
             sowContent.value = "Error generating SOW. Please check the console for details.";
@@ -135,8 +337,40 @@ document.addEventListener("DOMContentLoaded", () => {
         });
     };
     
-    // Note: downloadPDF will be added later when that functionality is wired up
-    window.downloadPDF = () => {
-        alert("PDF generation is not yet implemented in this new structure.");
+    // --- PDF download via the background render queue ---
+    const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+    window.downloadPDF = async () => {
+        const sowId = sowSel.value;
+        if (!sowId) return;
+
+        const label = pdfBtn.textContent;
+        pdfBtn.setAttribute("disabled", "disabled");
+        try {
+            let resp = await fetch("/api/pdf_jobs", {
+                method: "POST",
+                headers: { "Content-Type": "application/json", "Accept": "application/json" },
+                body: JSON.stringify({ sow_id: sowId, customer_id: customerSel.value || null })
+            });
+            let job = await resp.json();
+            if (!resp.ok) throw new Error(job.error || `HTTP ${resp.status}`);
+
+            while (job.status === "queued" || job.status === "running") {
+                pdfBtn.textContent = `Rendering… ${Math.round(job.progress * 100)}%`;
+                await sleep(500);
+                resp = await fetch(job.status_url, { headers: { "Accept": "application/json" } });
+                job = await resp.json();
+                if (!resp.ok) throw new Error(job.error || `HTTP ${resp.status}`);
+            }
+            if (job.status !== "done") throw new Error(job.error || "PDF rendering failed");
+
+            window.location = job.download_url;
+        } catch (e) {
+            console.error("Failed to generate PDF:", e);
+            alert("Error generating PDF. Please check the console for details.");
+        } finally {
+            pdfBtn.textContent = label;
+            if (sowSel.value) pdfBtn.removeAttribute("disabled");
+        }
     };
 });
@@ -0,0 +1,239 @@
+// static/uploads.js
+
+// --- Background, resumable uploads for the add/edit SOW forms ---
+// Picked files start uploading at once through /api/uploads (see
+// uploads.py), a few at a time, in chunks, each with a progress bar. A
+// failed chunk is retried from the offset the server reports, and a
+// throttled one after the Retry-After the server sends. The form
+// posts only upload ids and captions, so saving never waits on bytes: an
+// upload still running when the form is saved is attached to the SOW by
+// the server as soon as its last chunk arrives.
+const backgroundUploads = (() => {
+    // The upload admission class runs 2 chunks at a time (see app.py);
+    // more from one page would only queue behind each other or be refused.
+    const PARALLEL = 2;
+    const MAX_RETRIES = 8;
+
+    class PermanentError extends Error {}
+
+    const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+    // XMLHttpRequest rather than fetch(): only it reports upload progress.
+    function send(method, url, body = null, headers = {}, onProgress = null) {
+        return new Promise((resolve, reject) => {
+            const xhr = new XMLHttpRequest();
+            xhr.open(method, url);
+            Object.entries(headers).forEach(([name, value]) => xhr.setRequestHeader(name, value));
+            if (onProgress) xhr.upload.onprogress = (e) => onProgress(e.loaded);
+            xhr.onload = () => {
+                let data = {};
+                try { data = JSON.parse(xhr.responseText || "{}"); } catch (e) { /* not JSON */ }
+                resolve({ status: xhr.status, data, retryAfter: Number(xhr.getResponseHeader("Retry-After")) || 0 });
+            };
+            xhr.onerror = xhr.ontimeout = () => reject(new Error("network error"));
+            xhr.send(body);
+        });
+    }
+
+    function formatSize(bytes) {
+        return bytes >= 1e6 ? `${(bytes / 1e6).toFixed(1)} MB` : `${Math.ceil(bytes / 1e3)} KB`;
+    }
+
+    function makeEntry(file, list) {
+        const row = document.createElement("div");
+        row.className = "upload-entry";
+        row.style.cssText = "display: flex; gap: 10px; align-items: center; margin-bottom: 10px; padding: 10px; "
+            + "border: 1px solid #ddd; border-radius: 4px; background-color: #f9f9f9;";
+
+        if (file.type.startsWith("image/")) {
+            const img = document.createElement("img");
+            img.src = URL.createObjectURL(file);
+            img.style.cssText = "max-width: 80px; max-height: 60px; border-radius: 4px;";
+            row.appendChild(img);
+        } else {
+            const icon = document.createElement("span");
+            icon.textContent = "📄";
+            icon.style.fontSize = "32px";
+            row.appendChild(icon);
+        }
+
+        const body = document.createElement("div");
+        body.style.flex = "1";
+        const name = document.createElement("div");
+        name.textContent = `${file.name} (${formatSize(file.size)})`;
+        name.style.fontWeight = "bold";
+        const caption = document.createElement("input");
+        caption.type = "text";
+        caption.name = "upload_caption";
+        caption.placeholder = "Enter caption for this image...";
+        caption.style.cssText = "width: 100%; box-sizing: border-box; margin: 5px 0;";
+        const id = document.createElement("input");
+        id.type = "hidden";
+        id.name = "upload_id";
+        const bar = document.createElement("progress");
+        bar.max = file.size;
+        bar.value = 0;
+        bar.style.width = "100%";
+        const status = document.createElement("small");
+        status.style.color = "#666";
+        body.append(name, caption, id, bar, status);
+
+        const remove = document.createElement("button");
+        remove.type = "button";
+        remove.textContent = "×";
+        remove.title = "Remove";
+        remove.className = "btn-danger";
+
+        row.append(body, remove);
+        list.appendChild(row);
+
+        const entry = {
+            file, row, url: null, settled: false, cancelled: false,
+            progress(bytes) { bar.value = bytes; status.textContent = `${Math.floor(100 * bytes / file.size)}%`; },
+            setStatus(text) { status.textContent = text; },
+            setId(value, url) { id.value = value; entry.url = url; },
+            fail(message) {
+                status.textContent = `Upload failed: ${message}`;
+                status.style.color = "#c00";
+                // Disabled inputs are not submitted, so id and caption stay paired.
+                id.disabled = caption.disabled = true;
+            },
+        };
+        remove.addEventListener("click", () => {
+            entry.cancelled = true;
+            if (entry.url && !entry.settled) send("DELETE", entry.url).catch(() => {});
+            row.remove();
+        });
+        return entry;
+    }
+
+    // Called as soon as the file is picked: the form needs every id before
+    // it can be saved, and creating one costs a single small request.
+    async function create(entry) {
+        const file = entry.file;
+        const res = await send("POST", "/api/uploads", JSON.stringify({ filename: file.name, size: file.size }),
+                               { "Content-Type": "application/json" });
+        if (res.status !== 201) throw new PermanentError(res.data.error || `HTTP ${res.status}`);
+        entry.setId(res.data.id, res.data.url);
+        return res.data;
+    }
+
+    async function transfer(entry, { url, chunk_size: chunkSize }) {
+        const file = entry.file;
+        let offset = 0;
+        let failures = 0;
+        while (offset < file.size && !entry.cancelled) {
+            try {
+                const start = offset;
+                const res = await send("PATCH", url, file.slice(start, start + chunkSize),
+                                       { "Upload-Offset": String(start), "Content-Type": "application/offset+octet-stream" },
+                                       loaded => entry.progress(start + loaded));
+                if (res.status === 200 || res.status === 409) {
+                    // 409: the server holds a different offset; carry on from there.
+                    offset = res.data.offset;
+                    failures = 0;
+                    entry.progress(offset);
+                } else if (res.status === 429 || res.status === 503) {
+                    // Throttled (see admission.py): not a failure, just wait as told.
+                    entry.setStatus(`Server busy, resuming in ${res.retryAfter || 1} s...`);
+                    await sleep(1000 * (res.retryAfter || 1));
+                } else if (res.status < 500) {
+                    throw new PermanentError(res.data.error || `HTTP ${res.status}`);
+                } else {
+                    throw new Error(`HTTP ${res.status}`);
+                }
+            } catch (e) {
+                if (e instanceof PermanentError || ++failures > MAX_RETRIES) throw e;
+                entry.setStatus(`Connection problem, retrying (${failures}/${MAX_RETRIES})...`);
+                await sleep(Math.min(30000, 500 * 2 ** failures));
+                const res = await send("GET", url).catch(() => null);
+                if (res && res.status === 200) offset = res.data.offset;
+            }
+        }
+    }
+
+    function init(form, input, list) {
+        if (!window.XMLHttpRequest || !window.FormData || !window.fetch) return;  // plain multipart post
+        input.removeAttribute("name");  // bytes go through /api/uploads, not the form
+        const entries = [];
+        const queue = [];
+        let running = 0;
+        let saving = false;
+
+        function pump() {
+            while (running < PARALLEL && queue.length) {
+                const entry = queue.shift();
+                running++;
+                entry.ready.then(info => transfer(entry, info))
+                    .then(() => { if (!entry.cancelled) entry.setStatus("Uploaded"); })
+                    .catch(e => entry.fail(e.message))
+                    .finally(() => {
+                        entry.settled = true;
+                        running--;
+                        pump();
+                        if (entry.onSettled) entry.onSettled();
+                    });
+            }
+        }
+
+        input.addEventListener("change", () => {
+            Array.from(input.files).forEach(file => {
+                const entry = makeEntry(file, list);
+                entry.setStatus("Waiting...");
+                entry.ready = create(entry);
+                entry.created = entry.ready.catch(() => {});
+                entries.push(entry);
+                queue.push(entry);
+            });
+            input.value = "";
+            pump();
+        });
+
+        const unsettled = () => entries.filter(e => !e.settled && !e.cancelled);
+        const whenSettled = (entry) => entry.settled ? Promise.resolve()
+            : new Promise(resolve => { entry.onSettled = resolve; });
+
+        window.addEventListener("beforeunload", (e) => {
+            if (!saving && unsettled().length) e.preventDefault();
+        });
+
+        form.addEventListener("submit", async (e) => {
+            const pending = unsettled();
+            if (!pending.length || saving) return;
+            e.preventDefault();
+            saving = true;
+            const button = form.querySelector("[type=submit]");
+            if (button) button.disabled = true;
+            // The form needs the ids, never the bytes.
+            await Promise.all(pending.map(entry => entry.created));
+            const resp = await fetch(form.action, { method: "POST", body: new FormData(form) });
+            if (!resp.ok) {
+                const busy = document.createElement("div");
+                busy.className = "flash error";
+                busy.textContent = resp.status === 429 || resp.status === 503
+                    ? `The server is busy; please save again in ${resp.headers.get("Retry-After") || "a few"} seconds.`
+                    : `Saving failed (HTTP ${resp.status}).`;
+                form.before(busy);
+                saving = false;
+                if (button) button.disabled = false;
+                return;
+            }
+            // The page saving redirected to carries the outcome as flash messages.
+            const page = new DOMParser().parseFromString(await resp.text(), "text/html");
+            const errors = page.querySelectorAll(".flash.error");
+            if (errors.length) {
+                form.before(...errors);
+                saving = false;
+                if (button) button.disabled = false;
+                return;
+            }
+            pending.forEach(entry => {
+                if (!entry.settled) entry.setStatus("Saved; finishing upload...");
+            });
+            await Promise.all(pending.map(whenSettled));
+            window.location.href = resp.url;
+        });
+    }
+
+    return { init };
+})();
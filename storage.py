@@ -0,0 +1,121 @@
+# storage.py
+"""Content-addressed storage for uploads.
+
+Files live under the upload folder at ``ab/cd/<sha256>.<ext>`` and are
+recorded once in the ``blobs`` table. ``sow_images.blob_id`` references a
+blob and triggers keep ``blobs.refcount`` in step, so a file shared by
+several SOWs is stored (and thumbnailed) once and only unlinked when its
+last reference goes away.
+"""
+import hashlib
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 64 * 1024
+STAGING_DIR = ".staging"
+
+
+def content_path(sha256, ext):
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+
+def stage(stream, upload_folder):
+    """Copy ``stream`` into the staging area, hashing as it goes.
+
+    Returns ``(staging_path, sha256, size)``.
+    """
+    staging = os.path.join(upload_folder, STAGING_DIR)
+    os.makedirs(staging, exist_ok=True)
+    path = os.path.join(staging, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as out:
+        while block := stream.read(CHUNK_SIZE):
+            digest.update(block)
+            out.write(block)
+            size += len(block)
+    return path, digest.hexdigest(), size
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(CHUNK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def commit_blob(conn, upload_folder, staging_path, sha256, size, ext):
+    """Move a staged file into place and return ``(blob_id, relative_path)``.
+
+    Runs inside the caller's write transaction, which must already hold
+    the write lock (it has written, or began IMMEDIATE) so the lookup below
+    cannot race release_blobs(). If the content is already stored
+    the staged copy is discarded and the existing blob is reused.
+    """
+    row = conn.execute("SELECT id, path FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    if row is None:
+        relpath = content_path(sha256, ext)
+        blob_id = conn.execute(
+            "INSERT INTO blobs (sha256, path, size) VALUES (?, ?, ?)", (sha256, relpath, size)
+        ).lastrowid
+    else:
+        blob_id, relpath = row["id"], row["path"]
+    final = os.path.join(upload_folder, relpath)
+    # A file left at ``final`` without a row may be about to be unlinked by
+    # release_blobs(), so a new row always gets the staged copy.
+    if row is not None and os.path.exists(final):
+        os.remove(staging_path)
+    else:
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(staging_path, final)
+    return blob_id, relpath
+
+
+def stage_uploads(upload_folder, files, max_workers=4):
+    """Stage Werkzeug uploads side by side, before any transaction is open.
+
+    Returns ``[(file_storage, staging_path, sha256, size)]`` in order; hand
+    each to ``commit_blob()`` in the transaction that records it.
+    """
+    def one(file_storage):
+        return (file_storage, *stage(file_storage.stream, upload_folder))
+
+    if len(files) <= 1:
+        return [one(f) for f in files]
+    with ThreadPoolExecutor(min(max_workers, len(files))) as pool:
+        return list(pool.map(one, files))
+
+
+def blob_paths(upload_folder, blob):
+    names = [blob["path"], blob["print_path"], blob["thumb_path"]]
+    return [os.path.join(upload_folder, n) for n in names if n]
+
+
+def release_blobs(conn, upload_folder, blob_ids):
+    """Delete blobs among ``blob_ids`` that are no longer referenced.
+
+    Takes the write lock before looking at refcounts, so commit_blob()
+    cannot reuse a blob in between, and unlinks the files of the rows it
+    deleted before committing. Must be called outside a transaction.
+    Returns the number of bytes freed.
+    """
+    blob_ids = [b for b in set(blob_ids) if b is not None]
+    if not blob_ids:
+        return 0
+    marks = ",".join("?" * len(blob_ids))
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        dead = conn.execute(
+            f"DELETE FROM blobs WHERE refcount <= 0 AND id IN ({marks}) RETURNING *", blob_ids
+        ).fetchall()
+        freed = 0
+        for blob in dead:
+            for path in blob_paths(upload_folder, blob):
+                try:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+    return freed
@@ -0,0 +1,108 @@
+# sync.py
+"""Delta sync for offline clients: what changed since a cursor.
+
+Each entity is read in ``(updated_at, id)`` order from where the client's
+cursor left it, and deletes come from ``sync_tombstones`` in id order. A
+cursor that is caught up holds only the last ``updated_at`` and the next
+sync re-reads that second inclusively: ``updated_at`` has one-second
+resolution, so a transaction committing later can still share it. Clients
+apply rows as upserts, so the overlap is harmless.
+"""
+import base64
+import json
+
+from migrations import SYNC_TABLES
+
+PAGE_SIZE = 500
+
+# Columns shipped per entity; charger types only feed dropdowns.
+COLUMNS = {"charger_types": "id, name, updated_at", "customers": "*", "sows": "*", "images": "*"}
+
+
+def encode_cursor(state):
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return the cursor state; raises ValueError for a malformed cursor."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        positions, tombstone = state["t"], state["d"]
+        for entity in SYNC_TABLES:
+            pos = positions.get(entity)
+            if pos is not None and not (isinstance(pos[0], str) and (pos[1] is None or isinstance(pos[1], int))):
+                raise ValueError
+        if not isinstance(tombstone, int):
+            raise ValueError
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError) as e:
+        raise ValueError("invalid cursor") from e
+    return state
+
+
+def _entity_page(conn, entity, pos, limit):
+    """Rows of ``entity`` after ``pos``; returns ``(rows, last_pos, more)``."""
+    sql = f"SELECT {COLUMNS[entity]} FROM {SYNC_TABLES[entity]}"
+    params = []
+    if pos is not None:
+        updated_at, row_id = pos
+        if row_id is None:
+            sql += " WHERE updated_at >= ?"
+            params.append(updated_at)
+        else:
+            sql += " WHERE (updated_at, id) > (?, ?)"
+            params.extend((updated_at, row_id))
+    rows = conn.execute(f"{sql} ORDER BY updated_at, id LIMIT ?", params + [limit + 1]).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    last_pos = [rows[-1]["updated_at"], rows[-1]["id"]] if rows else pos
+    return rows, last_pos, more
+
+
+def changes(conn, cursor=None, limit=PAGE_SIZE):
+    """Return the changes after ``cursor`` (everything when None) as a dict.
+
+    At most ``limit`` rows per entity and tombstones are returned; ``more``
+    says to call again with the returned cursor straight away.
+    """
+    state = decode_cursor(cursor) if cursor else None
+    # One read transaction, so every entity comes from the same snapshot.
+    conn.execute("BEGIN")
+    try:
+        if state is None:
+            # A fresh client has nothing to delete.
+            positions = {}
+            tombstone = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sync_tombstones").fetchone()[0]
+        else:
+            positions, tombstone = state["t"], state["d"]
+
+        result = {"full": state is None}
+        more = False
+        next_positions = {}
+        for entity in SYNC_TABLES:
+            rows, next_positions[entity], entity_more = _entity_page(conn, entity, positions.get(entity), limit)
+            result[entity] = [dict(r) for r in rows]
+            more = more or entity_more
+
+        deleted = {entity: [] for entity in SYNC_TABLES}
+        rows = conn.execute(
+            "SELECT id, entity, row_id FROM sync_tombstones WHERE id > ? ORDER BY id LIMIT ?", (tombstone, limit + 1)
+        ).fetchall()
+        if len(rows) > limit:
+            more, rows = True, rows[:limit]
+        for row in rows:
+            if row["entity"] in deleted:
+                deleted[row["entity"]].append(row["row_id"])
+        if rows:
+            tombstone = rows[-1]["id"]
+    finally:
+        conn.rollback()
+
+    if not more:
+        # Caught up: re-read the last second next time (see above). While
+        # paging, stay exclusive so a busy second cannot repeat forever.
+        next_positions = {e: pos and [pos[0], None] for e, pos in next_positions.items()}
+    result["deleted"] = deleted
+    result["more"] = more
+    result["cursor"] = encode_cursor({"t": next_positions, "d": tombstone})
+    return result
@@ -0,0 +1,38 @@
+// templates/sw.js (served at /sw.js)
+// Keeps the generator page and its assets available offline. Data comes
+// from IndexedDB (see app.js), so /api/* requests are left alone.
+
+const CACHE = "sow-shell-{{ version }}";
+const SHELL = {{ shell|tojson }};
+
+self.addEventListener("install", (event) => {
+    event.waitUntil(caches.open(CACHE).then(cache => cache.addAll(SHELL)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(k => k !== CACHE).map(k => caches.delete(k))))
+            .then(() => self.clients.claim())
+    );
+});
+
+// Network first, so online users always get the current page; the cached
+// copy is only served when the network fails.
+self.addEventListener("fetch", (event) => {
+    const url = new URL(event.request.url);
+    if (event.request.method !== "GET" || url.origin !== location.origin || !SHELL.includes(url.pathname)) {
+        return;
+    }
+    event.respondWith(
+        fetch(event.request)
+            .then(resp => {
+                if (resp.ok) {
+                    const copy = resp.clone();
+                    caches.open(CACHE).then(cache => cache.put(url.pathname, copy));
+                }
+                return resp;
+            })
+            .catch(() => caches.match(url.pathname).then(hit => hit || Response.error()))
+    );
+});
@@ -0,0 +1,321 @@
+# upload_gc.py
+"""Incremental garbage collection of the upload folder.
+
+Uploads leak when a request fails after its file is in place, when a crash
+lands between a delete's commit and its unlink, or from SOWs deleted before
+foreign keys were enforced (their ``sow_images`` rows linger). A GC pass
+runs in bounded batches, each its own short transaction, and records its
+position in ``upload_gc_state`` so it can stop anywhere and resume:
+
+``rows``
+    Resumable uploads past ``uploads.UPLOAD_TTL`` are forgotten, then
+    ``sow_images`` rows are checked in id order. Rows whose SOW is gone are
+    deleted (the refcount triggers release their blobs); rows whose file is
+    missing are counted, not touched.
+``blobs``
+    Blob rows nothing references any more are deleted and their files
+    quarantined.
+``files``
+    The upload folder, walked in name order a batch at a time; a directory
+    is only ever read for its next ``batch_size`` entries. Files that no
+    blob, image or upload row names are quarantined, and files found in
+    quarantine without a record (a crash mid-batch) are recorded.
+``purge``
+    Quarantined files older than the grace period are deleted, or put back
+    if something references them again.
+
+Quarantine moves a file to ``.quarantine/<path>`` in the upload folder, so
+a mistake is undone by moving it back. Files younger than ``min_age``
+belong to uploads that may not have committed yet and are skipped, and
+references are checked under the write lock, so an upload cannot claim a
+file while it is being moved.
+"""
+import heapq
+import os
+import time
+
+import storage
+import uploads
+
+BATCH_SIZE = 500
+MIN_AGE = 3600
+QUARANTINE_DAYS = 7
+QUARANTINE_DIR = ".quarantine"
+
+
+class GcReport:
+    def __init__(self):
+        self.uploads_expired = 0
+        self.rows_deleted = 0
+        self.missing_files = 0
+        self.blobs_deleted = 0
+        self.files_scanned = 0
+        self.files_quarantined = 0
+        self.bytes_quarantined = 0
+        self.files_restored = 0
+        self.files_purged = 0
+        self.bytes_reclaimed = 0
+        self.passes_completed = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _state(conn):
+    return conn.execute("SELECT phase, cursor FROM upload_gc_state WHERE id = 1").fetchone()
+
+
+def _save_state(conn, phase, cursor=""):
+    conn.execute("UPDATE upload_gc_state SET phase = ?, cursor = ? WHERE id = 1", (phase, cursor))
+
+
+def _stem(relpath):
+    # Originals and their derivatives share everything before the first dot:
+    # <uuid>.<ext>, <uuid>.print.jpg, ab/cd/<sha256>.thumb.png ...
+    return os.path.basename(relpath).split(".", 1)[0]
+
+
+def referenced(conn, relpaths):
+    """Return the subset of ``relpaths`` that a blob or image row names."""
+    names = set()
+    staging = storage.STAGING_DIR + "/"
+    staged = {_stem(p) for p in relpaths if p.startswith(staging)}
+    if staged:
+        # Resumable uploads in progress: .staging/<upload id>.part
+        marks = ",".join("?" * len(staged))
+        for (upload_id,) in conn.execute(f"SELECT id FROM uploads WHERE id IN ({marks})", list(staged)):
+            names.add(f"{staging}{upload_id}.part")
+    sharded = {_stem(p) for p in relpaths if "/" in p and not p.startswith(staging)}
+    if sharded:
+        marks = ",".join("?" * len(sharded))
+        for row in conn.execute(f"SELECT path, print_path, thumb_path FROM blobs WHERE sha256 IN ({marks})", list(sharded)):
+            names.update(row)
+    for stem in {_stem(p) for p in relpaths if "/" not in p}:
+        # "/" sorts right after ".": every name starting "<stem>."
+        for row in conn.execute(
+            "SELECT filename, print_filename, thumb_filename FROM sow_images WHERE filename >= ? AND filename < ?",
+            (stem + ".", stem + "/"),
+        ):
+            names.update(row)
+    return {p for p in relpaths if p in names}
+
+
+def _prune_dirs(path, stop):
+    """Remove the now-empty directories above ``path``, up to ``stop``."""
+    path = os.path.dirname(path)
+    while os.path.abspath(path) != os.path.abspath(stop):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
+
+
+def _quarantine(conn, upload_folder, relpath, report):
+    src = os.path.join(upload_folder, relpath)
+    try:
+        size = os.path.getsize(src)
+    except FileNotFoundError:
+        return
+    conn.execute("""
+        INSERT INTO upload_quarantine (path, size) VALUES (?, ?)
+        ON CONFLICT (path) DO UPDATE SET size = excluded.size, quarantined_at = CURRENT_TIMESTAMP
+    """, (relpath, size))
+    dest = os.path.join(upload_folder, QUARANTINE_DIR, relpath)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.replace(src, dest)
+    except OSError:
+        conn.execute("DELETE FROM upload_quarantine WHERE path = ?", (relpath,))
+        return
+    _prune_dirs(src, upload_folder)
+    report.files_quarantined += 1
+    report.bytes_quarantined += size
+
+
+def scan(upload_folder, cursor, limit):
+    """Return up to ``limit`` files after ``cursor`` in walk order, and the next cursor.
+
+    Entries are visited in name order, descending into directories. Dot
+    names are skipped apart from the staging and quarantine areas. The
+    cursor is the relative path of the last entry finished; each directory
+    is read with ``heapq.nsmallest``, holding at most ``limit`` entries.
+    The returned cursor is "" once the walk is complete.
+    """
+    files = []
+    last = [cursor]
+
+    def visit(parts, resume):
+        first, rest = (resume[0], resume[1:]) if resume else (None, [])
+        try:
+            it = os.scandir(os.path.join(upload_folder, *parts))
+        except (FileNotFoundError, NotADirectoryError):
+            return True
+        take = limit - len(files)
+        with it:
+            entries = heapq.nsmallest(
+                take + 1,
+                (e for e in it if (first is None or e.name > first or (e.name == first and rest))
+                 and (not e.name.startswith(".") or e.name in (storage.STAGING_DIR, QUARANTINE_DIR))),
+                key=lambda e: e.name,
+            )
+        more = len(entries) > take
+        for entry in entries[:take]:
+            if len(files) >= limit:
+                return False
+            rel = parts + [entry.name]
+            if entry.is_dir(follow_symlinks=False):
+                if not visit(rel, rest if entry.name == first else []):
+                    return False
+            elif entry.is_file(follow_symlinks=False):
+                files.append(("/".join(rel), entry.stat(follow_symlinks=False)))
+            last[0] = "/".join(rel)
+        return not more
+
+    done = visit([], cursor.split("/") if cursor else [])
+    return files, "" if done else last[0]
+
+
+def _rows_batch(conn, upload_folder, cursor, batch_size, report):
+    rows = conn.execute("""
+        SELECT i.id, i.filename, s.id AS live_sow
+        FROM sow_images i LEFT JOIN sows s ON s.id = i.sow_id
+        WHERE i.id > ? ORDER BY i.id LIMIT ?
+    """, (int(cursor or 0), batch_size)).fetchall()
+    dangling = [r["id"] for r in rows if r["live_sow"] is None]
+    report.missing_files += sum(
+        1 for r in rows if r["live_sow"] is not None and not os.path.exists(os.path.join(upload_folder, r["filename"]))
+    )
+    with conn:
+        if dangling:
+            conn.execute(f"DELETE FROM sow_images WHERE id IN ({','.join('?' * len(dangling))})", dangling)
+            report.rows_deleted += len(dangling)
+        if len(rows) < batch_size:
+            _save_state(conn, "blobs")
+        else:
+            _save_state(conn, "rows", str(rows[-1]["id"]))
+
+
+def _blobs_batch(conn, upload_folder, batch_size, min_age, report):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        dead = conn.execute(
+            "SELECT * FROM blobs WHERE refcount <= 0 AND created_at < datetime('now', ?) ORDER BY id LIMIT ?",
+            (f"-{min_age} seconds", batch_size),
+        ).fetchall()
+        for blob in dead:
+            conn.execute("DELETE FROM blobs WHERE id = ? AND refcount <= 0", (blob["id"],))
+            for path in storage.blob_paths(upload_folder, blob):
+                _quarantine(conn, upload_folder, os.path.relpath(path, upload_folder), report)
+        report.blobs_deleted += len(dead)
+        if len(dead) < batch_size:
+            _save_state(conn, "files")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _files_batch(conn, upload_folder, cursor, batch_size, min_age, report):
+    files, next_cursor = scan(upload_folder, cursor, batch_size)
+    report.files_scanned += len(files)
+    prefix = QUARANTINE_DIR + "/"
+    held = {p[len(prefix):]: st.st_size for p, st in files if p.startswith(prefix)}
+    young = time.time() - min_age
+    candidates = [p for p, st in files if st.st_mtime < young and not p.startswith(prefix)]
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if held:
+            marks = ",".join("?" * len(held))
+            known = {r[0] for r in conn.execute(f"SELECT path FROM upload_quarantine WHERE path IN ({marks})", list(held))}
+            conn.executemany(
+                "INSERT INTO upload_quarantine (path, size) VALUES (?, ?)",
+                [(path, size) for path, size in held.items() if path not in known],
+            )
+        keep = referenced(conn, candidates)
+        for relpath in candidates:
+            if relpath not in keep:
+                _quarantine(conn, upload_folder, relpath, report)
+        _save_state(conn, "files" if next_cursor else "purge", next_cursor)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _purge_batch(conn, upload_folder, batch_size, keep_days, report):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        expired = conn.execute(
+            "SELECT * FROM upload_quarantine WHERE quarantined_at < datetime('now', ?) ORDER BY quarantined_at LIMIT ?",
+            (f"-{keep_days} days", batch_size),
+        ).fetchall()
+        keep = referenced(conn, [r["path"] for r in expired])
+        for row in expired:
+            held = os.path.join(upload_folder, QUARANTINE_DIR, row["path"])
+            original = os.path.join(upload_folder, row["path"])
+            try:
+                if row["path"] in keep and not os.path.exists(original):
+                    os.makedirs(os.path.dirname(original), exist_ok=True)
+                    os.replace(held, original)
+                    report.files_restored += 1
+                else:
+                    os.remove(held)
+                    report.files_purged += 1
+                    report.bytes_reclaimed += row["size"]
+            except FileNotFoundError:
+                pass
+            _prune_dirs(held, os.path.join(upload_folder, QUARANTINE_DIR))
+            conn.execute("DELETE FROM upload_quarantine WHERE path = ?", (row["path"],))
+        if len(expired) < batch_size:
+            conn.execute(
+                "UPDATE upload_gc_state SET phase = 'rows', cursor = '', last_pass_at = CURRENT_TIMESTAMP, "
+                "pass_started_at = NULL WHERE id = 1"
+            )
+            report.passes_completed += 1
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def step(conn, upload_folder, batch_size=BATCH_SIZE, min_age=MIN_AGE, keep_days=QUARANTINE_DAYS, report=None):
+    """Run one batch of the current phase and return the report."""
+    report = report or GcReport()
+    phase, cursor = _state(conn)
+    if phase == "rows" and not cursor:
+        with conn:
+            conn.execute("UPDATE upload_gc_state SET pass_started_at = CURRENT_TIMESTAMP WHERE id = 1")
+        report.uploads_expired += uploads.expire(conn)
+    if phase == "rows":
+        _rows_batch(conn, upload_folder, cursor, batch_size, report)
+    elif phase == "blobs":
+        _blobs_batch(conn, upload_folder, batch_size, min_age, report)
+    elif phase == "files":
+        _files_batch(conn, upload_folder, cursor, batch_size, min_age, report)
+    else:
+        _purge_batch(conn, upload_folder, batch_size, keep_days, report)
+    return report
+
+
+def run(conn, upload_folder, batch_size=BATCH_SIZE, max_batches=None, pause=0.0,
+        min_age=MIN_AGE, keep_days=QUARANTINE_DAYS):
+    """Run batches until the current pass completes or ``max_batches`` have run.
+
+    ``pause`` seconds are slept between batches to leave the disk and the
+    write lock to requests.
+    """
+    report = GcReport()
+    batches = 0
+    while not report.passes_completed and (max_batches is None or batches < max_batches):
+        if batches and pause:
+            time.sleep(pause)
+        step(conn, upload_folder, batch_size, min_age, keep_days, report)
+        batches += 1
+    return report
+
+
+def quarantine_usage(conn):
+    """``(files, bytes)`` currently held in quarantine."""
+    count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM upload_quarantine").fetchone()
+    return count, size
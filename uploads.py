@@ -0,0 +1,220 @@
+# uploads.py
+"""Chunked, resumable uploads.
+
+A client creates an upload with the file's name and size, then sends the
+bytes in chunks, each tagged with the offset it starts at. The staged file
+``.staging/<id>.part`` is exactly as long as what has arrived, so after a
+dropped connection the client asks for the offset and carries on. Chunks
+are hashed as they are written; a worker process that did not see the
+earlier chunks hashes the staged prefix once and continues from there.
+
+Saving the add/edit SOW form *claims* uploads by id, with their captions.
+Whichever comes second, the claim or the last byte, moves the file into
+content-addressed storage and inserts its ``sow_images`` row, in a short
+transaction that does no file I/O beyond a rename. The form therefore
+never carries or waits on file contents.
+
+Uploads not attached within ``UPLOAD_TTL`` are expired by the upload GC,
+which then reclaims their staged files.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import storage
+
+CHUNK_BYTES = 1024 * 1024
+UPLOAD_TTL = 24 * 3600
+# Running hashes of unfinished uploads, by id: (offset, sha256 object).
+MAX_HASHERS = 256
+
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, offset):
+        super().__init__(f"upload is at offset {offset}")
+        self.offset = offset
+
+
+def part_path(upload_folder, upload_id):
+    return os.path.join(upload_folder, storage.STAGING_DIR, f"{upload_id}.part")
+
+
+def _offset(upload_folder, upload_id):
+    try:
+        return os.path.getsize(part_path(upload_folder, upload_id))
+    except FileNotFoundError:
+        return 0
+
+
+def describe(upload_folder, row):
+    info = {key: row[key] for key in ("id", "filename", "size", "sha256", "sow_id", "caption", "created_at")}
+    info["offset"] = row["size"] if row["sha256"] else _offset(upload_folder, row["id"])
+    info["complete"] = row["sha256"] is not None
+    return info
+
+
+def get(conn, upload_folder, upload_id):
+    row = conn.execute("SELECT * FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+    return describe(upload_folder, row) if row else None
+
+
+def create(conn, upload_folder, filename, size):
+    """Start an upload of ``size`` bytes and return it."""
+    upload_id = uuid.uuid4().hex
+    path = part_path(upload_folder, upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "xb").close()
+    with conn:
+        conn.execute("INSERT INTO uploads (id, filename, size) VALUES (?, ?, ?)", (upload_id, filename, size))
+    return get(conn, upload_folder, upload_id)
+
+
+def _hasher(upload_id, path, offset):
+    with _hashers_lock:
+        cached = _hashers.pop(upload_id, None)
+    if cached is not None and cached[0] == offset:
+        return cached[1]
+    # Earlier chunks went to another process (or before a restart).
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = offset
+        while remaining and (block := f.read(min(storage.CHUNK_SIZE, remaining))):
+            digest.update(block)
+            remaining -= len(block)
+    return digest
+
+
+def _keep_hasher(upload_id, offset, digest):
+    with _hashers_lock:
+        _hashers[upload_id] = (offset, digest)
+        while len(_hashers) > MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def write_chunk(conn, upload_folder, upload_id, offset, stream):
+    """Append ``stream`` to the upload, which must be at ``offset``.
+
+    Returns ``(upload, images)``: the upload after the chunk and, if that
+    completed a claimed upload, the ``(sow_id, image_id)`` rows it became.
+    Raises LookupError for an unknown upload, OffsetMismatch if the upload
+    is elsewhere and ValueError if the data runs past the declared size.
+    """
+    row = conn.execute("SELECT * FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+    if row is None:
+        raise LookupError(f"upload {upload_id} not found")
+    if row["sha256"]:
+        raise OffsetMismatch(row["size"])
+    path = part_path(upload_folder, upload_id)
+    try:
+        f = open(path, "r+b")
+    except FileNotFoundError:
+        raise LookupError(f"upload {upload_id} has no staged data") from None
+    with f:
+        # Serializes chunks of one upload across threads and processes.
+        fcntl.flock(f, fcntl.LOCK_EX)
+        at = f.seek(0, os.SEEK_END)
+        if at != offset:
+            raise OffsetMismatch(at)
+        digest = _hasher(upload_id, path, at)
+        remaining = row["size"] - at
+        while block := stream.read(min(storage.CHUNK_SIZE, remaining + 1)):
+            if len(block) > remaining:
+                raise ValueError("more data than the upload's declared size")
+            f.write(block)
+            digest.update(block)
+            at += len(block)
+            remaining -= len(block)
+            # Kept current, so a client that drops mid-chunk resumes cheaply.
+            _keep_hasher(upload_id, at, digest)
+        f.flush()
+    if remaining:
+        return get(conn, upload_folder, upload_id), []
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+    sha256 = digest.hexdigest()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("UPDATE uploads SET sha256 = ? WHERE id = ?", (sha256, upload_id))
+        images = attach(conn, upload_folder, [upload_id])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return {**describe(upload_folder, row), "sha256": sha256, "offset": row["size"], "complete": True}, images
+
+
+def claim(conn, upload_folder, sow_id, upload_ids, captions=()):
+    """Assign uploads to SOW ``sow_id`` and attach those already complete.
+
+    Runs in the caller's transaction, after its write to the SOW. Uploads
+    claimed before (e.g. by a resubmitted form) are left alone. Returns
+    the ``(sow_id, image_id)`` rows attached; the rest are attached when
+    their last chunk arrives.
+    """
+    captions = list(captions)
+    ids = []
+    for i, upload_id in enumerate(upload_ids):
+        if not upload_id:
+            continue
+        caption = captions[i] if i < len(captions) else ""
+        conn.execute(
+            "UPDATE uploads SET sow_id = ?, caption = ? WHERE id = ? AND sow_id IS NULL",
+            (sow_id, caption, upload_id),
+        )
+        ids.append(upload_id)
+    return attach(conn, upload_folder, ids)
+
+
+def attach(conn, upload_folder, upload_ids):
+    """Turn claimed, complete uploads among ``upload_ids`` into images.
+
+    Runs in the caller's write transaction; the only file operation is
+    the rename into content-addressed storage.
+    """
+    if not upload_ids:
+        return []
+    marks = ",".join("?" * len(upload_ids))
+    rows = conn.execute(
+        f"SELECT * FROM uploads WHERE id IN ({marks}) AND sow_id IS NOT NULL AND sha256 IS NOT NULL",
+        list(upload_ids),
+    ).fetchall()
+    images = []
+    for row in rows:
+        ext = row["filename"].rsplit(".", 1)[1].lower()
+        blob_id, relpath = storage.commit_blob(
+            conn, upload_folder, part_path(upload_folder, row["id"]), row["sha256"], row["size"], ext
+        )
+        image_id = conn.execute(
+            "INSERT INTO sow_images (sow_id, filename, original_name, caption, blob_id) VALUES (?, ?, ?, ?, ?)",
+            (row["sow_id"], relpath, row["filename"], row["caption"] or "", blob_id),
+        ).lastrowid
+        conn.execute("DELETE FROM uploads WHERE id = ?", (row["id"],))
+        images.append((row["sow_id"], image_id))
+    return images
+
+
+def cancel(conn, upload_folder, upload_id):
+    """Drop an unclaimed upload and its staged bytes; False if there is none."""
+    with conn:
+        deleted = conn.execute("DELETE FROM uploads WHERE id = ? AND sow_id IS NULL", (upload_id,)).rowcount
+    if not deleted:
+        return False
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+    try:
+        os.remove(part_path(upload_folder, upload_id))
+    except FileNotFoundError:
+        pass
+    return True
+
+
+def expire(conn, max_age=UPLOAD_TTL):
+    """Forget uploads older than ``max_age`` seconds; the GC reclaims their files."""
+    with conn:
+        return conn.execute("DELETE FROM uploads WHERE created_at < datetime('now', ?)", (f"-{max_age} seconds",)).rowcount